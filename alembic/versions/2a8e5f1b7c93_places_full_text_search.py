@@ -0,0 +1,39 @@
+"""places full text search
+
+Revision ID: 2a8e5f1b7c93
+Revises: 9f3b6d0c2e41
+Create Date: 2026-10-18 11:48:05.112730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2a8e5f1b7c93'
+down_revision: Union[str, Sequence[str], None] = '9f3b6d0c2e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Generated by postgres from the place columns, the name is weighted more than the address and the address more than the about text.
+    op.execute("""
+        ALTER TABLE places ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(place_name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(place_address, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(about_place, '')), 'C')
+        ) STORED
+    """)
+    op.create_index('ix_places_search_vector', 'places', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_places_pincode', 'places', ['pincode'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_places_pincode', table_name='places')
+    op.drop_index('ix_places_search_vector', table_name='places')
+    op.drop_column('places', 'search_vector')
@@ -0,0 +1,51 @@
+"""place stats version
+
+Revision ID: 3e9c7b1d5a28
+Revises: f1b8d2c6a3e7
+Create Date: 2026-10-18 19:42:10.562918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e9c7b1d5a28'
+down_revision: Union[str, Sequence[str], None] = 'f1b8d2c6a3e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('place_stats', sa.Column('version', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('place_stats', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+
+    # Every place gets a stats row, so its detail has a version and a Last-Modified from now on.
+    op.execute("""
+        INSERT INTO place_stats (place_id)
+        SELECT id FROM places
+        WHERE NOT EXISTS (SELECT 1 FROM place_stats WHERE place_stats.place_id = places.id)
+    """)
+    # The ETag of the place detail was the data version, every place starts from it, so a place version is never the same
+    # as an ETag that was given before for other data of the place.
+    op.execute("""
+        UPDATE place_stats
+        SET version = (SELECT COALESCE(SUM(version), 0) FROM data_version), updated_at = now()
+    """)
+    # data_version is now DATA_VERSION_SLOTS rows whose sum is the version, the rows are made by the first writes.
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The version goes back to the one row, with the sum of the slots so it doesn't go back.
+    op.execute("""
+        INSERT INTO data_version (id, version, updated_at)
+        SELECT 1, COALESCE(SUM(version), 0), COALESCE(MAX(updated_at), now()) FROM data_version
+        ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version, updated_at = EXCLUDED.updated_at
+    """)
+    op.execute("DELETE FROM data_version WHERE id <> 1")
+    op.drop_column('place_stats', 'updated_at')
+    op.drop_column('place_stats', 'version')
@@ -0,0 +1,76 @@
+"""place stats
+
+Revision ID: 4c1e7a2d9b65
+Revises: bad29bb38154
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c1e7a2d9b65'
+down_revision: Union[str, Sequence[str], None] = 'bad29bb38154'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('place_stats',
+    sa.Column('place_id', sa.Integer(), nullable=False),
+    sa.Column('num_likes', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('num_dislikes', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('total_user_rated', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('overall_sum', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('cleanliness_sum', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('safety_sum', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('crowd_behavior_sum', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('lightning_sum', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('transport_access_sum', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('facility_quality_sum', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['place_id'], ['places.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('place_id')
+    )
+
+    # Filling the stats of the places that already have votes and ratings.
+    op.execute("""
+        INSERT INTO place_stats (
+            place_id, num_likes, num_dislikes, total_user_rated,
+            overall_sum, cleanliness_sum, safety_sum, crowd_behavior_sum,
+            lightning_sum, transport_access_sum, facility_quality_sum
+        )
+        SELECT
+            places.id,
+            COALESCE(v.num_likes, 0), COALESCE(v.num_dislikes, 0), COALESCE(r.total_user_rated, 0),
+            COALESCE(r.overall_sum, 0), COALESCE(r.cleanliness_sum, 0), COALESCE(r.safety_sum, 0),
+            COALESCE(r.crowd_behavior_sum, 0), COALESCE(r.lightning_sum, 0),
+            COALESCE(r.transport_access_sum, 0), COALESCE(r.facility_quality_sum, 0)
+        FROM places
+        LEFT JOIN (
+            SELECT place_id,
+                SUM(CASE WHEN vote IS TRUE THEN 1 ELSE 0 END) AS num_likes,
+                SUM(CASE WHEN vote IS FALSE THEN 1 ELSE 0 END) AS num_dislikes
+            FROM votes GROUP BY place_id
+        ) v ON v.place_id = places.id
+        LEFT JOIN (
+            SELECT place_id,
+                COUNT(*) AS total_user_rated,
+                SUM(overall) AS overall_sum,
+                SUM(cleanliness) AS cleanliness_sum,
+                SUM(safety) AS safety_sum,
+                SUM(crowd_behavior) AS crowd_behavior_sum,
+                SUM(lightning) AS lightning_sum,
+                SUM(transport_access) AS transport_access_sum,
+                SUM(facility_quality) AS facility_quality_sum
+            FROM ratings GROUP BY place_id
+        ) r ON r.place_id = places.id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('place_stats')
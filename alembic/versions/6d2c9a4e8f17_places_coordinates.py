@@ -0,0 +1,35 @@
+"""places coordinates
+
+Revision ID: 6d2c9a4e8f17
+Revises: 2a8e5f1b7c93
+Create Date: 2026-10-18 13:05:41.228104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d2c9a4e8f17'
+down_revision: Union[str, Sequence[str], None] = '2a8e5f1b7c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The old places have no coordinates, they are not in /api/places/nearby until they are updated with them.
+    op.add_column('places', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('places', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('places', sa.Column('geohash', sa.String(length=12), nullable=True))
+    op.create_index('ix_places_geohash', 'places', ['geohash'], unique=False, postgresql_ops={'geohash': 'text_pattern_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_places_geohash', table_name='places')
+    op.drop_column('places', 'geohash')
+    op.drop_column('places', 'longitude')
+    op.drop_column('places', 'latitude')
@@ -0,0 +1,28 @@
+"""votes user place index
+
+Revision ID: 8b4f1d3a6c25
+Revises: 6d2c9a4e8f17
+Create Date: 2026-10-18 13:42:17.503961
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b4f1d3a6c25'
+down_revision: Union[str, Sequence[str], None] = '6d2c9a4e8f17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_votes_user_id_place_id', 'votes', ['user_id', 'place_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_votes_user_id_place_id', table_name='votes')
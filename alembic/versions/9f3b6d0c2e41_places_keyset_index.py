@@ -0,0 +1,32 @@
+"""places keyset index
+
+Revision ID: 9f3b6d0c2e41
+Revises: 4c1e7a2d9b65
+Create Date: 2026-10-18 11:02:17.540913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f3b6d0c2e41'
+down_revision: Union[str, Sequence[str], None] = '4c1e7a2d9b65'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # created_at is the first key of the cursor, so it can't be null.
+    op.execute("UPDATE places SET created_at = now() WHERE created_at IS NULL")
+    op.alter_column('places', 'created_at', existing_type=sa.DateTime(timezone=True), nullable=False, existing_server_default=sa.text('now()'))
+    op.create_index('ix_places_created_at_id', 'places', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_places_created_at_id', table_name='places')
+    op.alter_column('places', 'created_at', existing_type=sa.DateTime(timezone=True), nullable=True, existing_server_default=sa.text('now()'))
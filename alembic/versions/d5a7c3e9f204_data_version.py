@@ -0,0 +1,35 @@
+"""data version
+
+Revision ID: d5a7c3e9f204
+Revises: 8b4f1d3a6c25
+Create Date: 2026-10-18 14:20:09.671352
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a7c3e9f204'
+down_revision: Union[str, Sequence[str], None] = '8b4f1d3a6c25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('data_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # The one row of the version, it starts at 1 so the existing data has a version.
+    op.execute("INSERT INTO data_version (id, version) VALUES (1, 1)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('data_version')
@@ -0,0 +1,59 @@
+"""votes unique user place
+
+Revision ID: f1b8d2c6a3e7
+Revises: d5a7c3e9f204
+Create Date: 2026-10-18 16:05:32.184427
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b8d2c6a3e7'
+down_revision: Union[str, Sequence[str], None] = 'd5a7c3e9f204'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Two clicks at the same time could insert the same vote twice, the last one (highest id) is the vote that is kept.
+    # The likes/dislikes of the places that have such votes counted all of them, so they are counted again from the kept ones
+    # before the others are deleted.
+    op.execute("""
+        UPDATE place_stats
+        SET num_likes = v.num_likes, num_dislikes = v.num_dislikes
+        FROM (
+            SELECT place_id,
+                SUM(CASE WHEN vote IS TRUE THEN 1 ELSE 0 END) AS num_likes,
+                SUM(CASE WHEN vote IS FALSE THEN 1 ELSE 0 END) AS num_dislikes
+            FROM (
+                SELECT DISTINCT ON (user_id, place_id) place_id, vote
+                FROM votes ORDER BY user_id, place_id, id DESC
+            ) kept
+            GROUP BY place_id
+        ) v
+        WHERE place_stats.place_id = v.place_id
+        AND place_stats.place_id IN (SELECT place_id FROM votes GROUP BY user_id, place_id HAVING COUNT(*) > 1)
+    """)
+    op.execute("""
+        DELETE FROM votes
+        USING votes newer
+        WHERE votes.user_id = newer.user_id AND votes.place_id = newer.place_id AND votes.id < newer.id
+    """)
+    # The counts of the places changed, so the cached place responses and the ETags are new.
+    op.execute("UPDATE data_version SET version = version + 1, updated_at = now()")
+
+    # The unique constraint has the same index as ix_votes_user_id_place_id (the user overlay), so that one is dropped.
+    op.drop_index('ix_votes_user_id_place_id', table_name='votes')
+    op.create_unique_constraint('unique_user_place_vote', 'votes', ['user_id', 'place_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The deleted duplicate votes are not brought back.
+    op.drop_constraint('unique_user_place_vote', 'votes', type_='unique')
+    op.create_index('ix_votes_user_id_place_id', 'votes', ['user_id', 'place_id'], unique=False)
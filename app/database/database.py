@@ -1,28 +1,173 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-
-engine = create_engine(os.getenv('DATABASE_URL'))
-sessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
-
-Base = declarative_base()
-"""
-This Base is the identifier for the class that will converted into tables. This contains orm and other details to change the columns property into constraints.
-"""
-
-
-
-# This creates the connection on each request and yield stop till the execution. This is called dependency.
-def get_db():
-    db=sessionLocal()
-
-    try:
-        yield db
-
-    finally:
-        db.close()
\ No newline at end of file
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from starlette.concurrency import run_in_threadpool
+import os
+from dotenv import load_dotenv
+from app.database.pool_metrics import PoolMetrics, timed_pool_class
+
+load_dotenv()
+
+"""
+The connection pool is set from the environment, the same settings are used for the sync and the async engine (each has its own pool):
+- DB_POOL_MODE: queue (default) keeps DB_POOL_SIZE connections open and opens up to DB_MAX_OVERFLOW more when they are all in use,
+  a request waits at most DB_POOL_TIMEOUT seconds for one.
+  null opens a connection for every checkout and closes it after (NullPool), it is for running behind PgBouncer in transaction
+  mode where PgBouncer is the pool. Then the prepared statement cache of asyncpg is also off, because the next transaction
+  can be on another server connection.
+- DB_POOL_RECYCLE: connections older than this (seconds) are opened again, for servers/proxies that close idle connections.
+- DB_POOL_PRE_PING: every checkout is tested with a ping first, a dead connection is replaced instead of failing the request.
+The waits for a connection and the pool events are counted in app/database/pool_metrics.py.
+"""
+DB_POOL_MODE = os.getenv('DB_POOL_MODE', 'queue')
+if DB_POOL_MODE not in ('queue', 'null'):
+    raise ValueError(f"DB_POOL_MODE must be 'queue' or 'null', not {DB_POOL_MODE!r}")
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '-1'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'false').lower() in ('1', 'true', 'yes')
+
+sync_pool_metrics = PoolMetrics('sync')
+async_pool_metrics = PoolMetrics('async')
+
+
+# create_engine/create_async_engine arguments for the url, queue_pool_class is QueuePool or AsyncAdaptedQueuePool.
+def engine_options(url, queue_pool_class, metrics):
+    options = {"pool_pre_ping": DB_POOL_PRE_PING}
+    if DB_POOL_MODE == 'null':
+        options["poolclass"] = timed_pool_class(NullPool, metrics)
+        if url.drivername == 'postgresql+asyncpg':
+            options["connect_args"] = {"statement_cache_size": 0}
+        return options
+
+    options.update(
+        poolclass=timed_pool_class(queue_pool_class, metrics),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return options
+
+
+database_url = make_url(os.getenv('DATABASE_URL'))
+engine = create_engine(database_url, **engine_options(database_url, QueuePool, sync_pool_metrics))
+sync_pool_metrics.listen(engine)
+sessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+Base = declarative_base()
+"""
+This Base is the identifier for the class that will converted into tables. This contains orm and other details to change the columns property into constraints.
+"""
+
+"""
+DATABASE_MODE picks how the endpoints talk to the database, so both can be compared on the same code:
+- sync (default): the sync engine above, the database work of a request runs in the threadpool of anyio (40 threads).
+- async: an AsyncEngine (asyncpg for postgres, aiosqlite for sqlite), the database work runs on the event loop and a request
+  waiting for the database does not hold a thread, so the concurrency is limited by the connection pool and not by the threadpool.
+The db_ops classes are the same in both modes. In async mode they run with AsyncSession.run_sync(), where the session is a
+normal Session but every query is awaited on the async driver (greenlet), that is how SQLAlchemy runs sync ORM code on asyncio.
+ASYNC_DATABASE_URL can be given, otherwise it is DATABASE_URL with the async driver.
+The background jobs (index refresh, NDJSON streams, CLIs) always use the sync engine.
+"""
+DATABASE_MODE = os.getenv('DATABASE_MODE', 'sync')
+if DATABASE_MODE not in ('sync', 'async'):
+    raise ValueError(f"DATABASE_MODE must be 'sync' or 'async', not {DATABASE_MODE!r}")
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+
+def async_database_url(url):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+async_engine = None
+asyncSessionLocal = None
+if DATABASE_MODE == 'async':
+    async_url = make_url(os.getenv('ASYNC_DATABASE_URL') or async_database_url(database_url))
+    if DB_POOL_MODE == 'null' and async_url.drivername == 'postgresql+asyncpg':
+        async_url = async_url.update_query_dict({"prepared_statement_cache_size": "0"})
+    async_engine = create_async_engine(async_url, **engine_options(async_url, AsyncAdaptedQueuePool, async_pool_metrics))
+    async_pool_metrics.listen(async_engine.sync_engine)
+    # The objects are read after the commit by the response model outside of run_sync, where they can't be loaded again.
+    asyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, autocommit=False, expire_on_commit=False)
+
+
+
+# This creates the connection on each request and yield stop till the execution. This is called dependency.
+def get_db():
+    db=sessionLocal()
+
+    try:
+        yield db
+
+    finally:
+        db.close()
+
+
+# This is the database of one request for the async endpoints, await db.run(function, *args) calls function(session, *args),
+# in a thread with the sync session or in run_sync with the async session.
+# Every run is closed at its end, so the connection goes back to the pool while the request waits for anything else
+# (a thread for its next run, bcrypt, google). A request that keeps a connection while it waits for a thread can block
+# the whole pool: all threads wait for a connection and the connections wait for a thread.
+# session_factory/async_session_factory are the sessionmakers of the primary, a replica gives its own (app/database/replicas.py).
+class RequestDb:
+    def __init__(self, session_factory=None, async_session_factory=None):
+        self.session_factory = session_factory or sessionLocal
+        self.async_session_factory = async_session_factory or asyncSessionLocal
+        self._session = None
+
+    def _run_and_close(self, function, args):
+        try:
+            return function(self._session, *args)
+        finally:
+            self._session.close()
+
+    async def run(self, function, *args):
+        if DATABASE_MODE == 'async':
+            if self._session is None:
+                self._session = self.async_session_factory()
+            try:
+                return await self._session.run_sync(function, *args)
+            finally:
+                await self._session.close()
+
+        if self._session is None:
+            self._session = self.session_factory()
+        return await run_in_threadpool(self._run_and_close, function, args)
+
+
+async def get_request_db():
+    return RequestDb()
+
+
+# This is the db ops class of a router on the request database, await db_ops.run(function, *args) calls function(db_ops, *args).
+# One db ops object is made for the request, so its per request state (the user overlay of PlacesDbOps) is shared by the runs.
+class AsyncDbOps:
+    def __init__(self, db, db_ops_class):
+        self.db = db
+        self.db_ops_class = db_ops_class
+        self._db_ops = None
+
+    def _call(self, session, function, args):
+        # a read that moved from a replica to the primary has a new session.
+        if self._db_ops is None or self._db_ops.db is not session:
+            self._db_ops = self.db_ops_class(session)
+        return function(self._db_ops, *args)
+
+    async def run(self, function, *args):
+        return await self.db.run(self._call, function, args)
+
+
+
+# postgres and sqlite both have "insert ... on conflict", so the insert is picked by the dialect of the session.
+def dialect_insert(db, table):
+    if db.get_bind().dialect.name == 'sqlite':
+        return sqlite.insert(table)
+    return postgresql.insert(table)
@@ -1,5 +1,5 @@
-from .database import Base
-
-from app.routers.places.models import Place
-from app.routers.users.models import User
-from app.routers.votes_ratings_feedback.models import Feedback, Votes, Ratings
+from .database import Base
+
+from app.routers.places.models import DataVersion, Place
+from app.routers.users.models import PrincipalVersion, User
+from app.routers.votes_ratings_feedback.models import Feedback, Votes, Ratings, PlaceStats
@@ -0,0 +1,116 @@
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+
+from app.utilities.metrics import db_pool_wait_seconds
+
+"""
+These are the numbers of a connection pool, they are shown by GET /api/admin/diagnostics/pool.
+
+The time a request waits for a connection (all connections in use, waiting for one to be returned) is not in any pool event,
+so the pool class of the engine is a subclass that times _do_get(), the method that takes a connection out of the pool
+(or opens a new one). That time is in a histogram, in milliseconds.
+The other numbers come from the pool events: connections opened/closed, checked out/in, invalidated.
+"""
+
+# upper bounds of the buckets in ms, the last bucket is everything above.
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class PoolMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.pool = None
+        self._lock = threading.Lock()
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_count = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.closes = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.in_use = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self._wait_histogram = db_pool_wait_seconds.labels(name)
+
+    def observe_wait(self, seconds):
+        self._wait_histogram.observe(seconds)
+        wait_ms = seconds * 1000
+        with self._lock:
+            self.wait_buckets[bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+            self.wait_count += 1
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+    def _count(self, name, step=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + step)
+
+    # The pool events of the engine, for the async engine it is its sync_engine.
+    def listen(self, engine):
+        self.pool = engine.pool
+        event.listen(engine, "connect", lambda dbapi_connection, record: self._count("connects"))
+        event.listen(engine, "close", lambda dbapi_connection, record: self._count("closes"))
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", lambda dbapi_connection, record, exception: self._count("invalidations"))
+        event.listen(engine, "soft_invalidate", lambda dbapi_connection, record, exception: self._count("soft_invalidations"))
+        # engine.dispose() makes a new pool, the live numbers are read from that one.
+        event.listen(engine, "engine_disposed", lambda disposed_engine: setattr(self, "pool", disposed_engine.pool))
+
+    def _on_checkout(self, dbapi_connection, record, proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+
+    def _on_checkin(self, dbapi_connection, record):
+        with self._lock:
+            self.checkins += 1
+            self.in_use -= 1
+
+    def stats(self):
+        pool = self.pool
+        with self._lock:
+            histogram = {f"le_{bound}ms": count for bound, count in zip(WAIT_BUCKETS_MS, self.wait_buckets)}
+            histogram["inf"] = self.wait_buckets[-1]
+            return {
+                "pool": type(pool).__name__ if pool is not None else None,
+                # size/overflow only exist on the queue pools, not on NullPool.
+                "size": pool.size() if hasattr(pool, "size") else None,
+                "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+                "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+                "in_use": self.in_use,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "closes": self.closes,
+                "invalidations": self.invalidations,
+                "soft_invalidations": self.soft_invalidations,
+                "timeouts": self.timeouts,
+                "wait_count": self.wait_count,
+                "wait_ms_avg": self.wait_ms_total / self.wait_count if self.wait_count else 0.0,
+                "wait_ms_max": self.wait_ms_max,
+                "wait_ms_histogram": histogram,
+            }
+
+
+# This is a subclass of the pool class that times every checkout into metrics, it is the poolclass given to create_engine.
+# pool.recreate() (dispose) makes the same class again, so the metrics stay.
+def timed_pool_class(pool_class, metrics):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return pool_class._do_get(self)
+        except sa_exc.TimeoutError:
+            metrics._count("timeouts")
+            raise
+        finally:
+            metrics.observe_wait(time.perf_counter() - start)
+
+    return type(f"Timed{pool_class.__name__}", (pool_class,), {"_do_get": _do_get, "metrics": metrics})
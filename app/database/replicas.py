@@ -0,0 +1,285 @@
+import itertools
+import logging
+import os
+import threading
+import time
+
+from fastapi import Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event, text
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.database.database import (
+    DATABASE_MODE,
+    DB_POOL_MODE,
+    RequestDb,
+    async_database_url,
+    asyncSessionLocal,
+    engine_options,
+    sessionLocal,
+)
+from app.database.pool_metrics import PoolMetrics
+from app.utilities.cache import TTLCache
+from app.utilities.oauth2 import get_current_user_optional
+
+"""
+These are the read replicas, the GET endpoints read from them and everything else stays on the primary (DATABASE_URL).
+
+- DATABASE_REPLICA_URLS: the urls of the replicas, comma separated. Without it every read is on the primary, like before.
+  Every replica has its own engine with the same pool settings as the primary (and an async one in DATABASE_MODE=async).
+- A background thread checks every replica every DATABASE_REPLICA_CHECK_SECONDS: a replica that can't be reached, or that is
+  more than DATABASE_REPLICA_MAX_LAG_SECONDS behind the primary, gets no reads till a check finds it fine again.
+  The reads go round robin over the replicas that are fine, when there is none they are on the primary.
+- A read that fails because the replica went away (connection error) marks it down and is run again on the primary.
+- Read your writes: after a user votes, rates or changes a place, the reads of that user are on the primary for
+  DATABASE_REPLICA_STICKY_SECONDS, so the user sees the change even when the replicas are behind. This is kept in this worker
+  (by user id) and in a cookie, so it also works when the next request goes to another uvicorn worker.
+The replica sessions are read only: a flush raises, and on postgres the transactions are READ ONLY too.
+The NDJSON streams, the index refresh and the CLIs stay on the primary.
+"""
+
+logger = logging.getLogger(__name__)
+
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+DATABASE_REPLICA_MAX_LAG_SECONDS = float(os.getenv('DATABASE_REPLICA_MAX_LAG_SECONDS', '5'))
+DATABASE_REPLICA_CHECK_SECONDS = float(os.getenv('DATABASE_REPLICA_CHECK_SECONDS', '5'))
+DATABASE_REPLICA_STICKY_SECONDS = float(os.getenv('DATABASE_REPLICA_STICKY_SECONDS', '10'))
+
+READ_PRIMARY_COOKIE = 'p2v_read_primary_until'
+
+# The lag is 0 when the replica has replayed everything it received (an idle primary sends nothing, so the time of the last
+# replayed transaction gets old without the replica being behind). A server that is not in recovery is not behind.
+POSTGRES_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReadOnlySession(Session):
+    pass
+
+
+@event.listens_for(ReadOnlySession, "before_flush")
+def refuse_flush(session, flush_context, instances):
+    raise sa_exc.InvalidRequestError("This session is on a read replica, the writes must use the primary (get_request_db)")
+
+
+class Replica:
+    def __init__(self, name, url):
+        self.name = name
+        self.url = make_url(url)
+        # postgres_readonly makes every transaction READ ONLY, the other databases only have the flush check.
+        readonly = {"postgresql_readonly": True} if self.url.get_backend_name() == 'postgresql' else {}
+        self.pool_metrics = PoolMetrics(name)
+        self.engine = create_engine(self.url, execution_options=readonly, **engine_options(self.url, QueuePool, self.pool_metrics))
+        self.pool_metrics.listen(self.engine)
+        self.sessionLocal = sessionmaker(bind=self.engine, class_=ReadOnlySession, autoflush=False, autocommit=False)
+
+        self.async_engine = None
+        self.asyncSessionLocal = None
+        self.async_pool_metrics = None
+        if DATABASE_MODE == 'async':
+            async_url = async_database_url(self.url)
+            if DB_POOL_MODE == 'null' and async_url.drivername == 'postgresql+asyncpg':
+                async_url = async_url.update_query_dict({"prepared_statement_cache_size": "0"})
+            self.async_pool_metrics = PoolMetrics(f"{name}-async")
+            self.async_engine = create_async_engine(
+                async_url, execution_options=readonly, **engine_options(async_url, AsyncAdaptedQueuePool, self.async_pool_metrics))
+            self.async_pool_metrics.listen(self.async_engine.sync_engine)
+            self.asyncSessionLocal = async_sessionmaker(
+                bind=self.async_engine, sync_session_class=ReadOnlySession, autoflush=False, autocommit=False,
+                expire_on_commit=False)
+
+        # It gets no reads till the first check.
+        self.healthy = False
+        self.lag_seconds = None
+        self.checked_at = None
+        self.error = None
+        self.reads = 0
+        self.failures = 0
+
+    def measure_lag(self):
+        with self.engine.connect() as connection:
+            if connection.dialect.name == 'postgresql':
+                return float(connection.execute(POSTGRES_LAG_SQL).scalar())
+            connection.execute(text("SELECT 1"))
+            return 0.0
+
+    def usable(self, max_lag_seconds):
+        return self.healthy and self.lag_seconds is not None and self.lag_seconds <= max_lag_seconds
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "url": self.url.render_as_string(hide_password=True),
+            "healthy": self.healthy,
+            "lag_seconds": self.lag_seconds,
+            "checked_at": self.checked_at,
+            "error": self.error,
+            "reads": self.reads,
+            "failures": self.failures,
+            "pool": self.pool_metrics.stats(),
+            "async_pool": self.async_pool_metrics.stats() if self.async_pool_metrics else None,
+        }
+
+
+class ReplicaRouter:
+    def __init__(self, urls, max_lag_seconds=DATABASE_REPLICA_MAX_LAG_SECONDS, sticky_seconds=DATABASE_REPLICA_STICKY_SECONDS):
+        self.replicas = [Replica(f"replica{number}", url) for number, url in enumerate(urls)]
+        self.max_lag_seconds = max_lag_seconds
+        self.sticky_seconds = sticky_seconds
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        # user id -> True while the reads of that user must be on the primary.
+        self.recent_writers = TTLCache(100000, sticky_seconds)
+        self.primary_reads = 0
+        self.sticky_reads = 0
+
+    # The next replica that is fine, round robin, or None for the primary.
+    def choose(self):
+        usable = [replica for replica in self.replicas if replica.usable(self.max_lag_seconds)]
+        if not usable:
+            with self._lock:
+                self.primary_reads += 1
+            return None
+        replica = usable[next(self._next) % len(usable)]
+        with self._lock:
+            replica.reads += 1
+        return replica
+
+    def check(self, replica):
+        try:
+            lag_seconds = replica.measure_lag()
+        except Exception as error:
+            if replica.healthy:
+                logger.warning('read replica %s is down: %s', replica.name, error)
+            replica.healthy = False
+            replica.error = str(error)
+        else:
+            if lag_seconds > self.max_lag_seconds:
+                logger.warning('read replica %s is %.1f seconds behind', replica.name, lag_seconds)
+            replica.healthy = True
+            replica.lag_seconds = lag_seconds
+            replica.error = None
+        replica.checked_at = time.time()
+
+    def check_all(self):
+        for replica in self.replicas:
+            self.check(replica)
+
+    # A request found the replica down, it gets no reads till the next check finds it fine.
+    def mark_failed(self, replica, error):
+        logger.warning('read on replica %s failed, reading from the primary: %s', replica.name, error)
+        with self._lock:
+            replica.failures += 1
+        replica.healthy = False
+        replica.error = str(error)
+
+    def _check_loop(self, stop_event):
+        while True:
+            self.check_all()
+            if stop_event.wait(DATABASE_REPLICA_CHECK_SECONDS):
+                return
+
+    # This is called at the app startup, the first check is in the thread too, the reads are on the primary till it is done.
+    def start(self):
+        stop_event = threading.Event()
+        if self.replicas:
+            threading.Thread(target=self._check_loop, args=(stop_event,), name='replica-health', daemon=True).start()
+        return stop_event
+
+    def mark_write(self, user_id):
+        self.recent_writers.set(user_id, True)
+
+    # The reads of the user are on the primary because they just wrote (counted like primary_reads, under the lock).
+    def reads_primary(self, request, current_user):
+        if current_user is not None and self.recent_writers.get(current_user.id):
+            sticky = True
+        else:
+            try:
+                sticky = float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+            except ValueError:
+                sticky = False
+        if sticky:
+            with self._lock:
+                self.sticky_reads += 1
+        return sticky
+
+    def stats(self):
+        return {
+            "max_lag_seconds": self.max_lag_seconds,
+            "sticky_seconds": self.sticky_seconds,
+            "check_seconds": DATABASE_REPLICA_CHECK_SECONDS,
+            "primary_reads": self.primary_reads,
+            "sticky_reads": self.sticky_reads,
+            "replicas": [replica.stats() for replica in self.replicas],
+        }
+
+
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS)
+
+
+# This is the request database of a GET endpoint, on a replica. If the replica fails with a connection error the run is
+# done again on the primary (the reads can be run twice).
+class ReadDb(RequestDb):
+    def __init__(self, replica):
+        super().__init__(replica.sessionLocal, replica.asyncSessionLocal)
+        self.replica = replica
+
+    async def run(self, function, *args):
+        if self.replica is None:
+            return await super().run(function, *args)
+        try:
+            return await super().run(function, *args)
+        except sa_exc.DBAPIError as error:
+            if not (error.connection_invalidated or isinstance(error, sa_exc.OperationalError)):
+                raise
+            replica_router.mark_failed(self.replica, error)
+        except OSError as error:
+            replica_router.mark_failed(self.replica, error)
+        await self._close_failed_session()
+        self.replica = None
+        self.session_factory = sessionLocal
+        self.async_session_factory = asyncSessionLocal
+        return await super().run(function, *args)
+
+    # The session of the failed replica is closed before the primary one is made, so its connection goes back to the replica
+    # pool (or is dropped when it was invalidated). The replica is already marked down, an error of the close is only logged.
+    async def _close_failed_session(self):
+        session, self._session = self._session, None
+        if session is None:
+            return
+        try:
+            if DATABASE_MODE == 'async':
+                await session.close()
+            else:
+                await run_in_threadpool(session.close)
+        except (sa_exc.SQLAlchemyError, OSError) as error:
+            logger.warning('closing the session of replica %s failed: %s', self.replica.name, error)
+
+
+# The routing get_db of the GET endpoints: a replica, or the primary when there is none that is fine or the user just wrote.
+async def get_read_db(request: Request, current_user = Depends(get_current_user_optional)):
+    if not replica_router.replicas:
+        return RequestDb()
+    if replica_router.reads_primary(request, current_user):
+        return RequestDb()
+    replica = replica_router.choose()
+    return ReadDb(replica) if replica is not None else RequestDb()
+
+
+# This is called by the endpoints that write for a user, the reads of that user are on the primary for a while after it.
+def mark_recent_write(user_id, response):
+    if not replica_router.replicas:
+        return
+    replica_router.mark_write(user_id)
+    response.set_cookie(
+        READ_PRIMARY_COOKIE, f"{time.time() + replica_router.sticky_seconds:.3f}",
+        max_age=int(replica_router.sticky_seconds) + 1, httponly=True, samesite="lax")
@@ -1,8 +1,21 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI
+from fastapi.datastructures import Default
+from fastapi.responses import JSONResponse
+from sqlalchemy import exc as sa_exc
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.database.replicas import replica_router
 from app.routers import googleAuth
+from app.routers.metrics import router as metricsrouter
 from app.routers.places.api import router as placerouter
+from app.routers.places.utilities.place_index import start_place_indexes
+from app.utilities.google_certs import google_cert_cache
+from app.utilities.json_response import FastJSONResponse
+from app.utilities.oauth2 import GOOGLE_CLIENT_ID
+from app.utilities.password_hashing import password_hasher
+from app.routers.users.adminpanel.diagnostics import router as admin_diagnostics_router
 from app.routers.users.adminpanel.places import router as admin_places_router
 from app.routers.users.adminpanel.users import router as admin_users_router
 from app.routers.users.adminpanel.vote_rating_feedback import router as admin_activity_router
@@ -10,8 +23,32 @@ from app.routers.users.api import router as userrouter
 from app.routers.votes_ratings_feedback.feedback import router as feedbackrouter
 from app.routers.votes_ratings_feedback.ratings import router as ratingsrouter
 from app.routers.votes_ratings_feedback.votes import router as votesrouter
+from app.utilities.pagination import NEXT_CURSOR_HEADER
+from app.utilities.metrics import MetricsMiddleware, mark_worker_stopped, track_route
+from app.utilities.query_counter import DB_QUERIES_HEADER, QueryCounterMiddleware
+
+
+# The in memory place indexes are built before the app starts taking requests.
+# The google certs are fetched in the background (only when the google login is configured).
+# The bcrypt pool is made on the first login and stopped at the shutdown.
+# The read replicas (when there are any) are checked in the background, the reads are on the primary till the first check.
+@asynccontextmanager
+async def lifespan(app):
+    stop_place_indexes = start_place_indexes()
+    stop_google_certs = google_cert_cache.start() if GOOGLE_CLIENT_ID else None
+    stop_replica_checks = replica_router.start()
+    yield
+    stop_place_indexes.set()
+    stop_replica_checks.set()
+    if stop_google_certs:
+        stop_google_certs.set()
+    password_hasher.shutdown()
+    mark_worker_stopped()
+
 
-app = FastAPI()
+# track_route labels the prometheus metrics of the request with its route template (app/utilities/metrics.py).
+# The routes with a response_model are serialized by pydantic, the default class (Default keeps that) is for the others.
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(track_route)], default_response_class=Default(FastJSONResponse))
 
 origins = [
     "http://localhost.tiangolo.com",
@@ -27,8 +64,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, DB_QUERIES_HEADER],
 )
 
+# The SQL statements of every request are counted (app/utilities/query_counter.py), it is outside of CORS so the
+# preflight requests are counted too. The prometheus metrics (app/utilities/metrics.py) are inside of it, the last
+# middleware added is the outer one, so they can read the statement counts of the request.
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(QueryCounterMiddleware)
+
+
+# No connection was free for DB_POOL_TIMEOUT seconds (app/database/database.py), the client can try again.
+@app.exception_handler(sa_exc.TimeoutError)
+async def pool_timeout_handler(request, error):
+    return JSONResponse(status_code=503, content={"detail": "The database is busy, try again"}, headers={"Retry-After": "1"})
+
 
 @app.get('/')
 def root():
@@ -43,3 +93,5 @@ app.include_router(ratingsrouter)
 app.include_router(admin_places_router)
 app.include_router(admin_users_router)
 app.include_router(admin_activity_router)
+app.include_router(admin_diagnostics_router)
+app.include_router(metricsrouter)
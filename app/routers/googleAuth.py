@@ -1,9 +1,9 @@
 from fastapi import status, HTTPException, Depends, APIRouter
 # This is pydantic, that used for the data defining that we will recieve from the client.
-from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 # Creating the table that we created in model.py
-from app.database.database import get_db
-from app.utilities.oauth2 import google_token_verification
+from app.database.database import get_request_db
+from app.utilities.oauth2 import google_login, google_token_verification
 from app.database.pydantic_models import Token, GoogleAuthToken
 
 router = APIRouter(
@@ -12,8 +12,9 @@ router = APIRouter(
 )
 
 @router.post('/auth/google', response_model=Token)
-def google_auth(request: GoogleAuthToken, db: Session = Depends(get_db)):
-    is_token, access_token = google_token_verification(request.token, db)
+async def google_auth(request: GoogleAuthToken, db = Depends(get_request_db)):
+    token_info = await run_in_threadpool(google_token_verification, request.token)
+    is_token, access_token = await db.run(lambda session: google_login(token_info, session))
     if is_token:
         return {'is_token':is_token,'access_token': access_token, 'token_type': 'bearer'}
     
@@ -0,0 +1,25 @@
+import hmac
+import os
+
+from fastapi import APIRouter, Header, HTTPException, Response, status
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from app.utilities.metrics import metrics_body
+
+"""
+This is the endpoint that Prometheus scrapes, the metrics are in app/utilities/metrics.py.
+It has no user login (the scraper has none), with METRICS_TOKEN set it needs "Authorization: Bearer <METRICS_TOKEN>".
+"""
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+router = APIRouter(
+    tags=['metrics']
+)
+
+
+@router.get('/metrics', include_in_schema=False)
+def metrics(authorization: str = Header(None)):
+    if METRICS_TOKEN and not hmac.compare_digest(authorization or '', f'Bearer {METRICS_TOKEN}'):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Unauthorized')
+    return Response(content=metrics_body(), media_type=CONTENT_TYPE_LATEST)
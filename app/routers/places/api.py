@@ -1,19 +1,38 @@
-from fastapi import status, HTTPException, Depends, APIRouter
+from fastapi import status, Depends, APIRouter, Query, Request, Response
 # This is pydantic, that used for the data defining that we will receive from the client.
-from typing import List
-from sqlalchemy.orm import Session
-from app.database.database import get_db
+from typing import List, Optional
+from app.database.database import AsyncDbOps, get_request_db
+from app.database.replicas import get_read_db, mark_recent_write
 # This is the pydantic validation model
 from app.routers.places.pydanticModels import Places
 # This is the pydantic response model
-from app.routers.places.pydanticModels import AllPlaceResponse, SpecificPlaceResponseModel
+from app.routers.places.pydanticModels import AllPlaceResponse, BatchPlaceResponse, NearbyPlaceResponse, PlaceSuggestion, SpecificPlaceResponseModel
 from app.routers.users.adminpanel.pydanticModels import AdminUpdatePlace
-from app.database.models import Place, Votes, Ratings
 from app.utilities.oauth2 import get_current_user, get_current_user_optional
-from sqlalchemy import and_
-from app.routers.places.helper_function import all_place_response, search_place_endpoint
+from app.routers.places.helper_function import (
+    conditional_all_place_response,
+    conditional_batch_place_response,
+    conditional_search_place_response,
+    conditional_specific_place_response,
+    create_place_response,
+    delete_place_response,
+    stream_place_rows,
+    update_place_response,
+)
 from app.routers.places.db_ops import PlacesDbOps
-from app.routers.places.helper_function import specific_place_response
+from app.routers.places.helper_function import nearby_place_response, suggest_place_response
+from app.utilities.cache import cached_json_response
+from app.utilities.fields import FIELDS_DESCRIPTION
+from app.utilities.json_response import json_response
+from app.utilities.pagination import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT
+from app.utilities.query_counter import query_budget
+from app.utilities.streaming import ndjson_response, wants_stream
+
+SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 50
+NEARBY_RADIUS_KM = 5
+MAX_NEARBY_RADIUS_KM = 100
+MAX_BATCH_PLACE_IDS = 100
 
 # models.Base.metadata.create_all(bind=engine)
 router = APIRouter(
@@ -22,89 +41,108 @@ router = APIRouter(
 )
 
 # this is the db ops initializer which will initialize the class.
-def db_ops_init(db: Session = Depends(get_db)):
-    return PlacesDbOps(db)
+# The endpoints are async, the database work of each one is one db_ops.run() (app/database/database.py).
+async def db_ops_init(db = Depends(get_request_db)):
+    return AsyncDbOps(db, PlacesDbOps)
+
+
+# The GET endpoints read from a replica when there is one (app/database/replicas.py), the writes above stay on the primary.
+async def read_db_ops_init(db = Depends(get_read_db)):
+    return AsyncDbOps(db, PlacesDbOps)
 
 
 # This is returning a list so we need to use List from typing library.
-@router.get('/all/place', status_code=status.HTTP_200_OK, response_model=List[AllPlaceResponse])
-def all_place(db_ops: Session = Depends(db_ops_init), current_user = Depends(get_current_user_optional)):
+# It is one page of places, the cursor of the next page is in the X-Next-Cursor header.
+# With stream=true (or Accept: application/x-ndjson) all the places after the cursor are streamed as NDJSON.
+# The budgets are the most statements a request of the route may run (app/utilities/query_counter.py), a page is a few
+# statements however many places are in it.
+@router.get('/all/place', status_code=status.HTTP_200_OK, response_model=List[AllPlaceResponse], dependencies=[Depends(query_budget(8))])
+async def all_place(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db_ops: AsyncDbOps = Depends(read_db_ops_init),
+    current_user = Depends(get_current_user_optional)):
 
-    # Finding average rating of overall categories
-    place = all_place_response(current_user, db_ops)
-    return place
+    if wants_stream(request, stream):
+        return ndjson_response(stream_place_rows(current_user, cursor), AllPlaceResponse)
+
+    return await db_ops.run(lambda ops: conditional_all_place_response(request, current_user, ops, cursor, limit, fields))
 
 """
 Depends is the function which tells that first run and give me the result then run next function.
 """
 
 @router.post('/add/place', status_code=status.HTTP_201_CREATED)
-def create_place(request: Places, db_ops: Session = Depends(db_ops_init), current_user = Depends(get_current_user)):
-    # print(request.model_dump())
-    # This is going to first convert into dict and then unpack it.
-
-    # Checking that the place_name or place
-    role = current_user.role
-    if role == 'staff' or role == 'admin':
-        if db_ops.create_place(request):
-            return {"message":"place created successfully"}
-        
-        raise HTTPException(status_code=status.WS_1005_NO_STATUS_RCVD, detail="Error!")
-
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized"
-        )
-
-@router.get('/place/{id}', response_model=SpecificPlaceResponseModel)
-def specific_place(id: int, db_ops: Session = Depends(db_ops_init), current_user = Depends(get_current_user)):
-    user_id = current_user.id
-    place_id=id
-    place_with_vote = specific_place_response(db_ops, user_id, place_id)
-    return place_with_vote
+async def create_place(request: Places, response: Response, db_ops: AsyncDbOps = Depends(db_ops_init), current_user = Depends(get_current_user)):
+    place = await db_ops.run(lambda ops: create_place_response(request, ops, current_user))
+    mark_recent_write(current_user.id, response)
+    return place
+
+
+@router.get('/place/{id}', response_model=SpecificPlaceResponseModel, dependencies=[Depends(query_budget(8))])
+async def specific_place(id: int, request: Request, response: Response, db_ops: AsyncDbOps = Depends(read_db_ops_init), current_user = Depends(get_current_user)):
+    return await db_ops.run(lambda ops: conditional_specific_place_response(request, response, current_user, ops, id))
+
+# This is the place detail of many places in one request, ?ids=1,2,3 (at most MAX_BATCH_PLACE_IDS).
+# It is a few statements for the whole batch, the ids that are not places are in "missing" and don't fail the request.
+@router.get('/places', response_model=BatchPlaceResponse, dependencies=[Depends(query_budget(8))])
+async def batch_place(
+    request: Request,
+    response: Response,
+    ids: str = Query(..., description=f"Comma separated place ids, at most {MAX_BATCH_PLACE_IDS}."),
+    db_ops: AsyncDbOps = Depends(read_db_ops_init),
+    current_user = Depends(get_current_user)):
+    return await db_ops.run(lambda ops: conditional_batch_place_response(request, response, current_user, ops, ids, MAX_BATCH_PLACE_IDS))
 
 @router.delete('/place/delete/{id}')
-def delete_place(id:int, db_ops: Session = Depends(db_ops_init), current_user= Depends(get_current_user)):
-    place = db_ops.place_query_with_id(id)   # This always return some query, so it can't be empty.
-    # .first() always return orm, if found and none if not found.
-    role = current_user.role
-    if role == 'admin':
-        if not place:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'The place of the id:{id} is not found.')
-        
-        else:
-            db_ops.delete_query(place)
-            return {'success':'The place has been deleted.'}
-    else:
-        return HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized"
-        )
+async def delete_place(id:int, response: Response, db_ops: AsyncDbOps = Depends(db_ops_init), current_user= Depends(get_current_user)):
+    deleted = await db_ops.run(lambda ops: delete_place_response(id, ops, current_user))
+    mark_recent_write(current_user.id, response)
+    return deleted
     
 @router.put('/place/update/{id}')
-def update_place(request:AdminUpdatePlace, id:int, db_ops: Session = Depends(db_ops_init), current_user= Depends(get_current_user)):
-    db=db_ops.get_only_db()
-    place_query = db.query(Place).filter(Place.id == id)
-    place = place_query.first()
-    role = current_user.role
-    # print(role)
-    if role == 'staff' or role == 'admin':
-        if not place:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'The place of the id:{id} is not found.')
-        
-        db_ops.update_query(place_query, request)
-
-        return {'success':'post updated.'}
-    else:
-        return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
-
-
-@router.get('/places/search/', response_model=List[AllPlaceResponse])
-def search_place(
+async def update_place(request:AdminUpdatePlace, id:int, response: Response, db_ops: AsyncDbOps = Depends(db_ops_init), current_user= Depends(get_current_user)):
+    updated = await db_ops.run(lambda ops: update_place_response(id, request, ops, current_user))
+    mark_recent_write(current_user.id, response)
+    return updated
+
+@router.get('/places/search/', response_model=List[AllPlaceResponse], dependencies=[Depends(query_budget(8))])
+async def search_place(
     search,
-    db_ops: Session = Depends(db_ops_init),
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db_ops: AsyncDbOps = Depends(read_db_ops_init),
     current_user = Depends(get_current_user_optional)):
 
     # print(current_user)
-    return search_place_endpoint(current_user, db_ops, search)
+    return await db_ops.run(lambda ops: conditional_search_place_response(request, current_user, ops, search, cursor, limit, fields))
+
+# This is for the typeahead of the search box, it is called on every keystroke.
+# It is matching the start of the place name, of any word in the name or of the pincode, and it does not need a login or the database.
+@router.get('/places/suggest', response_model=List[PlaceSuggestion], dependencies=[Depends(query_budget(1))])
+async def suggest_place(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(SUGGEST_LIMIT, ge=1, le=MAX_SUGGEST_LIMIT)):
+
+    return suggest_place_response(q, limit)
+
+
+# These are the places around the point (radius in km), closest first. Only the places with coordinates are in it.
+@router.get('/places/nearby', response_model=List[NearbyPlaceResponse], dependencies=[Depends(query_budget(6))])
+async def nearby_place(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius: float = Query(NEARBY_RADIUS_KM, gt=0, le=MAX_NEARBY_RADIUS_KM),
+    limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    db_ops: AsyncDbOps = Depends(read_db_ops_init),
+    current_user = Depends(get_current_user_optional)):
+
+    if current_user is None:
+        return await db_ops.run(lambda ops: cached_json_response(("nearby", lat, lon, radius, limit), List[NearbyPlaceResponse], lambda: (nearby_place_response(None, ops, lat, lon, radius, limit), None)))
+
+    return json_response(List[NearbyPlaceResponse], await db_ops.run(lambda ops: nearby_place_response(current_user, ops, lat, lon, radius, limit)))
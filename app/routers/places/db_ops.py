@@ -1,65 +1,150 @@
 from app.routers.places.models import Place
-from sqlalchemy import and_, or_, cast, String
-from app.routers.votes_ratings_feedback.models import Ratings, Votes
+from sqlalchemy import or_, select, tuple_
+from app.routers.places.utilities.data_version import bump_data_version, current_data_version
+from app.routers.places.utilities.full_text_search import search_places
+from app.routers.places.utilities.geohash import KM_PER_DEGREE, covering_cells, place_geohash
+from app.routers.places.utilities.place_index import index_place, unindex_place
+from app.routers.places.utilities.user_overlay import UserOverlay
+from app.utilities.cache import invalidate_response_cache
+from app.utilities.pagination import DEFAULT_PAGE_LIMIT
+from app.utilities.streaming import STREAM_BATCH_SIZE
+from app.routers.votes_ratings_feedback.models import PlaceStats
+from app.routers.votes_ratings_feedback.utilities.place_stats import average_rating_from_stats, bump_place_version
 
 class PlacesDbOps:
     def __init__(self, db):
         self.db = db
+        self._user_overlays = {}
     
     def get_only_db(self):
         return self.db
     
-    def search_all_place(self, search_query):
-        db = self.db
-        place = []
-        for all_query in search_query:
-            search_pattern = f"%{all_query}%"
-            place_search = db.query(Place).filter(or_(Place.place_name.ilike(search_pattern), (Place.about_place.ilike(search_pattern)), (Place.place_address.ilike(search_pattern)), (cast(Place.pincode, String).ilike(search_pattern)) )).limit(20).all()
-
-            place.extend(place_search)
-        
-        return place
-    
-    def all_vote_query(self, place_id):
+    # This is one ranked full text search query (or exact pincode match), it returns the page and the cursor of the next page.
+    # With columns the rows are only these columns of the places (a sparse fieldset, app/utilities/fields.py).
+    def search_all_place(self, search, cursor=None, limit=DEFAULT_PAGE_LIMIT, columns=None):
+        return search_places(self.db, search, cursor, limit, columns)
+
+    # (version, updated_at) of the place data, it is the ETag/Last-Modified of the place lists.
+    def data_version_query(self):
+        return current_data_version(self.db)
+
+    # place_id -> (created_at, version, updated_at) of these places, it is the ETag/Last-Modified of their detail.
+    # version and updated_at are None for a place without a stats row (nothing written since it was created).
+    def place_versions_query(self, place_ids):
         db=self.db
-        return db.query(Votes).filter(Votes.place_id == place_id).all()
-    
-    def all_place_query(self):
+        rows = db.execute(
+            select(Place.id, Place.created_at, PlaceStats.version, PlaceStats.updated_at)
+            .outerjoin(PlaceStats, PlaceStats.place_id == Place.id)
+            .where(Place.id.in_(place_ids))
+        )
+        return {row.id: row for row in rows}
+
+    # This is the vote and rated flag of this user, the db ops lives for one request so the overlay is loaded only once per request.
+    def user_overlay(self, user_id):
+        overlay = self._user_overlays.get(user_id)
+        if overlay is None:
+            overlay = self._user_overlays[user_id] = UserOverlay(self.db, user_id)
+        return overlay
+
+    # This is giving the likes, dislikes and ratings for the whole page.
+    # The counts are read from the place_stats table, so it is one row per place instead of counting all votes and ratings.
+    def place_aggregate_query(self, place_ids):
         db=self.db
-        return db.query(Place).all()
+        aggregate = {place_id: {"num_likes": 0, "num_dislikes": 0, "total_user_rated": 0, "overall": 0.0} for place_id in place_ids}
+        if not aggregate:
+            return aggregate
+
+        for stats in db.execute(select(PlaceStats).where(PlaceStats.place_id.in_(place_ids))).scalars():
+            place = aggregate[stats.place_id]
+            place["num_likes"] = stats.num_likes
+            place["num_dislikes"] = stats.num_dislikes
+            place["total_user_rated"] = stats.total_user_rated
+            place["overall"] = average_rating_from_stats(stats)[1]
+
+        return aggregate
 
-    def is_voted_query(self, user_id, place_id):
+    def place_stats_query(self, place_id):
         db=self.db
-        return db.query(Votes).filter(and_(Votes.user_id==user_id, Votes.place_id==place_id)).first()
-    
-    def all_rated_place_query(self, place_id):
+        return db.query(PlaceStats).filter(PlaceStats.place_id == place_id).first()
+
+    # place_id -> place stats of these places in one query, a place without a stats row is not in it.
+    def place_stats_query_with_ids(self, place_ids):
         db=self.db
-        return db.query(Ratings).filter(Ratings.place_id == place_id).all()
-    
-    def is_user_rated_place_query(self, user_id, place_id):
+        if not place_ids:
+            return {}
+        return {stats.place_id: stats for stats in db.execute(select(PlaceStats).where(PlaceStats.place_id.in_(place_ids))).scalars()}
+
+    # This is returning one page (limit + 1 rows, the extra one tells that there is a next page) after the cursor (created_at, id).
+    def all_place_query(self, after=None, limit=DEFAULT_PAGE_LIMIT, columns=None):
+        return self._place_page(self._place_columns_query(columns), after, limit)
+
+    # This is for the streaming mode, all places after the cursor read from the server side cursor in batches.
+    def stream_place_query(self, after=None):
+        query = self.db.query(Place)
+        if after is not None:
+            query = query.filter(tuple_(Place.created_at, Place.id) > tuple_(*after))
+        return query.order_by(Place.created_at, Place.id).yield_per(STREAM_BATCH_SIZE)
+
+    # The whole Place objects, or only these columns.
+    def _place_columns_query(self, columns):
         db=self.db
-        return db.query(Ratings).filter(and_(Ratings.user_id==user_id, Ratings.place_id==place_id)).first()
-    
+        return db.query(Place) if columns is None else db.query(*columns)
+
+    def _place_page(self, query, after, limit):
+        if after is not None:
+            query = query.filter(tuple_(Place.created_at, Place.id) > tuple_(*after))
+        return query.order_by(Place.created_at, Place.id).limit(limit + 1).all()
+
+    # These are the places in the geohash cells around the point (index range scans) and inside the latitude/longitude box of the radius.
+    # The box is only to read less rows, the exact distance is checked by the helper.
+    def nearby_place_query(self, latitude, longitude, radius_km):
+        db=self.db
+        cells = covering_cells(latitude, longitude, radius_km)
+        lat_delta = radius_km / KM_PER_DEGREE
+        return db.query(Place).filter(
+            or_(*[Place.geohash.like(f"{cell}%") for cell in cells]),
+            Place.latitude.between(latitude - lat_delta, latitude + lat_delta),
+        ).all()
+
     def create_place(self, request):
         db=self.db
-        place = Place(**request.model_dump())
+        place = Place(**request.model_dump(), geohash=place_geohash(request.latitude, request.longitude))
         db.add(place)
+        bump_data_version(db)
         db.commit()
         # This refresh is for when the data is returned, then it will first refresh db and then return so that all data should go and this store the data in place.
         db.refresh(place)
+        index_place(place)
+        invalidate_response_cache()
         return True
     
     def place_query_with_id(self, id):
         db=self.db
         return db.query(Place).filter(Place.id == id).first()
     
+    # places of these ids in the same order as the ids (the fuzzy search gives them best match first).
+    def place_query_with_ids(self, ids, columns=None):
+        place = {place_row.id: place_row for place_row in self._place_columns_query(columns).filter(Place.id.in_(ids)).all()}
+        return [place[place_id] for place_id in ids if place_id in place]
+
     def delete_query(self, db_row):
         db=self.db
+        place_id = db_row.id
         db.delete(db_row)
+        bump_data_version(db)
         db.commit()
+        unindex_place(place_id)
+        invalidate_response_cache()
         return True
     
-    def update_query(self, place_query, request):
+    def update_query(self, place_query, request, place_id):
         db=self.db
-        place_query.update(request.model_dump(), synchronize_session=False)
+        values = request.model_dump()
+        values["geohash"] = place_geohash(request.latitude, request.longitude)
+        place_query.update(values, synchronize_session=False)
+        bump_place_version(db, place_id)
+        bump_data_version(db)
         db.commit()
+        # populate_existing, the place can be in the session from before the update (the async session does not expire on commit).
+        index_place(place_query.populate_existing().first())
+        invalidate_response_cache()
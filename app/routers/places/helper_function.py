@@ -1,56 +1,52 @@
+import hashlib
+from itertools import islice
+from typing import List
+from app.routers.places.db_ops import PlacesDbOps
 from app.routers.places.models import Place
+from app.routers.places.pydanticModels import AllPlaceResponse
+from app.routers.places.utilities.geohash import haversine_km
+from app.routers.places.utilities.place_index import fuzzy_search_place_ids, suggest_places
 from fastapi import status, HTTPException
-from app.routers.votes_ratings_feedback.models import Ratings, Votes
-from sqlalchemy import and_, or_, cast, String
-from app.routers.votes_ratings_feedback.utilities.calc_avg_rating import calculate_average_rating_all_categories
-from app.routers.votes_ratings_feedback.utilities.calc_votes import calculate_vote
+from app.routers.votes_ratings_feedback.utilities.place_stats import average_rating_from_stats
+from app.utilities.cache import cached_json_response, cached_value, cached_values
+from app.utilities.fields import model_columns, parse_fields, sparse_model
+from app.utilities.json_response import json_response
+from app.utilities.conditional import data_validators, is_not_modified, not_modified_response, set_validators
+from app.utilities.pagination import DEFAULT_PAGE_LIMIT, decode_place_cursor, page_with_cursor, place_cursor_key, set_next_cursor
+from app.utilities.streaming import STREAM_BATCH_SIZE, stream_with_session
 
 
 
 
 # This is the function for all place response with vote and ratings.
-def all_place_response(current_user, db, place=None):
-    if place is None:
-        place = db.all_place_query()
+# The dicts have every field of AllPlaceResponse in its order and type, they are written as they are (app/utilities/json_response.py).
+def all_place_response(current_user, db, place):
+    place_ids = [place_row.id for place_row in place]
+
     if current_user:
         user_id = current_user.id
-        # This is for logged-in users
+        # This is for logged-in users, the vote and rating of this user for every place come from the user overlay (no query per place).
+        aggregate = db.place_aggregate_query(place_ids)
+        overlay = db.user_overlay(user_id).load(place_ids)
 
         # Now I am here creating a list of JSON/Dict structure so that I can store in the format that which place has vote
         place_with_vote = []
         # iterating the place and then extracting information.
         for place_row in place:
-            place_id = place_row.id
-            # Calculate votes for this place only.
-            vote = db.all_vote_query(place_id)
-            like, dislike = calculate_vote(vote)
-
-            is_voted = db.is_voted_query(user_id, place_id)
-            # using the function that will calculate the ratings.
-            rating = db.all_rated_place_query(place_id)
-
-            # It is return 9 things because of specific place, so we are using indexing
-            rating_response = calculate_average_rating_all_categories(rating)
-
-            average_rating = rating_response[1]
-            total_user = rating_response[0]
-
-            # checking is user is rated or not this place
-            is_user_rated = db.is_user_rated_place_query(user_id, place_id)
-
+            place_aggregate = aggregate[place_row.id]
             place_with_vote.append({
                 "place_name": place_row.place_name,
                 "place_address": place_row.place_address,
                 "about_place": place_row.about_place,
                 "pincode": place_row.pincode,
+                "id": place_row.id,
+                "voted": overlay.voted(place_row.id),
                 "created_at": place_row.created_at,
-                "id": place_id,
-                "voted": is_voted.vote if is_voted else None,
-                "num_likes": like,
-                "num_dislikes": dislike,
-                "overall": average_rating,
-                "total_user_rated": total_user,
-                "is_user_rated": bool(is_user_rated)
+                "num_likes": place_aggregate["num_likes"],
+                "num_dislikes": place_aggregate["num_dislikes"],
+                "overall": place_aggregate["overall"],
+                "total_user_rated": place_aggregate["total_user_rated"],
+                "is_user_rated": overlay.is_rated(place_row.id)
             })
 
 
@@ -61,77 +57,255 @@ def all_place_response(current_user, db, place=None):
         problem will be:
         In pydantic, num of like and dislike and overall rating is also, so I need to create the new rows.
         """
+        aggregate = db.place_aggregate_query(place_ids)
+
         # creating a list
         # this place contains all the data
         all_places = []
 
         # so I am creating a list.
         for place_row in place:
-            place_id = place_row.id
-            # Calculate votes for this place only.
-            vote = db.all_vote_query(place_id)
-            like, dislike = calculate_vote(vote)
-
-            rating = db.all_rated_place_query(place_id)
-            # using the function that will calculate the ratings.
-            rating_response = calculate_average_rating_all_categories(rating)
-            average_rating = rating_response[1]
-            total_user = rating_response[0]
-            # if vote is given by the user
+            place_aggregate = aggregate[place_row.id]
             all_places.append({
                 "place_name":place_row.place_name,
                 "place_address":place_row.place_address,
                 "about_place":place_row.about_place,
                 "pincode":place_row.pincode,
+                "id": place_row.id,
+                "voted": None,
                 "created_at":place_row.created_at,
-                "id": place_id,
-                "num_likes":like,
-                "num_dislikes":dislike,
-                "overall": average_rating,
-                "total_user_rated": total_user
+                "num_likes":place_aggregate["num_likes"],
+                "num_dislikes":place_aggregate["num_dislikes"],
+                "overall": place_aggregate["overall"],
+                "total_user_rated": place_aggregate["total_user_rated"],
+                "is_user_rated": None
             })
         return all_places
 
 
-def search_place_endpoint(current_user, db_ops, search):
+# These are the fields of AllPlaceResponse by where they come from: the places table, the place stats, the user overlay.
+PLACE_COLUMN_FIELDS = {"place_name", "place_address", "about_place", "pincode", "id", "created_at"}
+PLACE_STATS_FIELDS = {"num_likes", "num_dislikes", "overall", "total_user_rated"}
+PLACE_USER_FIELDS = {"voted", "is_user_rated"}
+
+
+# The columns of the places that the page of these fields selects, id and created_at are always there for the cursor and the
+# stats/overlay lookups. None (the whole Place) for the full view.
+def place_columns(fields):
+    if fields is None:
+        return None
+    return model_columns(Place, [field for field in fields if field in PLACE_COLUMN_FIELDS], ("id", "created_at"))
+
+
+# The response model of the listing/search for these fields.
+def place_list_model(fields):
+    return List[AllPlaceResponse if fields is None else sparse_model(AllPlaceResponse, fields)]
+
+
+# This is all_place_response with only these fields (app/utilities/fields.py), the place stats and the user overlay are
+# only queried when one of their fields is asked.
+def sparse_place_response(current_user, db, place, fields):
+    if fields is None:
+        return all_place_response(current_user, db, place)
+
+    place_ids = [place_row.id for place_row in place]
+    aggregate = db.place_aggregate_query(place_ids) if PLACE_STATS_FIELDS.intersection(fields) else None
+    overlay = None
+    if current_user and PLACE_USER_FIELDS.intersection(fields):
+        overlay = db.user_overlay(current_user.id).load(place_ids)
+
+    rows = []
+    for place_row in place:
+        row = {}
+        for field in fields:
+            if field in PLACE_STATS_FIELDS:
+                row[field] = aggregate[place_row.id][field]
+            elif field == "voted":
+                row[field] = overlay.voted(place_row.id) if overlay else None
+            elif field == "is_user_rated":
+                row[field] = overlay.is_rated(place_row.id) if overlay else None
+            else:
+                row[field] = getattr(place_row, field)
+        rows.append(row)
+    return rows
+
+
+# This is the ETag/Last-Modified of the place lists for this user, from the data version (one small query, no aggregation).
+def place_validators(db_ops, current_user):
+    version, updated_at = db_ops.data_version_query()
+    return data_validators(version, updated_at, current_user)
+
+
+# The ETag/Last-Modified of the detail of one place is the version of its stats row, a write of another place doesn't change it.
+# place_version is a row of db_ops.place_versions_query.
+def place_version_validators(place_version, current_user):
+    return data_validators(place_version.version or 0, place_version.updated_at or place_version.created_at, current_user)
+
+
+# The ETag of a batch is a hash of the versions of its places, it changes when one of them is written, deleted or created.
+def batch_validators(place_versions, current_user):
+    versions = ",".join(f"{place_id}.{row.version or 0}" for place_id, row in sorted(place_versions.items()))
+    updated_at = [row.updated_at or row.created_at for row in place_versions.values()]
+    return data_validators(hashlib.sha1(versions.encode()).hexdigest()[:16], max(updated_at, default=None), current_user)
+
+
+# These are the bodies of the place GET endpoints, one database run per request (app/database/database.py, AsyncDbOps).
+# The client that already has this version gets 304 before any aggregation (app/utilities/conditional.py).
+# The anonymous response is the same for everyone, so its JSON is cached (app/utilities/cache.py).
+# The listing and the search return the Response with the JSON body (app/utilities/json_response.py), not the dicts.
+# The version is in the key, so a write of another worker is also a new key.
+# fields is the sparse fieldset (app/utilities/fields.py), it is parsed before anything so an unknown field is 400 straight away.
+def conditional_all_place_response(request, current_user, db_ops, cursor, limit, fields=None):
+    fields = parse_fields(fields, AllPlaceResponse)
+    validators = place_validators(db_ops, current_user)
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+
+    if current_user is None:
+        cached = cached_json_response(("all_place", validators.version, cursor, limit, fields), place_list_model(fields), lambda: all_place_page_response(None, db_ops, cursor, limit, fields))
+        return set_validators(cached, validators)
+
+    # Finding average rating of overall categories
+    place, next_cursor = all_place_page_response(current_user, db_ops, cursor, limit, fields)
+    response = json_response(place_list_model(fields), place)
+    set_next_cursor(response, next_cursor)
+    return set_validators(response, validators)
+
+
+def conditional_search_place_response(request, current_user, db_ops, search, cursor, limit, fields=None):
+    fields = parse_fields(fields, AllPlaceResponse)
+    validators = place_validators(db_ops, current_user)
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+
+    if current_user is None:
+        # The search is case and space insensitive, so the key is normalized the same way.
+        search_key = " ".join(search.lower().split())
+        cached = cached_json_response(("search", validators.version, search_key, cursor, limit, fields), place_list_model(fields), lambda: search_place_endpoint(None, db_ops, search, cursor, limit, fields))
+        return set_validators(cached, validators)
+
+    place, next_cursor = search_place_endpoint(current_user, db_ops, search, cursor, limit, fields)
+    response = json_response(place_list_model(fields), place)
+    set_next_cursor(response, next_cursor)
+    return set_validators(response, validators)
+
+
+def conditional_specific_place_response(request, response, current_user, db_ops, place_id):
+    place_version = db_ops.place_versions_query([place_id]).get(place_id)
+    if place_version is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    validators = place_version_validators(place_version, current_user)
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+
+    place_with_vote = specific_place_response(db_ops, current_user.id, place_id, validators.version)
+    set_validators(response, validators)
+    return place_with_vote
+
+
+# This is returning one page of the places and the cursor for the next page.
+def all_place_page_response(current_user, db_ops, cursor, limit, fields=None):
+    place = db_ops.all_place_query(decode_place_cursor(cursor), limit, place_columns(fields))
+    place, next_cursor = page_with_cursor(place, limit, place_cursor_key)
+    return sparse_place_response(current_user, db_ops, place, fields), next_cursor
+
+
+# This is the streaming mode of the place listing, it yields the same dicts as all_place_response batch by batch.
+def stream_place_rows(current_user, cursor):
+    # cursor is decoded here so the invalid cursor is 400 and not an error in the middle of the stream.
+    after = decode_place_cursor(cursor)
+
+    def generate(db):
+        db_ops = PlacesDbOps(db)
+        place = iter(db_ops.stream_place_query(after))
+        while batch := list(islice(place, STREAM_BATCH_SIZE)):
+            yield from all_place_response(current_user, db_ops, batch)
+
+    return stream_with_session(generate)
+
+
+def search_place_endpoint(current_user, db_ops, search, cursor=None, limit=DEFAULT_PAGE_LIMIT, fields=None):
     if search:
-        search_query = search.split()
-        place = db_ops.search_all_place(search_query)
-        return all_place_response(current_user, db_ops, place)
+        columns = place_columns(fields)
+        place, next_cursor = db_ops.search_all_place(search, cursor, limit, columns)
+        # Nothing found on the first page is most of the time a spelling mistake, so the fuzzy n-gram index is tried.
+        if not place and cursor is None:
+            place = db_ops.place_query_with_ids(fuzzy_search_place_ids(search, limit), columns)
+        return sparse_place_response(current_user, db_ops, place, fields), next_cursor
+    return [], None
+
+
 
+# The places within radius_km of the point, closest first, with the same vote/rating summary as the place listing.
+def nearby_place_response(current_user, db_ops, latitude, longitude, radius_km, limit):
+    distances = []
+    for place_row in db_ops.nearby_place_query(latitude, longitude, radius_km):
+        distance = haversine_km(latitude, longitude, place_row.latitude, place_row.longitude)
+        if distance <= radius_km:
+            distances.append((distance, place_row.id, place_row))
+    distances.sort(key=lambda item: item[:2])
+    distances = distances[:limit]
 
+    place = [place_row for _, _, place_row in distances]
+    nearby = all_place_response(current_user, db_ops, place)
+    for place_dict, (distance, _, place_row) in zip(nearby, distances):
+        place_dict["latitude"] = place_row.latitude
+        place_dict["longitude"] = place_row.longitude
+        place_dict["distance_km"] = round(distance, 3)
+    return nearby
 
-def specific_place_response(db_ops, user_id, place_id):
-    place = db_ops.place_query_with_id(place_id)    
 
-    # Calculate votes for this place only.
-    all_vote = db_ops.all_vote_query(place_id)
-    like, dislike = calculate_vote(all_vote)
+# place_version is the version of the place in the ETag of this request, it is in the cache key so the cached part is never
+# older than the ETag sent with it.
+def specific_place_response(db_ops, user_id, place_id, place_version):
+    # The place with its vote/rating summary is the same for every user, so it is cached and only the vote and rating of this user are added.
+    place_detail = cached_value(("place", place_version, place_id), lambda: place_detail_response(db_ops, place_id))
 
     # place is not available of that id then run this
-    if not place:
+    if not place_detail:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND) 
 
     # if place is available then run this
-    is_user_voted = db_ops.is_voted_query(user_id, place_id)
+    overlay = db_ops.user_overlay(user_id).load([place_id])
 
-    rating = db_ops.all_rated_place_query(place_id)
+    place_with_vote = {
+        **place_detail,
+        "voted": overlay.voted(place_id),
+        "is_user_rated": overlay.is_rated(place_id)
+    }
+    return place_with_vote
 
-    # It is return 9 things because of specific place, so we are using indexing
-    ratings = calculate_average_rating_all_categories(rating)
 
-    is_user_rated = db_ops.is_user_rated_place_query(user_id, place_id)
+# This is the part of the place detail that is not about the user, None when there is no place of this id.
+def place_detail_response(db_ops, place_id):
+    place = db_ops.place_query_with_id(place_id)
+    if not place:
+        return None
 
-    place_with_vote = {
+    # Votes and the sum of all rating categories are already in the place stats.
+    return place_detail(place, db_ops.place_stats_query(place_id))
+
+
+# The same for many places, place_id -> detail of the places that are there. It is one query for the places and one for their stats.
+def place_details_response(db_ops, place_ids):
+    place = db_ops.place_query_with_ids(place_ids)
+    stats = db_ops.place_stats_query_with_ids([place_row.id for place_row in place])
+    return {place_row.id: place_detail(place_row, stats.get(place_row.id)) for place_row in place}
+
+
+def place_detail(place, stats):
+    # It is return 8 things (total, then the average of each category), so we are using indexing
+    ratings = average_rating_from_stats(stats)
+
+    return {
         "place_name": place.place_name,
         "place_address": place.place_address,
         "about_place": place.about_place,
         "pincode": place.pincode,
         "created_at": place.created_at,
         "id": place.id,
-        "voted": is_user_voted.vote if is_user_voted else None,
-        "num_likes": like,
-        "num_dislikes": dislike,
+        "num_likes": stats.num_likes if stats else 0,
+        "num_dislikes": stats.num_dislikes if stats else 0,
 
         "overall": ratings[1],
         "cleanliness": ratings[2],
@@ -141,9 +315,108 @@ def specific_place_response(db_ops, user_id, place_id):
         "lightning": ratings[6],
         "facility_quality": ratings[7],
         "total_user_rated": ratings[0],
-        "is_user_rated": bool(is_user_rated)
     }
-    return place_with_vote
 
 
+# The ids of ?ids=1,2,3 without repeats, in their order. Not a number or more than max_ids is 400.
+def batch_place_ids(ids, max_ids):
+    try:
+        place_ids = list(dict.fromkeys(int(place_id) for place_id in ids.split(",") if place_id.strip()))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids must be comma separated place ids")
+    if not place_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids must have at least one place id")
+    if len(place_ids) > max_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {max_ids} place ids in one request")
+    return place_ids
+
+
+def conditional_batch_place_response(request, response, current_user, db_ops, ids, max_ids):
+    place_ids = batch_place_ids(ids, max_ids)
+    place_versions = db_ops.place_versions_query(place_ids)
+    validators = batch_validators(place_versions, current_user)
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
 
+    batch = batch_place_response(db_ops, current_user.id, place_ids, {place_id: row.version or 0 for place_id, row in place_versions.items()})
+    set_validators(response, validators)
+    return batch
+
+
+# This is specific_place_response for many places (the favourites/recently viewed cards): the shared part of every place
+# comes from the same cache as the place detail, the ones that are not cached are read together (place_details_response),
+# and the vote/rating of the user is one overlay load for all of them. The ids that are not places are in "missing".
+# place_versions is place_id -> version of the places that are there (the ETag of the request).
+def batch_place_response(db_ops, user_id, place_ids, place_versions):
+    details = cached_values({place_id: ("place", version, place_id) for place_id, version in place_versions.items()}, lambda missing: place_details_response(db_ops, missing))
+
+    found = [place_id for place_id in place_ids if place_id in details]
+    overlay = db_ops.user_overlay(user_id).load(found)
+
+    places = [
+        {**details[place_id], "voted": overlay.voted(place_id), "is_user_rated": overlay.is_rated(place_id)}
+        for place_id in found
+    ]
+    return {"places": places, "missing": [place_id for place_id in place_ids if place_id not in details]}
+
+
+# This is the autocomplete, it is only the in memory prefix index so it never touches the database.
+def suggest_place_response(q, limit):
+    return [
+        {"id": place_id, "place_name": place_name, "pincode": pincode}
+        for place_id, place_name, pincode in suggest_places(q, limit)
+    ]
+
+
+def create_place_response(request, db_ops, current_user):
+    # print(request.model_dump())
+    # This is going to first convert into dict and then unpack it.
+
+    # Checking that the place_name or place
+    role = current_user.role
+    if role == 'staff' or role == 'admin':
+        if db_ops.create_place(request):
+            return {"message":"place created successfully"}
+        
+        raise HTTPException(status_code=status.WS_1005_NO_STATUS_RCVD, detail="Error!")
+
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized"
+        )
+
+
+def delete_place_response(place_id, db_ops, current_user):
+    place = db_ops.place_query_with_id(place_id)   # This always return some query, so it can't be empty.
+    # .first() always return orm, if found and none if not found.
+    role = current_user.role
+    if role == 'admin':
+        if not place:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'The place of the id:{place_id} is not found.')
+        
+        else:
+            db_ops.delete_query(place)
+            return {'success':'The place has been deleted.'}
+    else:
+        return HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized"
+        )
+
+
+def update_place_response(place_id, request, db_ops, current_user):
+    db=db_ops.get_only_db()
+    place_query = db.query(Place).filter(Place.id == place_id)
+    place = place_query.first()
+    role = current_user.role
+    # print(role)
+    if role == 'staff' or role == 'admin':
+        if not place:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'The place of the id:{place_id} is not found.')
+        
+        db_ops.update_query(place_query, request, place_id)
+
+        return {'success':'post updated.'}
+    else:
+        return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
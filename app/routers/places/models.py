@@ -1,5 +1,7 @@
+from datetime import datetime, timezone
+
 from app.database.database import Base
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import BigInteger, Column, Float, Integer, String, DateTime, Index
 from sqlalchemy.sql import func
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import relationship
@@ -17,8 +19,35 @@ class Place(Base):
     place_address = Column(String, nullable=False)
     user = relationship("User", back_populates="places")
     ratings = relationship("Ratings", back_populates="place")
-    pincode = Column(Integer, nullable=False)
+    pincode = Column(Integer, nullable=False, index=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    # This is set from latitude and longitude by PlacesDbOps, see utilities/geohash.py.
+    geohash = Column(String(12), nullable=True)
+    # It is set in python (with microseconds) as well as by the server, sqlite stores func.now() as 'YYYY-MM-DD HH:MM:SS'
+    # text while the keyset cursor is bound as 'YYYY-MM-DD HH:MM:SS.ffffff', so the text comparison of the cursor skipped
+    # the places created in the same second as the last one of the page.
     created_at = Column(
         DateTime(timezone=True),
-        server_default=func.now()
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        nullable=False
+    )
+
+    # This index is for the keyset pagination on (created_at, id).
+    __table_args__ = (
+        Index("ix_places_created_at_id", "created_at", "id"),
+        # text_pattern_ops is so postgres uses this index for the prefix match (geohash LIKE 'tsq4%') with any collation.
+        Index("ix_places_geohash", "geohash", postgresql_ops={"geohash": "text_pattern_ops"}),
     )
+
+
+# This is the version of the place data (places, votes, ratings) for the list endpoints, it is the sum of the version of
+# DATA_VERSION_SLOTS rows and every write adds 1 to one of them, see utilities/data_version.py.
+# It is what the ETag of the place lists is made from, so a client with the current version gets 304 without any aggregation.
+class DataVersion(Base):
+    __tablename__ = 'data_version'
+
+    id = Column(Integer, primary_key=True, nullable=False)
+    version = Column(BigInteger, nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -11,6 +12,8 @@ class Places(BaseModel):
     about_place:str
     pincode:int
     user_id: int
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 
 class AllPlaceResponse(BaseModel):
@@ -48,5 +51,22 @@ class SpecificPlaceResponseModel(AllPlaceResponse):
     }
 
 
+# This is the response of /api/places?ids=..., the details of the places found (in the order of the ids) and the ids that
+# are not there.
+class BatchPlaceResponse(BaseModel):
+    places: List[SpecificPlaceResponseModel]
+    missing: List[int]
 
 
+# This is the autocomplete response, only what the dropdown shows.
+class PlaceSuggestion(BaseModel):
+    id:int
+    place_name:str
+    pincode:int
+
+
+# This is the response of /api/places/nearby, the usual place summary with the coordinates and the distance from the point.
+class NearbyPlaceResponse(AllPlaceResponse):
+    latitude: float
+    longitude: float
+    distance_km: float
@@ -0,0 +1,42 @@
+import random
+from datetime import datetime, timezone
+
+from sqlalchemy import func
+
+from app.database.database import dialect_insert
+from app.routers.places.models import DataVersion
+
+"""
+This is the data version of the place list endpoints (listing, search), it is their ETag and it is in their cache keys.
+
+Every write of the places, votes and ratings (the db_ops) calls bump_data_version before its commit, so the version goes up
+in the same transaction as the write and every worker (and replica) reads the same version from the database.
+The version is the sum of DATA_VERSION_SLOTS rows and a write adds 1 to one of them picked at random, the row is locked
+till the commit, so two writes only wait for each other when they pick the same row (with one row every write waited for
+the one before). It is the last lock of the write, so two writes can't wait for each other the other way round.
+A postgres sequence (nextval) would not lock at all, but it is not transactional: the version would be there before the
+data it is the version of, and a replica reads a sequence up to 32 values ahead (sequences are written to the WAL in advance).
+
+The place detail has its own version, the one of its place_stats row (app/routers/votes_ratings_feedback/utilities/place_stats.py),
+so a vote changes the ETag of its place and of the lists, not the ETag of every place.
+"""
+
+DATA_VERSION_SLOTS = 64
+
+
+# "insert ... on conflict" so it also works when the row is not there yet (tables made by create_all instead of the migration).
+def bump_data_version(db):
+    table = DataVersion.__table__
+    now = datetime.now(timezone.utc)
+    statement = dialect_insert(db, table).values(id=random.randint(1, DATA_VERSION_SLOTS), version=1, updated_at=now)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={"version": table.c.version + 1, "updated_at": now},
+    )
+    db.execute(statement)
+
+
+# It returns (version, updated_at), (0, None) before the first write.
+def current_data_version(db):
+    version, updated_at = db.query(func.coalesce(func.sum(DataVersion.version), 0), func.max(DataVersion.updated_at)).one()
+    return int(version), updated_at
@@ -0,0 +1,98 @@
+import re
+from decimal import Decimal
+
+from sqlalchemy import Numeric, String, and_, cast, func, literal_column, or_, tuple_
+
+from app.routers.places.models import Place
+from app.utilities.pagination import decode_cursor, decode_place_cursor, page_with_cursor, place_cursor_key
+
+"""
+This is the place search used by /api/places/search/ and the admin place search.
+
+- Only a 6 digit number is the pincode, it is an exact match on places.pincode (btree index).
+- Otherwise it is postgres full text search on places.search_vector (GIN index), every word is a prefix match ("red fo" finds "Red Fort"),
+  and the results are ordered by ts_rank, the place name counts more than the address and the address more than the about text.
+
+search_vector is a generated column that is created by the migration, it is not in the Place model so the model still works on sqlite,
+where the search falls back to the LIKE query.
+
+columns: the rows are only these columns of places (a sparse fieldset, app/utilities/fields.py), they must have id and created_at
+for the cursor. Without it the rows are the Place objects.
+"""
+
+SEARCH_CONFIG = "simple"
+SEARCH_VECTOR = literal_column("places.search_vector")
+PINCODE_PATTERN = re.compile(r"^\d{6}$")
+# These characters have a meaning in tsquery, so they are removed from the words.
+TSQUERY_SPECIAL_CHARACTERS = re.compile(r"[&|!():*<>'\\]")
+
+
+def search_words(search):
+    words = (TSQUERY_SPECIAL_CHARACTERS.sub("", word) for word in search.split())
+    return [word for word in words if word]
+
+
+# "red fort" -> "'red':* & 'fort':*"
+def build_tsquery(words):
+    return " & ".join(f"'{word}':*" for word in words)
+
+
+# It is returning the page of places (limit) and the cursor of the next page.
+def search_places(db, search, cursor=None, limit=20, columns=None):
+    search = search.strip()
+    if PINCODE_PATTERN.match(search):
+        return _pincode_search(db, int(search), cursor, limit, columns)
+
+    words = search_words(search)
+    if not words:
+        return [], None
+
+    if db.get_bind().dialect.name != "postgresql":
+        return _like_search(db, words, cursor, limit, columns)
+
+    after = decode_cursor(cursor, Decimal, int)
+    tsquery = func.to_tsquery(SEARCH_CONFIG, build_tsquery(words))
+    # rank is rounded to numeric so the value in the cursor compares exactly with the one in the database.
+    rank = func.round(cast(func.ts_rank(SEARCH_VECTOR, tsquery), Numeric), 6)
+
+    if columns is None:
+        query = db.query(Place, rank.label("rank"))
+    else:
+        query = db.query(*columns, rank.label("rank"))
+    query = query.filter(SEARCH_VECTOR.op("@@")(tsquery))
+    if after is not None:
+        query = query.filter(or_(rank < after[0], and_(rank == after[0], Place.id > after[1])))
+    rows = query.order_by(rank.desc(), Place.id).limit(limit + 1).all()
+
+    if columns is None:
+        rows, next_cursor = page_with_cursor(rows, limit, lambda row: (row.rank, row.Place.id))
+        return [row.Place for row in rows], next_cursor
+    return page_with_cursor(rows, limit, lambda row: (row.rank, row.id))
+
+
+def _place_query(db, columns):
+    return db.query(Place) if columns is None else db.query(*columns)
+
+
+def _pincode_search(db, pincode, cursor, limit, columns=None):
+    after = decode_place_cursor(cursor)
+    query = _place_query(db, columns).filter(Place.pincode == pincode)
+    if after is not None:
+        query = query.filter(tuple_(Place.created_at, Place.id) > tuple_(*after))
+    rows = query.order_by(Place.created_at, Place.id).limit(limit + 1).all()
+    return page_with_cursor(rows, limit, place_cursor_key)
+
+
+# This is only for the databases without full text search (sqlite), every word has to be in one of the columns.
+def _like_search(db, words, cursor, limit, columns=None):
+    after = decode_place_cursor(cursor)
+    conditions = []
+    for word in words:
+        search_pattern = f"%{word}%"
+        conditions.append(or_(Place.place_name.ilike(search_pattern), Place.about_place.ilike(search_pattern), Place.place_address.ilike(search_pattern), cast(Place.pincode, String).ilike(search_pattern)))
+
+    query = _place_query(db, columns).filter(and_(*conditions))
+    if after is not None:
+        query = query.filter(tuple_(Place.created_at, Place.id) > tuple_(*after))
+    rows = query.order_by(Place.created_at, Place.id).limit(limit + 1).all()
+    return page_with_cursor(rows, limit, place_cursor_key)
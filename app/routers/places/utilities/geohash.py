@@ -0,0 +1,95 @@
+import math
+
+"""
+This is the geohash of the place coordinates, it is what makes /api/places/nearby an index lookup instead of a full scan.
+
+A geohash is a string where every character cuts the cell into 32 smaller cells, so the places in the same cell have the same prefix
+and a cell is a range of the btree index on places.geohash (geohash LIKE 'tsq4%').
+For a radius the precision is the smallest cell that is still bigger than the radius, then the circle is always inside
+that cell and its 8 neighbours, and only those 9 prefixes are read. The exact distance is checked after on these rows.
+"""
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    # The bits are longitude, latitude, longitude... and every 5 bits are 1 character.
+    even = True
+    while len(geohash) < precision:
+        value, value_range = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(geohash)
+
+
+# The size of a cell in degrees (latitude, longitude).
+def cell_size(precision):
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+
+
+def place_geohash(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    return encode(latitude, longitude)
+
+
+# The biggest precision where the cell is still bigger than the radius, the width of a cell is smaller away from the equator.
+def precision_for_radius(latitude, radius_km):
+    # The width is checked on the side of the circle that is closest to the pole.
+    farthest_latitude = min(90.0, abs(latitude) + radius_km / KM_PER_DEGREE)
+    width_factor = math.cos(math.radians(farthest_latitude))
+    precision = 1
+    while precision < GEOHASH_PRECISION:
+        lat_size, lon_size = cell_size(precision + 1)
+        if lat_size * KM_PER_DEGREE < radius_km or lon_size * KM_PER_DEGREE * width_factor < radius_km:
+            break
+        precision += 1
+    return precision
+
+
+# It is returning the cell of the point and its 8 neighbours (less at the poles), the circle is inside them.
+def covering_cells(latitude, longitude, radius_km):
+    precision = precision_for_radius(latitude, radius_km)
+    lat_size, lon_size = cell_size(precision)
+    lon_steps = (-1, 0, 1)
+    # Next to the poles even the biggest cell is narrower than the radius, then the whole latitude band is read.
+    farthest_latitude = min(90.0, abs(latitude) + radius_km / KM_PER_DEGREE)
+    if lon_size * KM_PER_DEGREE * math.cos(math.radians(farthest_latitude)) < radius_km:
+        lon_steps = range(round(360 / lon_size))
+    cells = set()
+    for lat_step in (-1, 0, 1):
+        neighbour_latitude = latitude + lat_step * lat_size
+        if not -90 <= neighbour_latitude <= 90:
+            continue
+        for lon_step in lon_steps:
+            # the longitude goes round, 181 is -179.
+            neighbour_longitude = (longitude + lon_step * lon_size + 180) % 360 - 180
+            cells.add(encode(neighbour_latitude, neighbour_longitude, precision))
+    return sorted(cells)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
@@ -0,0 +1,196 @@
+import re
+import threading
+from collections import Counter
+
+"""
+This is the in memory n-gram index for the typo tolerant place search.
+
+The index is on the vocabulary (every distinct word of the place names and addresses), not on every place:
+- bigram -> words, to find the words that are close to a query word.
+- word -> place ids, to get the places of those words.
+
+Every word is broken into bigrams with a space before and after: "fort" -> " f", "fo", "or", "rt", "t ".
+Only the words with the same first letter are compared, see bigrams().
+One typo (a wrong, missing or extra letter, or 2 swapped letters) changes at most 3 of them, so a word within k typos of
+the query word has at least (query bigrams - 3k) bigrams in common, and it is always in one of the (3k + 1) smallest lists.
+Only those lists are counted and the candidates are checked with the edit distance (swap of 2 letters is 1 edit):
+- words of 1-2 letters have to be exact, 3-5 letters can have 1 typo and longer words 2.
+- the similarity of a word is 1 - edits/length, so "frot" is 0.75 like "fort" and "qutb" is 0.8 like "qutub".
+
+Every word of the query has to match a word of the place (like the "&" of the full text search), and the score of the place
+is the average similarity of the query words. The places are taken from the query word with the fewest places,
+so "red frot" only looks at the places that have a word like "frot" and not at every place in "red".
+"""
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+# The bigrams are keyed with the first letter of the word, so only the words with the same first letter are compared
+# (like the prefix length 1 of the fuzzy queries of lucene), a typo in the first letter is rare and this makes the lists ~20x smaller.
+def bigrams(word):
+    padded = f" {word} "
+    return {word[0] + padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def words_of(text):
+    return set(WORD_PATTERN.findall((text or "").lower()))
+
+
+def max_typos(word):
+    if len(word) <= 2:
+        return 0
+    if len(word) <= 5:
+        return 1
+    return 2
+
+
+# This is the optimal string alignment distance, the edit distance where swapping 2 letters next to each other is 1 edit.
+# It is the bit parallel version (Hyyro 2003), a column of the table is kept in the bits of an int, so it is one loop on b
+# instead of len(a) * len(b) steps (~6x faster in python). It returns limit + 1 when the distance is more than limit.
+def edit_distance(a, b, limit):
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if not a:
+        return len(b)
+    full = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    # the bits of every letter are the positions of that letter in a.
+    letter_bits = {}
+    for i, letter in enumerate(a):
+        letter_bits[letter] = letter_bits.get(letter, 0) | (1 << i)
+
+    plus, minus, diagonal, previous_bits = full, 0, 0, 0
+    distance = len(a)
+    for letter in b:
+        bits = letter_bits.get(letter, 0)
+        swapped = (((~diagonal) & bits) << 1) & previous_bits
+        diagonal = ((((bits & plus) + plus) ^ plus) | bits | minus | swapped) & full
+        horizontal_plus = (minus | ~(diagonal | plus)) & full
+        horizontal_minus = diagonal & plus
+        if horizontal_plus & last:
+            distance += 1
+        elif horizontal_minus & last:
+            distance -= 1
+        horizontal_plus = ((horizontal_plus << 1) | 1) & full
+        horizontal_minus = (horizontal_minus << 1) & full
+        plus = (horizontal_minus | ~(diagonal | horizontal_plus)) & full
+        minus = diagonal & horizontal_plus
+        previous_bits = bits
+    return min(distance, limit + 1)
+
+
+class NgramIndex:
+    def __init__(self, threshold=0.5):
+        # the average word similarity a place needs to be returned.
+        self.threshold = threshold
+        self._word_grams = {}
+        self._gram_words = {}
+        self._word_places = {}
+        self._place_words = {}
+        # The index is read by the search threads and changed by the write endpoints, so everything is under this lock.
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._place_words)
+
+    def add(self, place_id, place_name, place_address):
+        with self._lock:
+            self._remove(place_id)
+            words = words_of(place_name) | words_of(place_address)
+            self._place_words[place_id] = words
+            for word in words:
+                places = self._word_places.get(word)
+                if places is None:
+                    places = self._word_places[word] = set()
+                    grams = self._word_grams[word] = bigrams(word)
+                    for gram in grams:
+                        self._gram_words.setdefault(gram, set()).add(word)
+                places.add(place_id)
+
+    def remove(self, place_id):
+        with self._lock:
+            self._remove(place_id)
+
+    def _remove(self, place_id):
+        for word in self._place_words.pop(place_id, ()):
+            places = self._word_places[word]
+            places.discard(place_id)
+            if places:
+                continue
+            # No place has this word anymore, so it is removed from the vocabulary.
+            del self._word_places[word]
+            for gram in self._word_grams.pop(word):
+                gram_words = self._gram_words[gram]
+                gram_words.discard(word)
+                if not gram_words:
+                    del self._gram_words[gram]
+
+    # It returns {word: similarity} of the vocabulary words close to this word, a known word only matches itself.
+    def _similar_words(self, word):
+        if word in self._word_places:
+            return {word: 1.0}
+
+        typos = max_typos(word)
+        if not typos:
+            return {}
+        query_grams = bigrams(word)
+        needed = max(1, len(query_grams) - 3 * typos)
+        # The bigrams that are in no word can't be in common, they only count in the query size.
+        postings = sorted((self._gram_words[gram] for gram in query_grams if gram in self._gram_words), key=len)
+        candidate_lists = len(postings) - needed + 1
+        if candidate_lists <= 0:
+            return {}
+
+        common = Counter()
+        for words in postings[:candidate_lists]:
+            common.update(words)
+
+        similar = {}
+        for candidate in common:
+            if abs(len(candidate) - len(word)) > typos:
+                continue
+            # common is only counted on the smallest lists, so the real count is taken from the sets.
+            if len(query_grams & self._word_grams[candidate]) < needed:
+                continue
+            distance = edit_distance(word, candidate, typos)
+            if distance <= typos:
+                similar[candidate] = 1 - distance / max(len(word), len(candidate))
+        return similar
+
+    # It returns [(place_id, score)] with the best score first.
+    def search(self, query, limit=20, threshold=None):
+        threshold = self.threshold if threshold is None else threshold
+        query_words = words_of(query)
+        if not query_words:
+            return []
+
+        with self._lock:
+            matches = []
+            for word in query_words:
+                similar = self._similar_words(word)
+                if not similar:
+                    return []
+                size = sum(len(self._word_places[candidate]) for candidate in similar)
+                matches.append((size, similar))
+            matches.sort(key=lambda item: item[0])
+
+            # Every query word has to match, so the candidates are the places of the rarest query word.
+            candidates = set()
+            for candidate in matches[0][1]:
+                candidates.update(self._word_places[candidate])
+
+            scores = []
+            for place_id in candidates:
+                place_words = self._place_words[place_id]
+                total = 0
+                for _, similar in matches:
+                    best = max((similarity for candidate, similarity in similar.items() if candidate in place_words), default=0)
+                    if not best:
+                        break
+                    total += best
+                else:
+                    score = total / len(matches)
+                    if score >= threshold:
+                        scores.append((place_id, score))
+
+        return sorted(scores, key=lambda item: (-item[1], item[0]))[:limit]
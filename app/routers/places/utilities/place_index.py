@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.database.database import sessionLocal
+from app.routers.places.models import Place
+from app.routers.places.utilities.ngram_index import NgramIndex
+from app.routers.places.utilities.prefix_index import PrefixIndex
+
+"""
+These are the in memory place indexes of this process. They are built at startup from the places table
+and updated by PlacesDbOps on create/update/delete.
+
+Every uvicorn worker has its own copy and only sees its own writes, so the indexes are also rebuilt
+every PLACE_INDEX_REFRESH_SECONDS (0 turns it off) to pick up the places written by the other workers.
+A write of this worker during a rebuild is applied to the old indexes and kept in a log, the log is replayed on the new
+indexes before they are swapped in, so the write is not lost by the swap (the scan may not have seen it).
+"""
+
+logger = logging.getLogger(__name__)
+
+PLACE_INDEX_REFRESH_SECONDS = int(os.getenv('PLACE_INDEX_REFRESH_SECONDS', '300'))
+INDEX_BATCH_SIZE = 1000
+
+place_search_index = NgramIndex()
+place_suggest_index = PrefixIndex()
+
+# _index_lock is held for one write to the indexes (and its log entry) and for the swap, not for the scan of a rebuild.
+_index_lock = threading.Lock()
+_build_lock = threading.Lock()
+# The writes made while a rebuild is running: (place_id, place_name, place_address, pincode) or (place_id, None, None, None)
+# for a removed place. It is None when no rebuild is running.
+_rebuild_log = None
+
+
+def index_place(place):
+    with _index_lock:
+        place_search_index.add(place.id, place.place_name, place.place_address)
+        place_suggest_index.add(place.id, place.place_name, place.pincode)
+        if _rebuild_log is not None:
+            _rebuild_log.append((place.id, place.place_name, place.place_address, place.pincode))
+
+
+def unindex_place(place_id):
+    with _index_lock:
+        place_search_index.remove(place_id)
+        place_suggest_index.remove(place_id)
+        if _rebuild_log is not None:
+            _rebuild_log.append((place_id, None, None, None))
+
+
+# The writes of the log in order, on the new indexes.
+def _replay(log, search_index, suggest_index):
+    for place_id, place_name, place_address, pincode in log:
+        if place_name is None:
+            search_index.remove(place_id)
+            suggest_index.remove(place_id)
+        else:
+            search_index.add(place_id, place_name, place_address)
+            suggest_index.add(place_id, place_name, pincode)
+
+
+# New indexes are built and then swapped, so the searches keep using the old ones while they are building.
+# One rebuild at a time, the writes made during it are logged (index_place/unindex_place) and replayed before the swap.
+def build_place_indexes():
+    with _build_lock:
+        _build_place_indexes()
+
+
+def _build_place_indexes():
+    global place_search_index, place_suggest_index, _rebuild_log
+    with _index_lock:
+        _rebuild_log = []
+    db = sessionLocal()
+    try:
+        search_index = NgramIndex(place_search_index.threshold)
+        suggestions = []
+        rows = db.query(Place.id, Place.place_name, Place.place_address, Place.pincode).yield_per(INDEX_BATCH_SIZE)
+        for place_id, place_name, place_address, pincode in rows:
+            search_index.add(place_id, place_name, place_address)
+            suggestions.append((place_id, place_name, pincode))
+        suggest_index = PrefixIndex()
+        suggest_index.bulk_add(suggestions)
+        with _index_lock:
+            _replay(_rebuild_log, search_index, suggest_index)
+            place_search_index, place_suggest_index = search_index, suggest_index
+        logger.info('place indexes built with %d places', len(search_index))
+    except SQLAlchemyError:
+        logger.exception('could not build the place indexes')
+    finally:
+        with _index_lock:
+            _rebuild_log = None
+        db.close()
+
+
+def _refresh_place_indexes(stop_event):
+    while not stop_event.wait(PLACE_INDEX_REFRESH_SECONDS):
+        build_place_indexes()
+
+
+# This is called at the app startup, it returns the event that stops the refresh thread at shutdown.
+def start_place_indexes():
+    build_place_indexes()
+    stop_event = threading.Event()
+    if PLACE_INDEX_REFRESH_SECONDS > 0:
+        threading.Thread(target=_refresh_place_indexes, args=(stop_event,), name='place-index-refresh', daemon=True).start()
+    return stop_event
+
+
+def fuzzy_search_place_ids(search, limit):
+    return [place_id for place_id, _ in place_search_index.search(search, limit)]
+
+
+def suggest_places(prefix, limit):
+    return place_suggest_index.suggest(prefix, limit)
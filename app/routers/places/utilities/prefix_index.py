@@ -0,0 +1,91 @@
+import threading
+from bisect import bisect_left, insort
+
+"""
+This is the in memory prefix index for the autocomplete (/api/places/suggest).
+
+It is 2 sorted lists of (key, place_id), a prefix is found with bisect and then the list is read while the keys start with it:
+- _starts has the whole place name and the pincode, "red fo" -> "red fort delhi" and "1100" -> "110006".
+- _inside has the name from every other word, "fo" -> "fort delhi" of "red fort delhi".
+The places of _starts come first, so "red" shows "Red Fort" before "Old Red Gate".
+"""
+
+
+def name_key(text):
+    return " ".join((text or "").lower().split())
+
+
+# The keys of a place, the whole name and the pincode for _starts and the name from the 2nd, 3rd... word for _inside.
+def place_keys(place_name, pincode):
+    name = name_key(place_name)
+    words = name.split(" ")
+    starts = [name, str(pincode)]
+    inside = [" ".join(words[i:]) for i in range(1, len(words))]
+    return starts, inside
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._starts = []
+        self._inside = []
+        # place_id -> (place_name, pincode), it is what the suggest endpoint returns so it never goes to the database.
+        self._places = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._places)
+
+    def add(self, place_id, place_name, pincode):
+        with self._lock:
+            self._remove(place_id)
+            starts, inside = place_keys(place_name, pincode)
+            for key in starts:
+                insort(self._starts, (key, place_id))
+            for key in inside:
+                insort(self._inside, (key, place_id))
+            self._places[place_id] = (place_name, pincode)
+
+    # For building the index at once, the lists are sorted one time at the end instead of insort for every place.
+    def bulk_add(self, places):
+        with self._lock:
+            for place_id, place_name, pincode in places:
+                starts, inside = place_keys(place_name, pincode)
+                self._starts.extend((key, place_id) for key in starts)
+                self._inside.extend((key, place_id) for key in inside)
+                self._places[place_id] = (place_name, pincode)
+            self._starts.sort()
+            self._inside.sort()
+
+    def remove(self, place_id):
+        with self._lock:
+            self._remove(place_id)
+
+    def _remove(self, place_id):
+        place = self._places.pop(place_id, None)
+        if place is None:
+            return
+        starts, inside = place_keys(*place)
+        for keys, entries in ((starts, self._starts), (inside, self._inside)):
+            for key in keys:
+                position = bisect_left(entries, (key, place_id))
+                if position < len(entries) and entries[position] == (key, place_id):
+                    del entries[position]
+
+    # It returns [(place_id, place_name, pincode)], at most limit.
+    def suggest(self, prefix, limit=10):
+        prefix = name_key(prefix)
+        if not prefix:
+            return []
+
+        with self._lock:
+            found = {}
+            for entries in (self._starts, self._inside):
+                position = bisect_left(entries, (prefix,))
+                while position < len(entries) and len(found) < limit:
+                    key, place_id = entries[position]
+                    if not key.startswith(prefix):
+                        break
+                    if place_id not in found:
+                        found[place_id] = self._places[place_id]
+                    position += 1
+            return [(place_id, place_name, pincode) for place_id, (place_name, pincode) in found.items()]
@@ -0,0 +1,68 @@
+from sqlalchemy import and_, select
+
+from app.routers.votes_ratings_feedback.models import Ratings, Votes
+
+"""
+This is the "user overlay", the vote and the rated flag of the logged-in user for the places of the response.
+
+It is made one time per request (PlacesDbOps.user_overlay) and loaded with the place ids of the page:
+- the first load tries the whole user in one query each for votes and ratings (most users voted and rated only a few places),
+  if it is at most WHOLE_USER_LIMIT rows the overlay is complete and no other page/batch of this request needs a query.
+- otherwise only the place ids of the page are loaded with one IN (...) query each, the ids already loaded are not asked again.
+After the load voted() and is_rated() are only dict/set lookups.
+"""
+
+WHOLE_USER_LIMIT = 500
+
+
+class UserOverlay:
+    def __init__(self, db, user_id):
+        self.db = db
+        self.user_id = user_id
+        # place_id -> vote (True/False/None), only the places that the user voted.
+        self.votes = {}
+        # place ids that the user rated.
+        self.rated = set()
+        self._loaded = set()
+        self._complete = False
+        self._tried_whole_user = False
+
+    def load(self, place_ids):
+        if self._complete:
+            return self
+        missing = [place_id for place_id in place_ids if place_id not in self._loaded]
+        if not missing:
+            return self
+
+        if not self._tried_whole_user:
+            self._tried_whole_user = True
+            if self._load_whole_user():
+                return self
+
+        db = self.db
+        user_votes = db.execute(select(Votes.place_id, Votes.vote).where(and_(Votes.user_id == self.user_id, Votes.place_id.in_(missing))))
+        self.votes.update(user_votes.tuples().all())
+        user_ratings = db.execute(select(Ratings.place_id).where(and_(Ratings.user_id == self.user_id, Ratings.place_id.in_(missing))))
+        self.rated.update(user_ratings.scalars())
+        self._loaded.update(missing)
+        return self
+
+    # It is True when the user has few enough votes and ratings to keep all of them.
+    def _load_whole_user(self):
+        db = self.db
+        user_votes = db.execute(select(Votes.place_id, Votes.vote).where(Votes.user_id == self.user_id).limit(WHOLE_USER_LIMIT + 1)).all()
+        if len(user_votes) > WHOLE_USER_LIMIT:
+            return False
+        user_ratings = db.execute(select(Ratings.place_id).where(Ratings.user_id == self.user_id).limit(WHOLE_USER_LIMIT + 1)).scalars().all()
+        if len(user_ratings) > WHOLE_USER_LIMIT:
+            return False
+        self.votes.update(user_votes)
+        self.rated.update(user_ratings)
+        self._complete = True
+        return True
+
+    def voted(self, place_id):
+        return self.votes.get(place_id)
+
+    def is_rated(self, place_id):
+        return place_id in self.rated
@@ -1,40 +1,39 @@
 from app.routers.places.models import Place
+from app.routers.places.utilities.full_text_search import search_places
 from app.routers.users.models import User
 from app.routers.votes_ratings_feedback.models import Feedback, Ratings, Votes
-from sqlalchemy import String, cast, or_
+from app.utilities.pagination import DEFAULT_PAGE_LIMIT
+from app.utilities.streaming import STREAM_BATCH_SIZE
+from sqlalchemy import String, cast, or_, tuple_
 
 
+# With columns (a sparse fieldset, app/utilities/fields.py) the listings select only these columns, the rows are not the ORM objects.
 class AdminPanelDbOps:
     def __init__(self, db):
         self.db = db
 
-    def all_place_query(self):
-        return self.db.query(Place).all()
+    def _columns_query(self, model, columns):
+        return self.db.query(model) if columns is None else self.db.query(*columns)
 
-    def search_place(self, search_query):
-        place = []
-        for query in search_query:
-            search_pattern = f"%{query}%"
-            place_search = self.db.query(Place).filter(
-                or_(
-                    Place.place_name.ilike(search_pattern),
-                    Place.about_place.ilike(search_pattern),
-                    Place.place_address.ilike(search_pattern),
-                    cast(Place.pincode, String).ilike(search_pattern)
-                )
-            ).limit(20).all()
-            place.extend(place_search)
+    # Same keyset page as the place listing, limit + 1 rows after the cursor (created_at, id).
+    def all_place_query(self, after=None, limit=DEFAULT_PAGE_LIMIT, columns=None):
+        query = self._columns_query(Place, columns)
+        if after is not None:
+            query = query.filter(tuple_(Place.created_at, Place.id) > tuple_(*after))
+        return query.order_by(Place.created_at, Place.id).limit(limit + 1).all()
 
-        return place
+    # This is the same full text search as the place search endpoint.
+    def search_place(self, search, cursor=None, limit=DEFAULT_PAGE_LIMIT, columns=None):
+        return search_places(self.db, search, cursor, limit, columns)
 
-    def all_user_query(self):
-        return self.db.query(User).all()
+    def all_user_query(self, columns=None):
+        return self._columns_query(User, columns).all()
 
-    def search_user(self, search_query):
+    def search_user(self, search_query, columns=None):
         user = []
         for query in search_query:
             search_pattern = f"%{query}%"
-            user_search = self.db.query(User).filter(
+            user_search = self._columns_query(User, columns).filter(
                 or_(
                     User.first_name.ilike(search_pattern),
                     User.last_name.ilike(search_pattern),
@@ -46,11 +45,21 @@ class AdminPanelDbOps:
 
         return user
 
-    def all_votes_query(self):
-        return self.db.query(Votes).all()
+    def all_votes_query(self, columns=None):
+        return self._columns_query(Votes, columns).all()
+
+    def all_ratings_query(self, columns=None):
+        return self._columns_query(Ratings, columns).all()
+
+    def all_feedback_query(self, columns=None):
+        return self._columns_query(Feedback, columns).all()
+
+    # These are for the streaming mode, the rows are read from the server side cursor in batches.
+    def stream_votes_query(self):
+        return self.db.query(Votes).order_by(Votes.id).yield_per(STREAM_BATCH_SIZE)
 
-    def all_ratings_query(self):
-        return self.db.query(Ratings).all()
+    def stream_ratings_query(self):
+        return self.db.query(Ratings).order_by(Ratings.id).yield_per(STREAM_BATCH_SIZE)
 
-    def all_feedback_query(self):
-        return self.db.query(Feedback).all()
+    def stream_feedback_query(self):
+        return self.db.query(Feedback).order_by(Feedback.id).yield_per(STREAM_BATCH_SIZE)
@@ -0,0 +1,55 @@
+from fastapi import Depends, APIRouter
+from app.utilities.oauth2 import get_current_user
+from app.routers.users.adminpanel.helper_function import require_role
+from app.database.database import DATABASE_MODE, async_pool_metrics, sync_pool_metrics
+from app.database.replicas import replica_router
+from app.utilities.cache import place_cache, response_cache
+from app.utilities.google_certs import google_cert_cache
+from app.utilities.password_hashing import password_hasher
+from app.utilities.principal_cache import principal_cache, token_cache
+
+
+router = APIRouter(
+    prefix='/api/admin/diagnostics',
+    tags=['admin diagnostics']
+)
+
+
+# This is the state of the caches of this worker (every worker has its own), hits/misses/evictions are counted from the start.
+@router.get('/cache')
+async def cache_diagnostics(current_user = Depends(get_current_user)):
+    require_role(current_user, {"admin"})
+    return {
+        "responses": response_cache.stats(),
+        "places": place_cache.stats(),
+        "principals": principal_cache.stats(),
+        "tokens": token_cache.stats(),
+        "google_certs": google_cert_cache.stats(),
+    }
+
+
+# This is the bcrypt pool of this worker, the queue wait is the time from the submit to the start of the hash in a worker.
+@router.get('/hashing')
+async def hashing_diagnostics(current_user = Depends(get_current_user)):
+    require_role(current_user, {"admin"})
+    return password_hasher.stats()
+
+
+# These are the connection pools of this worker, the sync one is used by the sync mode and the background jobs, the async one
+# only exists in DATABASE_MODE=async. The wait is the time to get a connection out of the pool (app/database/pool_metrics.py).
+@router.get('/pool')
+async def pool_diagnostics(current_user = Depends(get_current_user)):
+    require_role(current_user, {"admin"})
+    return {
+        "database_mode": DATABASE_MODE,
+        "sync": sync_pool_metrics.stats(),
+        "async": async_pool_metrics.stats() if DATABASE_MODE == 'async' else None,
+    }
+
+
+# These are the read replicas as this worker sees them: healthy/lag from the last check, the reads sent to each one, the reads
+# that were on the primary (no usable replica, or the user just wrote) and the pools of the replicas.
+@router.get('/replicas')
+async def replica_diagnostics(current_user = Depends(get_current_user)):
+    require_role(current_user, {"admin"})
+    return replica_router.stats()
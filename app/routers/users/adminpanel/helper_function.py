@@ -1,5 +1,23 @@
+from typing import List
+
 from fastapi import HTTPException, status
 
+from app.routers.places.models import Place
+from app.routers.users.adminpanel.db_ops import AdminPanelDbOps
+from app.routers.users.adminpanel.pydanticModels import (
+    AdminFeedbackResponse,
+    AdminPlaceResponse,
+    AdminRatingsResponse,
+    AdminUserResponse,
+    AdminVoteResponse,
+)
+from app.routers.users.models import User
+from app.routers.votes_ratings_feedback.models import Feedback, Ratings, Votes
+from app.utilities.fields import model_columns, parse_fields, sparse_model
+from app.utilities.json_response import json_response, model_rows
+from app.utilities.pagination import decode_place_cursor, page_with_cursor, place_cursor_key, set_next_cursor
+from app.utilities.streaming import stream_with_session
+
 
 def require_role(current_user, allowed_roles):
     if current_user.role not in allowed_roles:
@@ -9,36 +27,76 @@ def require_role(current_user, allowed_roles):
         )
 
 
-def admin_place_response(db_ops, current_user):
+# The listings return the Response with the JSON of the rows, the rows are not validated again (app/utilities/json_response.py).
+# With fields (app/utilities/fields.py) the rows have only these fields.
+def rows_response(model, rows, next_cursor=None, fields=None):
+    if fields is not None:
+        model = sparse_model(model, fields)
+    response = json_response(List[model], model_rows(model, rows))
+    set_next_cursor(response, next_cursor)
+    return response
+
+
+# The columns of the sparse fieldset of a listing, None is the whole rows. required are the columns of the cursor.
+def listing_columns(table_model, fields, required=()):
+    return None if fields is None else model_columns(table_model, fields, required)
+
+
+def admin_place_response(db_ops, current_user, cursor, limit, fields=None):
     require_role(current_user, {"admin", "staff"})
-    return db_ops.all_place_query()
+    fields = parse_fields(fields, AdminPlaceResponse)
+    place = db_ops.all_place_query(decode_place_cursor(cursor), limit, listing_columns(Place, fields, ("id", "created_at")))
+    return rows_response(AdminPlaceResponse, *page_with_cursor(place, limit, place_cursor_key), fields=fields)
 
 
-def admin_search_place_response(search, db_ops, current_user):
+def admin_search_place_response(search, db_ops, current_user, cursor, limit, fields=None):
     require_role(current_user, {"admin", "staff"})
-    return db_ops.search_place(search.split())
+    fields = parse_fields(fields, AdminPlaceResponse)
+    place = db_ops.search_place(search, cursor, limit, listing_columns(Place, fields, ("id", "created_at")))
+    return rows_response(AdminPlaceResponse, *place, fields=fields)
 
 
-def admin_user_response(db_ops, current_user):
+def admin_user_response(db_ops, current_user, fields=None):
     require_role(current_user, {"admin"})
-    return db_ops.all_user_query()
+    fields = parse_fields(fields, AdminUserResponse)
+    return rows_response(AdminUserResponse, db_ops.all_user_query(listing_columns(User, fields)), fields=fields)
 
 
-def admin_search_user_response(search, db_ops, current_user):
+def admin_search_user_response(search, db_ops, current_user, fields=None):
     require_role(current_user, {"admin"})
-    return db_ops.search_user(search.split())
+    fields = parse_fields(fields, AdminUserResponse)
+    return rows_response(AdminUserResponse, db_ops.search_user(search.split(), listing_columns(User, fields)), fields=fields)
+
+
+def admin_vote_response(db_ops, current_user, fields=None):
+    require_role(current_user, {"admin"})
+    fields = parse_fields(fields, AdminVoteResponse)
+    return rows_response(AdminVoteResponse, db_ops.all_votes_query(listing_columns(Votes, fields)), fields=fields)
+
+
+def admin_rating_response(db_ops, current_user, fields=None):
+    require_role(current_user, {"admin"})
+    fields = parse_fields(fields, AdminRatingsResponse)
+    return rows_response(AdminRatingsResponse, db_ops.all_ratings_query(listing_columns(Ratings, fields)), fields=fields)
+
+
+def admin_feedback_response(db_ops, current_user, fields=None):
+    require_role(current_user, {"admin", "staff"})
+    fields = parse_fields(fields, AdminFeedbackResponse)
+    return rows_response(AdminFeedbackResponse, db_ops.all_feedback_query(listing_columns(Feedback, fields)), fields=fields)
 
 
-def admin_vote_response(db_ops, current_user):
+# These are the streaming mode of the above, the role is checked before the stream is started.
+def admin_vote_stream(current_user):
     require_role(current_user, {"admin"})
-    return db_ops.all_votes_query()
+    return stream_with_session(lambda db: AdminPanelDbOps(db).stream_votes_query())
 
 
-def admin_rating_response(db_ops, current_user):
+def admin_rating_stream(current_user):
     require_role(current_user, {"admin"})
-    return db_ops.all_ratings_query()
+    return stream_with_session(lambda db: AdminPanelDbOps(db).stream_ratings_query())
 
 
-def admin_feedback_response(db_ops, current_user):
+def admin_feedback_stream(current_user):
     require_role(current_user, {"admin", "staff"})
-    return db_ops.all_feedback_query()
+    return stream_with_session(lambda db: AdminPanelDbOps(db).stream_feedback_query())
@@ -1,16 +1,19 @@
-from fastapi import Depends, APIRouter
+from fastapi import Depends, APIRouter, Query
 # This is pydantic, that used for the data defining that we will receive from the client.
 from app.utilities.oauth2 import get_current_user
-from sqlalchemy.orm import Session
 # Creating the table that we created in model.py
-from app.database.database import get_db
+from app.database.database import AsyncDbOps
+from app.database.replicas import get_read_db
 from app.routers.users.adminpanel.pydanticModels import AdminPlaceResponse
-from typing import List
+from typing import List, Optional
 from app.routers.users.adminpanel.db_ops import AdminPanelDbOps
+from app.utilities.query_counter import query_budget
 from app.routers.users.adminpanel.helper_function import (
     admin_place_response,
     admin_search_place_response,
 )
+from app.utilities.fields import FIELDS_DESCRIPTION
+from app.utilities.pagination import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT
 
 # creating fastapi router for endpoint
 router = APIRouter(
@@ -19,16 +22,28 @@ router = APIRouter(
 )
 
 
-def db_ops_init(db: Session = Depends(get_db)):
-    return AdminPanelDbOps(db)
+# These are only listings, they read from a replica when there is one.
+async def db_ops_init(db = Depends(get_read_db)):
+    return AsyncDbOps(db, AdminPanelDbOps)
 
 
 # This is the endpoint for staff/admin where he can only add the place and edit the place.
-@router.get('/place', response_model=List[AdminPlaceResponse])
-def admin_place(db_ops: Session = Depends(db_ops_init), current_user = Depends(get_current_user)):
-    return admin_place_response(db_ops, current_user)
+@router.get('/place', response_model=List[AdminPlaceResponse], dependencies=[Depends(query_budget(4))])
+async def admin_place(
+    limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db_ops: AsyncDbOps = Depends(db_ops_init),
+    current_user = Depends(get_current_user)):
+    return await db_ops.run(lambda ops: admin_place_response(ops, current_user, cursor, limit, fields))
 
 # This is admin place search
-@router.get('/place/search', response_model=List[AdminPlaceResponse])
-def admin_search_place(search, db_ops: Session = Depends(db_ops_init), current_user = Depends(get_current_user)):
-    return admin_search_place_response(search, db_ops, current_user)
+@router.get('/place/search', response_model=List[AdminPlaceResponse], dependencies=[Depends(query_budget(4))])
+async def admin_search_place(
+    search,
+    limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db_ops: AsyncDbOps = Depends(db_ops_init),
+    current_user = Depends(get_current_user)):
+    return await db_ops.run(lambda ops: admin_search_place_response(search, ops, current_user, cursor, limit, fields))
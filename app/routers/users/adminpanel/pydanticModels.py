@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional
 from datetime import datetime
 from app.routers.places.pydanticModels import Places
@@ -12,6 +12,8 @@ class AdminUpdatePlace(BaseModel):
     place_address:str
     about_place:str
     pincode:int
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 
 # This model is for the admin/staff response.
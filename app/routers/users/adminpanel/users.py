@@ -1,12 +1,14 @@
-from fastapi import Depends, APIRouter
+from fastapi import Depends, APIRouter, Query
 # This is pydantic, that used for the data defining that we will receive from the client.
 from app.utilities.oauth2 import get_current_user
-from sqlalchemy.orm import Session
 # Creating the table that we created in model.py
-from app.database.database import get_db
+from app.database.database import AsyncDbOps
+from app.database.replicas import get_read_db
 from app.routers.users.adminpanel.pydanticModels import AdminUserResponse
-from typing import List
+from typing import List, Optional
 from app.routers.users.adminpanel.db_ops import AdminPanelDbOps
+from app.utilities.fields import FIELDS_DESCRIPTION
+from app.utilities.query_counter import query_budget
 from app.routers.users.adminpanel.helper_function import (
     admin_search_user_response,
     admin_user_response,
@@ -18,20 +20,21 @@ router = APIRouter(
 )
 
 
-def db_ops_init(db: Session = Depends(get_db)):
-    return AdminPanelDbOps(db)
+# These are only listings, they read from a replica when there is one.
+async def db_ops_init(db = Depends(get_read_db)):
+    return AsyncDbOps(db, AdminPanelDbOps)
 
 
-@router.get('/user', response_model=List[AdminUserResponse])
-def admin_user(db_ops: Session = Depends(db_ops_init), current_user = Depends(get_current_user)):
-    return admin_user_response(db_ops, current_user)
+@router.get('/user', response_model=List[AdminUserResponse], dependencies=[Depends(query_budget(4))])
+async def admin_user(fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION), db_ops: AsyncDbOps = Depends(db_ops_init), current_user = Depends(get_current_user)):
+    return await db_ops.run(lambda ops: admin_user_response(ops, current_user, fields))
 
 
 
 
-@router.get('/user/search', response_model=List[AdminUserResponse])
-def admin_search_user(search, db_ops: Session = Depends(db_ops_init), current_user = Depends(get_current_user)):
-    return admin_search_user_response(search, db_ops, current_user)
+@router.get('/user/search', response_model=List[AdminUserResponse], dependencies=[Depends(query_budget(4))])
+async def admin_search_user(search, fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION), db_ops: AsyncDbOps = Depends(db_ops_init), current_user = Depends(get_current_user)):
+    return await db_ops.run(lambda ops: admin_search_user_response(search, ops, current_user, fields))
 
 
 
@@ -4,7 +4,7 @@ import typer
 # import database
 from app.database.database import sessionLocal
 from app.database.models import User
-from app.utilities.utils import get_hashed_password
+from app.utilities.password_hashing import password_hasher
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -35,11 +35,12 @@ def createsuperuser():
         print('superuser already exists')
 
     else:
-        superuser = User(first_name=first_name,last_name=last_name,email=email,password=get_hashed_password(password),role='admin')
+        superuser = User(first_name=first_name,last_name=last_name,email=email,password=password_hasher.hash_password(password),role='admin')
         db.add(superuser)
         db.commit()
         db.close()
         print('superuser created successfully')
+    password_hasher.shutdown()
 
 
 if __name__ == "__main__":
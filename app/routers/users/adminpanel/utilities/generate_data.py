@@ -0,0 +1,259 @@
+import csv
+import io
+import itertools
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import typer
+from sqlalchemy import func, insert, select
+
+# import database
+from app.database.database import sessionLocal
+from app.database.models import Feedback, Place, PlaceStats, Ratings, User, Votes
+from app.routers.places.utilities.data_version import bump_data_version
+from app.routers.places.utilities.geohash import place_geohash
+from app.routers.votes_ratings_feedback.utilities.place_stats import RATING_CATEGORIES
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# creating instance of typer.
+app = typer.Typer()
+
+"""
+This fills the database with synthetic users, places, votes, ratings and feedback, to rehearse the load at 10-100x the data.
+
+- Skew like the real data: the popularity of the places is Zipfian (rank r gets 1/r^zipf of the votes and ratings), and only
+  --voter-share of the users log in and vote/rate at all, their activity is Zipfian too (a few users vote a lot).
+  A user votes/rates a place at most once, like the api allows.
+- Fast: postgres (psycopg2) gets the rows with COPY, the other databases with Core executemany in batches, never one ORM
+  add/commit per row. The place_stats rows are counted while the votes and ratings are made, so they need no query after.
+- Deterministic: the same --seed and counts on an empty database give the same rows (and the same ids), so two benchmark
+  runs can be compared. On a database that has rows already the new rows are added after them.
+The new rows get ids after the max id of their table at the start, so nothing else should write to the database while it runs.
+
+NOTE: RUN COMMAND IS:
+python -m app.routers.users.adminpanel.utilities.generate_data --users 100000 --places 50000 --votes 10000000 --ratings 2000000
+"""
+
+BATCH_SIZE = 5000
+COPY_BATCH_SIZE = 100000
+
+SYLLABLES = ["ra", "ma", "ka", "li", "pur", "ga", "dha", "shi", "van", "ko", "ta", "ne", "ha", "bad", "gar", "nag", "sa", "mi", "du", "ri"]
+KINDS = ["Fort", "Temple", "Lake", "Garden", "Palace", "Museum", "Market", "Gate", "Beach", "Falls", "Park", "Masjid"]
+CITIES = ["Delhi", "Jaipur", "Agra", "Mumbai", "Pune", "Kolkata", "Chennai", "Lucknow", "Bhopal", "Indore", "Patna", "Goa"]
+
+
+def random_word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def batches(rows, size):
+    iterator = iter(rows)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+# postgres with psycopg2 gets COPY ... FROM STDIN (csv, an empty field is NULL), the rest executemany.
+def write_rows(db, table, columns, rows):
+    bind = db.get_bind()
+    count = 0
+    if bind.dialect.name == 'postgresql' and bind.dialect.driver == 'psycopg2':
+        cursor = db.connection().connection.cursor()
+        statement = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        for batch in batches(rows, COPY_BATCH_SIZE):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+            count += len(batch)
+        cursor.close()
+    else:
+        for batch in batches(rows, BATCH_SIZE):
+            db.execute(insert(table), [dict(zip(columns, row)) for row in batch])
+            count += len(batch)
+    db.commit()
+    return count
+
+
+# The ids of the rows added after last_id, in the order they were added.
+def new_ids(db, model, last_id):
+    return list(db.execute(select(model.id).where(model.id > last_id).order_by(model.id)).scalars())
+
+
+def max_id(db, model):
+    return db.execute(select(func.coalesce(func.max(model.id), 0))).scalar()
+
+
+def zipf_cumulative_weights(count, exponent):
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+# How many of total each of count users makes, Zipfian by rank and at most cap each. It gives out what is left in order,
+# so the counts add up to total (unless every user is at the cap).
+def activity_counts(total, count, exponent, cap):
+    weights = [1 / rank ** exponent for rank in range(1, count + 1)]
+    remaining_weight = sum(weights)
+    counts = []
+    for weight in weights:
+        share = min(cap, total, round(total * weight / remaining_weight)) if remaining_weight else 0
+        counts.append(share)
+        total -= share
+        remaining_weight -= weight
+    return counts
+
+
+# count different places, drawn by popularity. A user with most of the places just gets a uniform sample.
+def pick_places(rng, ranked_places, cumulative_weights, count):
+    if count * 2 >= len(ranked_places):
+        return rng.sample(ranked_places, count)
+    picked = {}
+    while len(picked) < count:
+        for place_id in rng.choices(ranked_places, cum_weights=cumulative_weights, k=(count - len(picked)) * 2):
+            picked[place_id] = None
+    return list(picked)[:count]
+
+
+# (user_id, place_id) pairs without a repeat: the voters by activity, every voter's places by popularity.
+def user_place_pairs(rng, voters, ranked_places, total, exponent):
+    if not voters or not ranked_places:
+        return
+    cumulative_weights = zipf_cumulative_weights(len(ranked_places), exponent)
+    for user_id, count in zip(voters, activity_counts(total, len(voters), exponent, len(ranked_places))):
+        for place_id in pick_places(rng, ranked_places, cumulative_weights, count):
+            yield user_id, place_id
+
+
+def user_rows(rng, first_number, count, now):
+    for number in range(first_number, first_number + count):
+        yield (f"user{number}@load.example.com", random_word(rng), random_word(rng), "user", "google", f"load-{number}",
+               now - timedelta(seconds=rng.randint(0, 2 * 365 * 24 * 3600)))
+
+
+def place_rows(rng, count, owner_id, now):
+    for _ in range(count):
+        latitude = longitude = geohash = None
+        # half of the places have coordinates (somewhere in india), for the nearby endpoint.
+        if rng.random() < 0.5:
+            latitude, longitude = round(rng.uniform(8.0, 32.0), 6), round(rng.uniform(68.0, 92.0), 6)
+            geohash = place_geohash(latitude, longitude)
+        yield (f"{random_word(rng)} {rng.choice(KINDS)}",
+               f"{rng.randint(1, 999)} {random_word(rng)} Road, {rng.choice(CITIES)}",
+               " ".join(random_word(rng).lower() for _ in range(rng.randint(20, 60))),
+               rng.randint(110000, 859999), owner_id, latitude, longitude, geohash,
+               now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600)))
+
+
+def new_stats():
+    return {"num_likes": 0, "num_dislikes": 0, "total_user_rated": 0, **{f"{category}_sum": 0 for category in RATING_CATEGORIES}}
+
+
+# Every place has a quality, the votes and ratings of it lean to it, so the averages differ between places.
+def vote_rows(rng, pairs, quality, stats):
+    for user_id, place_id in pairs:
+        vote = rng.random() < quality[place_id]
+        stats[place_id]["num_likes" if vote else "num_dislikes"] += 1
+        yield user_id, place_id, vote
+
+
+def rating_rows(rng, pairs, quality, stats):
+    for user_id, place_id in pairs:
+        place_stats = stats[place_id]
+        place_stats["total_user_rated"] += 1
+        mean = 1 + 4 * quality[place_id]
+        values = []
+        for category in RATING_CATEGORIES:
+            value = min(5, max(1, round(rng.gauss(mean, 1))))
+            place_stats[f"{category}_sum"] += value
+            values.append(value)
+        yield user_id, place_id, *values
+
+
+def feedback_rows(rng, count):
+    for number in range(count):
+        yield (f"Visitor {number}", f"visitor{number}@load.example.com", rng.random() < 0.5,
+               " ".join(random_word(rng).lower() for _ in range(rng.randint(5, 30))))
+
+
+# This is the generator itself (the command below and benchmarks/api/seed.py call it), it returns the count of every table.
+def generate(db, users, places, votes, ratings, feedback, seed=1, zipf=1.1, voter_share=0.3, owner_id=None, log=print):
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    counts = {}
+
+    started = time.perf_counter()
+    last_user_id = max_id(db, User)
+    counts["users"] = write_rows(db, User.__table__,
+                                 ("email", "first_name", "last_name", "role", "provider", "google_sub", "created_at"),
+                                 user_rows(rng, last_user_id + 1, users, now))
+    user_ids = new_ids(db, User, last_user_id)
+    log(f"users: {counts['users']} ({time.perf_counter() - started:.1f}s)")
+
+    started = time.perf_counter()
+    last_place_id = max_id(db, Place)
+    counts["places"] = write_rows(db, Place.__table__,
+                                  ("place_name", "place_address", "about_place", "pincode", "user_id", "latitude", "longitude",
+                                   "geohash", "created_at"),
+                                  place_rows(rng, places, owner_id, now))
+    place_ids = new_ids(db, Place, last_place_id)
+    log(f"places: {counts['places']} ({time.perf_counter() - started:.1f}s)")
+
+    # The rank of the places and the voters are shuffled, so the popular places and the busy users are not the first ids.
+    ranked_places = rng.sample(place_ids, len(place_ids))
+    voters = rng.sample(user_ids, round(len(user_ids) * voter_share))
+    quality = {place_id: rng.betavariate(5, 2) for place_id in place_ids}
+    stats = {place_id: new_stats() for place_id in place_ids}
+
+    started = time.perf_counter()
+    counts["votes"] = write_rows(db, Votes.__table__, ("user_id", "place_id", "vote"),
+                                 vote_rows(rng, user_place_pairs(rng, voters, ranked_places, votes, zipf), quality, stats))
+    log(f"votes: {counts['votes']} ({time.perf_counter() - started:.1f}s)")
+
+    started = time.perf_counter()
+    counts["ratings"] = write_rows(db, Ratings.__table__, ("user_id", "place_id") + RATING_CATEGORIES,
+                                   rating_rows(rng, user_place_pairs(rng, voters, ranked_places, ratings, zipf), quality, stats))
+    log(f"ratings: {counts['ratings']} ({time.perf_counter() - started:.1f}s)")
+
+    counts["feedback"] = write_rows(db, Feedback.__table__, ("name", "email", "found_place", "message"), feedback_rows(rng, feedback))
+    log(f"feedback: {counts['feedback']}")
+
+    # The places are new, so their stats rows are too.
+    stats_columns = tuple(new_stats())
+    write_rows(db, PlaceStats.__table__, ("place_id",) + stats_columns,
+               ((place_id, *(stats[place_id][column] for column in stats_columns)) for place_id in place_ids))
+    bump_data_version(db)
+    db.commit()
+    return counts
+
+
+@app.command()
+def generate_data(
+    users: int = typer.Option(10000, help="Users to add."),
+    places: int = typer.Option(5000, help="Places to add."),
+    votes: int = typer.Option(1000000, help="Votes to add, at most one per user and place."),
+    ratings: int = typer.Option(200000, help="Ratings to add, at most one per user and place."),
+    feedback: int = typer.Option(1000, help="Feedback rows to add."),
+    seed: int = typer.Option(1, help="The same seed gives the same rows."),
+    zipf: float = typer.Option(1.1, help="Zipf exponent of the place popularity and the voter activity, 0 is uniform."),
+    voter_share: float = typer.Option(0.3, help="Share of the new users that log in and vote/rate."),
+):
+    if not 0 < voter_share <= 1:
+        raise typer.BadParameter("must be more than 0 and at most 1", param_hint="--voter-share")
+    voter_count = round(users * voter_share)
+    if votes > voter_count * places or ratings > voter_count * places:
+        raise typer.BadParameter(f"{voter_count} voters can give at most {voter_count * places} votes/ratings to {places} places")
+
+    # creating session here
+    db = sessionLocal()
+    try:
+        started = time.perf_counter()
+        counts = generate(db, users, places, votes, ratings, feedback, seed=seed, zipf=zipf, voter_share=voter_share)
+        print(f"data generated successfully in {time.perf_counter() - started:.1f}s: "
+              + ", ".join(f"{count} {table}" for table, count in counts.items()))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    app()
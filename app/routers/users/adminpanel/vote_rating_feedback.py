@@ -1,17 +1,23 @@
-from fastapi import Depends, APIRouter
+from fastapi import Depends, APIRouter, Query, Request
 # This is pydantic, that used for the data defining that we will receive from the client.
 from app.utilities.oauth2 import get_current_user
-from sqlalchemy.orm import Session
 # Creating the table that we created in model.py
-from app.database.database import get_db
+from app.database.database import AsyncDbOps
+from app.database.replicas import get_read_db
 from app.routers.users.adminpanel.pydanticModels import AdminVoteResponse, AdminRatingsResponse, AdminFeedbackResponse
-from typing import List
+from typing import List, Optional
 from app.routers.users.adminpanel.db_ops import AdminPanelDbOps
+from app.utilities.fields import FIELDS_DESCRIPTION
+from app.utilities.query_counter import query_budget
 from app.routers.users.adminpanel.helper_function import (
     admin_feedback_response,
+    admin_feedback_stream,
     admin_rating_response,
+    admin_rating_stream,
     admin_vote_response,
+    admin_vote_stream,
 )
+from app.utilities.streaming import ndjson_response, wants_stream
 
 
 router = APIRouter(
@@ -20,27 +26,37 @@ router = APIRouter(
 )
 
 
-def db_ops_init(db: Session = Depends(get_db)):
-    return AdminPanelDbOps(db)
+# These are only listings, they read from a replica when there is one.
+async def db_ops_init(db = Depends(get_read_db)):
+    return AsyncDbOps(db, AdminPanelDbOps)
 
 
+# With stream=true (or Accept: application/x-ndjson) the rows are streamed as NDJSON instead of one big list.
+# fields is the sparse fieldset of the list (app/utilities/fields.py), the stream is always the whole rows.
+
 # ========================= votes ================================
 
-@router.get('/votes', response_model=List[AdminVoteResponse])
-def admin_vote(db_ops: Session = Depends(db_ops_init), current_user = Depends(get_current_user)):
-    return admin_vote_response(db_ops, current_user)
+@router.get('/votes', response_model=List[AdminVoteResponse], dependencies=[Depends(query_budget(4))])
+async def admin_vote(request: Request, stream: bool = False, fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION), db_ops: AsyncDbOps = Depends(db_ops_init), current_user = Depends(get_current_user)):
+    if wants_stream(request, stream):
+        return ndjson_response(admin_vote_stream(current_user), AdminVoteResponse)
+    return await db_ops.run(lambda ops: admin_vote_response(ops, current_user, fields))
     
 
 
 # ========================= ratings =================================
 
-@router.get('/rating', response_model=List[AdminRatingsResponse])
-def admin_rating(db_ops: Session = Depends(db_ops_init), current_user = Depends(get_current_user)):
-    return admin_rating_response(db_ops, current_user)
+@router.get('/rating', response_model=List[AdminRatingsResponse], dependencies=[Depends(query_budget(4))])
+async def admin_rating(request: Request, stream: bool = False, fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION), db_ops: AsyncDbOps = Depends(db_ops_init), current_user = Depends(get_current_user)):
+    if wants_stream(request, stream):
+        return ndjson_response(admin_rating_stream(current_user), AdminRatingsResponse)
+    return await db_ops.run(lambda ops: admin_rating_response(ops, current_user, fields))
 
 
 # =============================== feedback ==============================
 
-@router.get('/feedback', response_model=List[AdminFeedbackResponse])
-def admin_feedback(db_ops: Session = Depends(db_ops_init), current_user = Depends(get_current_user)):
-    return admin_feedback_response(db_ops, current_user)
+@router.get('/feedback', response_model=List[AdminFeedbackResponse], dependencies=[Depends(query_budget(4))])
+async def admin_feedback(request: Request, stream: bool = False, fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION), db_ops: AsyncDbOps = Depends(db_ops_init), current_user = Depends(get_current_user)):
+    if wants_stream(request, stream):
+        return ndjson_response(admin_feedback_stream(current_user), AdminFeedbackResponse)
+    return await db_ops.run(lambda ops: admin_feedback_response(ops, current_user, fields))
@@ -1,4 +1,8 @@
 from app.routers.users.models import User
+from app.routers.votes_ratings_feedback.utilities.place_stats import remove_user_place_stats
+from app.routers.places.utilities.data_version import bump_data_version
+from app.utilities.cache import invalidate_response_cache
+from app.utilities.principal_cache import bump_principal_version, invalidate_principal
 
 
 class UsersDbOps:
@@ -27,10 +31,21 @@ class UsersDbOps:
         self.db.refresh(new_user)
         return new_user
 
-    def update_user(self, user_query, request):
+    # The cached principal of the user is removed so the new role is used from the next request, in the other workers too
+    # (the principal version).
+    def update_user(self, user_query, request, user_id):
         user_query.update(request.model_dump(), synchronize_session=False)
+        bump_principal_version(self.db)
         self.db.commit()
+        invalidate_principal(user_id)
 
+    # The votes and ratings of the user are deleted by cascade, so their counts are removed from the place stats first.
     def delete_user(self, user):
+        remove_user_place_stats(self.db, user.id)
+        user_id = user.id
         self.db.delete(user)
+        bump_data_version(self.db)
+        bump_principal_version(self.db)
         self.db.commit()
+        invalidate_principal(user_id)
+        invalidate_response_cache()
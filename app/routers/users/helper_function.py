@@ -1,11 +1,24 @@
 from fastapi import HTTPException, status
 
 from app.utilities.oauth2 import create_access_token
-from app.utilities.utils import check_password, get_hashed_password
+from app.utilities.password_hashing import PasswordHashingBusy, password_hasher
 
 
-def login_response(user_cred, db_ops):
-    user = db_ops.user_query_with_email(user_cred.email)
+# bcrypt runs in the hashing pool, when it is full the login is refused now (503) instead of waiting behind the other ones.
+async def run_password_hashing(function, *args):
+    try:
+        return await function(*args)
+    except PasswordHashingBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many logins right now, try again in a moment",
+            headers={"Retry-After": "1"}
+        )
+
+
+# db_ops is the AsyncDbOps of the request, bcrypt is awaited on the event loop outside of the database run, no thread waits for it.
+async def login_response(user_cred, db_ops):
+    user = await db_ops.run(lambda ops: ops.user_query_with_email(user_cred.email))
 
     if not user:
         raise HTTPException(
@@ -14,7 +27,7 @@ def login_response(user_cred, db_ops):
         )
 
     if user.role == "staff" or user.role == "admin":
-        is_match_pwd = check_password(user_cred.password, str(user.password))
+        is_match_pwd = await run_password_hashing(password_hasher.verify_password_async, user_cred.password, str(user.password))
         if not is_match_pwd:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -30,15 +43,15 @@ def login_response(user_cred, db_ops):
     )
 
 
-def create_staff_user_response(request, db_ops):
-    if db_ops.user_query_with_email(request.email):
+async def create_staff_user_response(request, db_ops):
+    if await db_ops.run(lambda ops: ops.user_query_with_email(request.email)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already exists"
         )
 
-    hashed_password = get_hashed_password(request.password)
-    db_ops.create_user(request, hashed_password)
+    hashed_password = await run_password_hashing(password_hasher.hash_password_async, request.password)
+    await db_ops.run(lambda ops: ops.create_user(request, hashed_password))
     return {"message": "User created successfully"}
 
 
@@ -51,7 +64,7 @@ def update_user_response(user_id, request, db_ops):
             detail=f"The place of the id:{user_id} is not found."
         )
 
-    db_ops.update_user(user_query, request)
+    db_ops.update_user(user_query, request, user_id)
     return {"message": "user has been updated successfully"}
 
 
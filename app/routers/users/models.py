@@ -1,5 +1,5 @@
 from app.database.database import Base
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -17,10 +17,20 @@ class User(Base):
     provider = Column(String, nullable=False, server_default='local')
     google_sub = Column(String, unique=True, nullable=True)
     places = relationship("Place", back_populates="user")
-    votes = relationship("Votes", back_populates="user")
-    ratings = relationship("Ratings", back_populates="user")
+    # passive_deletes leaves the votes and ratings to "on delete cascade" of the database, without it the orm sets their user_id to null.
+    votes = relationship("Votes", back_populates="user", passive_deletes=True)
+    ratings = relationship("Ratings", back_populates="user", passive_deletes=True)
     profile_url = Column(String, nullable=True)
     created_at = Column(
         DateTime(timezone=True),
         server_default=func.now()
     )
+
+
+# The one row (id 1) of the version of the users, every role change, update and delete of a user adds 1 to it in its
+# transaction, so the workers know that their cached principals are old (app/utilities/principal_cache.py).
+class PrincipalVersion(Base):
+    __tablename__ = 'principal_version'
+
+    id = Column(Integer, primary_key=True, nullable=False)
+    version = Column(BigInteger, nullable=False, default=0, server_default='0')
@@ -1,51 +1,46 @@
-from app.routers.places.models import Place
 from app.routers.votes_ratings_feedback.models import Feedback, Ratings, Votes
-from sqlalchemy import and_
-
-
+from app.routers.votes_ratings_feedback.utilities.place_stats import (
+    RATING_CATEGORIES,
+    apply_place_stats_delta,
+    rating_delta,
+    vote_delta,
+)
+from app.routers.votes_ratings_feedback.utilities.user_place_upsert import upsert_user_place
+from app.routers.places.utilities.data_version import bump_data_version
+from app.utilities.cache import invalidate_response_cache
+
+
+# The vote and rating writes change the place stats, so they bump the data version (ETag) and clear the cached place responses after the commit.
+# Each one is one upsert of the row (app/routers/votes_ratings_feedback/utilities/user_place_upsert.py) that also gives the
+# old row for the stats delta, the old row is locked till commit so two writes of the same vote can't use the same old value.
 class VoteRatingFeedbackDbOps:
     def __init__(self, db):
         self.db = db
 
-    def place_query_with_id(self, place_id):
-        return self.db.query(Place).filter(Place.id == place_id).first()
-
-    def user_vote_query(self, user_id, place_id):
-        return self.db.query(Votes).filter(
-            and_(Votes.place_id == place_id, Votes.user_id == user_id)
-        ).first()
-
-    def create_vote(self, user_id, place_id, vote_value):
-        vote = Votes(
-            user_id=user_id,
-            place_id=place_id,
-            vote=vote_value
-        )
-        self.db.add(vote)
-        self.db.commit()
-        self.db.refresh(vote)
-        return vote
-
-    def update_vote(self, vote, vote_value):
-        vote.vote = vote_value
-        self.db.commit()
-        return vote
-
-    def user_rating_query(self, user_id, place_id):
-        return self.db.query(Ratings).filter(
-            and_(Ratings.user_id == user_id, Ratings.place_id == place_id)
-        )
-
-    def update_rating(self, ratings_query, request):
-        ratings_query.update(request.model_dump(), synchronize_session=False)
-        self.db.commit()
-
-    def create_rating(self, request):
-        rating = Ratings(**request.model_dump())
-        self.db.add(rating)
+    # It returns the old row (None when the vote is new), or False when the place doesn't exist.
+    def upsert_vote(self, user_id, place_id, vote_value):
+        written = upsert_user_place(self.db, Votes.__table__, {"user_id": user_id, "place_id": place_id, "vote": vote_value}, ("vote",))
+        if written is None:
+            return False
+        old_vote = written[1]
+        apply_place_stats_delta(self.db, place_id, vote_delta(old_vote.vote if old_vote else None, vote_value))
+        self._commit()
+        return old_vote
+
+    # Same as upsert_vote, request has the user_id and place_id.
+    def upsert_rating(self, request):
+        written = upsert_user_place(self.db, Ratings.__table__, request.model_dump(), RATING_CATEGORIES)
+        if written is None:
+            return False
+        old_rating = written[1]
+        apply_place_stats_delta(self.db, request.place_id, rating_delta(old_rating, request))
+        self._commit()
+        return old_rating
+
+    def _commit(self):
+        bump_data_version(self.db)
         self.db.commit()
-        self.db.refresh(rating)
-        return rating
+        invalidate_response_cache()
 
     def create_feedback(self, request):
         new_feedback = Feedback(**request.model_dump())
@@ -1,8 +1,7 @@
 from fastapi import status, Depends, APIRouter
 # This is pydantic, that used for the data defining that we will receive from the client.
-from sqlalchemy.orm import Session
 # Creating the table that we created in model.py
-from app.database.database import get_db
+from app.database.database import AsyncDbOps, get_request_db
 from app.routers.votes_ratings_feedback.pydanticModels import FeedbackRequest
 from app.routers.votes_ratings_feedback.db_ops import VoteRatingFeedbackDbOps
 from app.routers.votes_ratings_feedback.helper_function import feedback_response
@@ -13,10 +12,10 @@ router = APIRouter(
 )
 
 
-def db_ops_init(db: Session = Depends(get_db)):
-    return VoteRatingFeedbackDbOps(db)
+async def db_ops_init(db = Depends(get_request_db)):
+    return AsyncDbOps(db, VoteRatingFeedbackDbOps)
 
 
 @router.post('/feedback', status_code=status.HTTP_201_CREATED)
-def feedback(request: FeedbackRequest, db_ops: Session = Depends(db_ops_init)):
-    return feedback_response(request, db_ops)
+async def feedback(request: FeedbackRequest, db_ops: AsyncDbOps = Depends(db_ops_init)):
+    return await db_ops.run(lambda ops: feedback_response(request, ops))
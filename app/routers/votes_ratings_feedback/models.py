@@ -1,5 +1,5 @@
 from app.database.database import Base
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Boolean
 from sqlalchemy.sql import func
 from sqlalchemy import ForeignKey, CheckConstraint, UniqueConstraint
 from sqlalchemy.orm import relationship
@@ -33,6 +33,12 @@ class Votes(Base):
         server_default=func.now()
     )
 
+    # One vote per user and place, the vote upsert is "on conflict (user_id, place_id)". Its index is also the one of the
+    # user overlay, the votes of one user for the places of a page.
+    __table_args__ = (
+        UniqueConstraint("user_id", "place_id", name="unique_user_place_vote"),
+    )
+
 
 class Ratings(Base):
     __tablename__ = 'ratings'
@@ -66,6 +72,28 @@ class Ratings(Base):
         server_default=func.now()
     )
 
+# This is the denormalized table of the vote and rating aggregates, one row per place.
+# It is updated by the vote and rating write paths so the reads don't need to count all the rows again.
+class PlaceStats(Base):
+    __tablename__ = 'place_stats'
+    place_id = Column(Integer, ForeignKey("places.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    num_likes = Column(Integer, nullable=False, default=0, server_default='0')
+    num_dislikes = Column(Integer, nullable=False, default=0, server_default='0')
+    total_user_rated = Column(Integer, nullable=False, default=0, server_default='0')
+    # These are the sums of each category, average = sum/total_user_rated
+    overall_sum = Column(Integer, nullable=False, default=0, server_default='0')
+    cleanliness_sum = Column(Integer, nullable=False, default=0, server_default='0')
+    safety_sum = Column(Integer, nullable=False, default=0, server_default='0')
+    crowd_behavior_sum = Column(Integer, nullable=False, default=0, server_default='0')
+    lightning_sum = Column(Integer, nullable=False, default=0, server_default='0')
+    transport_access_sum = Column(Integer, nullable=False, default=0, server_default='0')
+    facility_quality_sum = Column(Integer, nullable=False, default=0, server_default='0')
+    # These go up on every write of the place (its votes, its ratings and the place itself), they are the ETag and the
+    # Last-Modified of the place detail. updated_at is NULL till the first write, then it is the created_at of the place.
+    version = Column(BigInteger, nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+
+
 class Feedback(Base):
     __tablename__ = 'feedback'
     id = Column(Integer, primary_key=True, nullable=False, index=True)
@@ -0,0 +1,119 @@
+# This is for keeping the place_stats table in sync with the votes and ratings.
+"""
+Every write only sends the change (delta) of the counts and sums, like:
+like -> dislike is num_likes - 1 and num_dislikes + 1
+
+The delta is written with "insert ... on conflict do update", so if the place has no stats row yet it is created,
+otherwise the delta is added to the old values in the database itself (no read before write).
+Every write of the row also adds 1 to its version and sets updated_at, they are the ETag/Last-Modified of the place detail.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import case, func, select, update
+
+from app.database.database import dialect_insert
+from app.routers.votes_ratings_feedback.models import PlaceStats, Ratings, Votes
+
+RATING_CATEGORIES = (
+    "overall",
+    "cleanliness",
+    "safety",
+    "crowd_behavior",
+    "lightning",
+    "transport_access",
+    "facility_quality",
+)
+
+
+# This gives the change in likes and dislikes when the vote goes from old_vote to new_vote (True, False or None).
+def vote_delta(old_vote, new_vote):
+    likes = int(new_vote is True) - int(old_vote is True)
+    dislikes = int(new_vote is False) - int(old_vote is False)
+    return {"num_likes": likes, "num_dislikes": dislikes}
+
+
+# old_rating and new_rating are the rating rows/requests, None means there is no rating.
+def rating_delta(old_rating, new_rating):
+    delta = {"total_user_rated": int(new_rating is not None) - int(old_rating is not None)}
+    for category in RATING_CATEGORIES:
+        new_value = getattr(new_rating, category) if new_rating is not None else 0
+        old_value = getattr(old_rating, category) if old_rating is not None else 0
+        delta[f"{category}_sum"] = new_value - old_value
+    return delta
+
+
+# A delta of only zeros changes nothing that is shown, so the row and its version are not written.
+def apply_place_stats_delta(db, place_id, delta):
+    delta = {column: value for column, value in delta.items() if value}
+    if delta:
+        _write_place_stats(db, place_id, delta)
+
+
+# The place itself changed (not its counts), only the version of the place detail goes up.
+def bump_place_version(db, place_id):
+    _write_place_stats(db, place_id, {})
+
+
+def _write_place_stats(db, place_id, delta):
+    table = PlaceStats.__table__
+    now = datetime.now(timezone.utc)
+    statement = dialect_insert(db, table).values(place_id=place_id, version=1, updated_at=now, **delta)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.place_id],
+        set_={
+            **{column: table.c[column] + statement.excluded[column] for column in delta},
+            "version": table.c.version + 1,
+            "updated_at": now,
+        },
+    )
+    db.execute(statement)
+
+
+# This takes the votes and ratings of a user out of the stats of their places, before they are deleted with the user.
+# It is one grouped "update place_stats ... from (select place_id, sum(...) ... group by place_id)" for the votes and one for
+# the ratings, whatever the number of rows of the user.
+def remove_user_place_stats(db, user_id):
+    table = PlaceStats.__table__
+    changed = {"version": table.c.version + 1, "updated_at": datetime.now(timezone.utc)}
+
+    votes = select(
+        Votes.place_id,
+        func.sum(case((Votes.vote.is_(True), 1), else_=0)).label("num_likes"),
+        func.sum(case((Votes.vote.is_(False), 1), else_=0)).label("num_dislikes"),
+    ).where(Votes.user_id == user_id).group_by(Votes.place_id).subquery()
+    db.execute(
+        update(table).where(table.c.place_id == votes.c.place_id).values(
+            {**{column: table.c[column] - votes.c[column] for column in ("num_likes", "num_dislikes")}, **changed}
+        )
+    )
+
+    sum_columns = [f"{category}_sum" for category in RATING_CATEGORIES]
+    ratings = select(
+        Ratings.place_id,
+        func.count(Ratings.id).label("total_user_rated"),
+        *[func.sum(getattr(Ratings, category)).label(f"{category}_sum") for category in RATING_CATEGORIES],
+    ).where(Ratings.user_id == user_id).group_by(Ratings.place_id).subquery()
+    db.execute(
+        update(table).where(table.c.place_id == ratings.c.place_id).values(
+            {**{column: table.c[column] - ratings.c[column] for column in ("total_user_rated", *sum_columns)}, **changed}
+        )
+    )
+
+
+# It is returning (total_user_rated, then the average of overall, cleanliness, safety, crowd_behavior, transport_access,
+# lightning, facility_quality) from the stats row, all 0 when the place has no rating.
+def average_rating_from_stats(stats):
+    if stats is None or not stats.total_user_rated:
+        return 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
+
+    total = stats.total_user_rated
+    return (
+        total,
+        stats.overall_sum/total,
+        stats.cleanliness_sum/total,
+        stats.safety_sum/total,
+        stats.crowd_behavior_sum/total,
+        stats.transport_access_sum/total,
+        stats.lightning_sum/total,
+        stats.facility_quality_sum/total,
+    )
@@ -0,0 +1,113 @@
+import typer
+from sqlalchemy import case, func, select
+
+from app.database.database import sessionLocal
+from app.database.models import Place, PlaceStats, Ratings, Votes
+from app.routers.places.utilities.data_version import bump_data_version
+from app.routers.votes_ratings_feedback.utilities.place_stats import RATING_CATEGORIES, apply_place_stats_delta, bump_place_version
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# creating instance of typer.
+app = typer.Typer()
+
+"""
+This recomputes the place_stats table from the votes and ratings rows and reports the places where the stored stats drifted.
+
+NOTE: RUN COMMAND IS:
+python -m app.routers.votes_ratings_feedback.utilities.rebuild_place_stats
+python -m app.routers.votes_ratings_feedback.utilities.rebuild_place_stats --check   (only report, don't write)
+
+The votes, ratings and the stored stats are read in one snapshot, and the fix is written as a delta (expected - stored) with the
+same "insert ... on conflict do update" as the votes and ratings (apply_place_stats_delta), so a vote or rating written while
+this runs keeps its own delta, it is not overwritten by an absolute value read before it.
+- postgres: the reads are one REPEATABLE READ (read only) transaction, the deltas are written by another session after it.
+- sqlite: there is one writer at a time, the whole run is one "BEGIN IMMEDIATE" transaction, the writes of the app wait for it.
+"""
+
+STATS_COLUMNS = ("num_likes", "num_dislikes", "total_user_rated") + tuple(f"{category}_sum" for category in RATING_CATEGORIES)
+
+
+# This calculates the stats of every place from scratch with two grouped queries.
+def compute_place_stats(db):
+    expected = {place_id: dict.fromkeys(STATS_COLUMNS, 0) for place_id in db.execute(select(Place.id)).scalars()}
+
+    vote_rows = db.execute(
+        select(
+            Votes.place_id,
+            func.sum(case((Votes.vote.is_(True), 1), else_=0)).label("num_likes"),
+            func.sum(case((Votes.vote.is_(False), 1), else_=0)).label("num_dislikes"),
+        ).group_by(Votes.place_id)
+    )
+    for row in vote_rows:
+        expected[row.place_id].update(num_likes=int(row.num_likes), num_dislikes=int(row.num_dislikes))
+
+    rating_rows = db.execute(
+        select(
+            Ratings.place_id,
+            func.count(Ratings.id).label("total_user_rated"),
+            *[func.sum(getattr(Ratings, category)).label(f"{category}_sum") for category in RATING_CATEGORIES],
+        ).group_by(Ratings.place_id)
+    )
+    for row in rating_rows:
+        expected[row.place_id].update({column: int(getattr(row, column)) for column in STATS_COLUMNS[2:]})
+
+    return expected
+
+
+# The session that reads the stats and the one that writes the deltas, see the note at the top.
+def snapshot_sessions():
+    db = sessionLocal()
+    if db.get_bind().dialect.name == 'sqlite':
+        db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+        return db, db
+    db.connection(execution_options={"isolation_level": "REPEATABLE READ", "postgresql_readonly": True})
+    return db, sessionLocal()
+
+
+@app.command()
+def rebuild_place_stats(check: bool = typer.Option(False, "--check", help="Only report the drift, don't rewrite the table.")):
+    # creating sessions here
+    read_db, write_db = snapshot_sessions()
+    try:
+        expected = compute_place_stats(read_db)
+        columns = [getattr(PlaceStats, column) for column in STATS_COLUMNS]
+        stored = {row.place_id: row for row in read_db.execute(select(PlaceStats.place_id, *columns))}
+        if read_db is not write_db:
+            read_db.rollback()
+
+        drift = 0
+        for place_id, values in expected.items():
+            stats = stored.get(place_id)
+            current = {column: getattr(stats, column) for column in STATS_COLUMNS} if stats else dict.fromkeys(STATS_COLUMNS, 0)
+            changed = {column: (current[column], value) for column, value in values.items() if current[column] != value}
+            if changed or stats is None:
+                drift += 1
+                print(f'place {place_id} drifted: {changed if changed else "stats row missing"}')
+
+            if check or not (changed or stats is None):
+                continue
+            # The delta also gives the place a new version, so the cached details and the ETags of it are new.
+            if changed:
+                apply_place_stats_delta(write_db, place_id, {column: value - current[column] for column, (_, value) in changed.items()})
+            else:
+                bump_place_version(write_db, place_id)
+
+        print(f'{drift} of {len(expected)} places drifted')
+        if check:
+            if drift:
+                raise typer.Exit(code=1)
+            return
+
+        if drift:
+            bump_data_version(write_db)
+        write_db.commit()
+        print('place stats rebuilt successfully')
+    finally:
+        read_db.close()
+        write_db.close()
+
+
+if __name__ == "__main__":
+    app()
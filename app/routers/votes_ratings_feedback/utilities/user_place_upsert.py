@@ -0,0 +1,128 @@
+from functools import lru_cache
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, bindparam, false, select, text
+from sqlalchemy.exc import IntegrityError
+
+from app.database.database import dialect_insert
+from app.routers.places.models import Place
+
+"""
+This is the write of a vote/rating, the row of (user_id, place_id) is created or updated by one
+"insert ... on conflict (user_id, place_id) do update ... returning" statement, there is no read of the place or of the row first.
+
+- The place must exist: the insert is "insert ... select ... where places.id = place_id", so a place that is not there gives
+  no row (and on postgres the foreign key stops a place that is deleted at the same time). The statement also gives the id of
+  the place, so a place that is not there is known from the first statement.
+- The stats need the old values of the row (app/routers/votes_ratings_feedback/utilities/place_stats.py). On postgres they
+  come from the same statement, a CTE reads and locks the old row (for update) and the returning gives its values, the CTE is
+  read with the snapshot of the statement so it is the row before the update. sqlite reads the CTE after the write, so there
+  the old row (and the place) is read just before and the update checks that it still has the values that were read.
+- The postgres statement is SQL text made once per table: SQLAlchemy 2.0 doesn't cache the compiled "on conflict"
+  statements, and compiling this one (the CTE and a subquery per old value) took more CPU than the round trips it saves.
+- It is a compare and swap: the update only happens when the row is the one that was read (on conflict ... where id = old id).
+  Two first votes of the same user at the same time both see no row, one inserts and the other one conflicts with a row it
+  didn't read, then it updates nothing and runs again, now it sees the row, so the stats delta is never from a wrong old value.
+  A write that loses only runs again because another one was written, on postgres the second run has the row locked.
+  It runs at most MAX_UPSERT_ATTEMPTS times, then the request gets 409 (the same user writing the same row again and again).
+"""
+
+KEY_COLUMNS = ("user_id", "place_id")
+MAX_UPSERT_ATTEMPTS = 5
+
+
+# values are the columns of the row (with user_id and place_id), old_columns are the ones whose old value is needed.
+# It returns (id of the row, old row or None), the old row has id and old_columns. None when the place doesn't exist.
+def upsert_user_place(db, table, values, old_columns):
+    for _ in range(MAX_UPSERT_ATTEMPTS):
+        try:
+            place_found, written = _upsert(db, table, values, old_columns)
+        except IntegrityError as error:
+            # the place was deleted after the insert read it, same as not there.
+            if _is_foreign_key_error(error):
+                db.rollback()
+                return None
+            raise
+        if not place_found:
+            return None
+        if written is not None:
+            return written
+        # Nothing written: the row was written by another request after this statement read it, the next run reads it again.
+    db.rollback()
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="This was changed by another request at the same time, try again",
+    )
+
+
+# It returns (place found, (id of the row, old row or None) or None when the row was not the one that was read).
+def _upsert(db, table, values, old_columns):
+    if db.get_bind().dialect.name == 'postgresql':
+        row = db.execute(_postgres_upsert(table, tuple(values), tuple(old_columns)), values).one()
+        if row.place_id is None:
+            return False, None
+        # The old row is locked by the CTE, so when nothing is returned it was inserted after the statement started.
+        if row.row_id is None:
+            return True, None
+        return True, (row.row_id, row if row.id is not None else None)
+
+    user_id, place_id = values["user_id"], values["place_id"]
+    # The place and the old row are read in one statement, there is no row when the place is not there.
+    old_select = select(Place.id.label("place_id"), table.c.id, *[table.c[column] for column in old_columns]).outerjoin(
+        table, and_(table.c.user_id == user_id, table.c.place_id == Place.id)
+    ).where(Place.id == place_id)
+    place_row = db.execute(old_select).first()
+    if place_row is None:
+        return False, None
+    old_row = place_row if place_row.id is not None else None
+
+    columns = list(values)
+    source = select(*[bindparam(column, values[column], type_=table.c[column].type) for column in columns]).where(Place.id == place_id)
+    statement = dialect_insert(db, table).from_select(columns, source)
+    update_columns = {column: statement.excluded[column] for column in columns if column not in KEY_COLUMNS}
+
+    # The old row is not locked here, so the update also checks that its values are still the ones that were read.
+    unchanged = false()
+    if old_row:
+        unchanged = and_(table.c.id == old_row.id, *[table.c[column].is_not_distinct_from(old_row._mapping[column]) for column in old_columns])
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.place_id],
+        set_=update_columns,
+        where=unchanged,
+    ).returning(table.c.id)
+    row_id = db.execute(statement).scalar()
+    if row_id is None:
+        return True, None
+    return True, (row_id, old_row)
+
+
+# It is always one row: place_id is NULL when the place is not there, row_id is NULL when nothing was written, and the old
+# row (id and old_columns) is NULL when there was none.
+@lru_cache(maxsize=None)
+def _postgres_upsert(table, columns, old_columns):
+    name = table.name
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns if column not in KEY_COLUMNS)
+    old_values = ", ".join(f"(SELECT {column} FROM old_row) AS {column}" for column in ("id", *old_columns))
+    statement = text(f"""
+        WITH place AS (
+            SELECT id FROM places WHERE id = :place_id
+        ), old_row AS (
+            SELECT id, {", ".join(old_columns)} FROM {name}
+            WHERE user_id = :user_id AND place_id = :place_id
+            FOR UPDATE
+        ), written AS (
+            INSERT INTO {name} ({", ".join(columns)})
+            SELECT {", ".join(f":{column}" for column in columns)} FROM place
+            ON CONFLICT (user_id, place_id) DO UPDATE SET {updates}
+            WHERE {name}.id = (SELECT id FROM old_row)
+            RETURNING {name}.id AS row_id, {old_values}
+        )
+        SELECT place.id AS place_id, written.*
+        FROM (SELECT 1) AS one LEFT JOIN place ON true LEFT JOIN written ON true
+    """)
+    return statement.bindparams(*[bindparam(column, type_=table.c[column].type) for column in columns])
+
+
+def _is_foreign_key_error(error):
+    orig = error.orig
+    return (getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)) == "23503"
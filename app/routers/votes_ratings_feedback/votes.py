@@ -1,10 +1,11 @@
-from fastapi import Depends, APIRouter
+from fastapi import Depends, APIRouter, Response
 # This is pydantic, that used for the data defining that we will receive from the client.
-from sqlalchemy.orm import Session
 # Creating the table that we created in model.py
-from app.database.database import get_db
+from app.database.database import AsyncDbOps, get_request_db
+from app.database.replicas import mark_recent_write
 from app.utilities.oauth2 import get_current_user
 from app.routers.votes_ratings_feedback.pydanticModels import VoteRequest
+from app.utilities.query_counter import query_budget
 from app.routers.votes_ratings_feedback.db_ops import VoteRatingFeedbackDbOps
 from app.routers.votes_ratings_feedback.helper_function import add_vote_response
 
@@ -14,16 +15,20 @@ router = APIRouter(
 )
 
 
-def db_ops_init(db: Session = Depends(get_db)):
-    return VoteRatingFeedbackDbOps(db)
+async def db_ops_init(db = Depends(get_request_db)):
+    return AsyncDbOps(db, VoteRatingFeedbackDbOps)
 
 
-@router.post('/vote/{place_id}')
-def add_vote(
+@router.post('/vote/{place_id}', dependencies=[Depends(query_budget(8))])
+async def add_vote(
     place_id: int,
     request: VoteRequest,
-    db_ops: Session = Depends(db_ops_init),
+    response: Response,
+    db_ops: AsyncDbOps = Depends(db_ops_init),
     current_user = Depends(get_current_user)
 ):
-    return add_vote_response(place_id, request, db_ops, current_user)
+    vote = await db_ops.run(lambda ops: add_vote_response(place_id, request, ops, current_user))
+    # the next reads of this user are on the primary, so the vote is in them even if the replicas are behind.
+    mark_recent_write(current_user.id, response)
+    return vote
     
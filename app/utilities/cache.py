@@ -0,0 +1,244 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Response
+
+from app.utilities.json_response import dump_json
+from app.utilities.metrics import cache_counters
+from app.utilities.pagination import NEXT_CURSOR_HEADER
+
+"""
+This is the in process response cache of the anonymous place endpoints (listing, search, nearby) and the shared part of the place detail.
+
+- The values are the serialized JSON bodies, so a hit is only a dict lookup and no query, no pydantic.
+- Every entry lives RESPONSE_CACHE_TTL_SECONDS and the least recently used entries are evicted when the bodies are
+  more than RESPONSE_CACHE_MAX_BYTES (0 turns the cache off).
+- The place, vote and rating writes (db_ops) clear it after the commit, because one vote changes the counts of every listing page
+  that has the place. Every uvicorn worker has its own cache and only sees its own writes, the writes of the other workers
+  are seen after the TTL.
+- The shared part of the place details is in place_cache, its keys have the version of the place (its place_stats row), so
+  a write doesn't clear it: a write of a place makes a new key for that place only, the entry of the old version is not
+  read again and goes with the LRU/TTL.
+"""
+
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '30'))
+
+
+class ResponseCache:
+    def __init__(self, max_bytes, ttl_seconds, name='responses'):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at, size, value), the order is the LRU order, the last one is the most recently used.
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # It goes up on every invalidate, a value built before a write is not stored after it.
+        self.generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        # the prometheus counters (app/utilities/metrics.py), these are for all the workers.
+        self._hit_counter, self._miss_counter = cache_counters(name)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 and self.ttl_seconds > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                self._miss_counter.inc()
+                return None
+            expires_at, size, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                self._miss_counter.inc()
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._hit_counter.inc()
+            return value
+
+    # generation is the one read before the value was built.
+    def set(self, key, value, size, generation):
+        # A value bigger than the whole budget would only evict everything else.
+        if not self.enabled or size > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = OrderedDict()
+            self._bytes = 0
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_SECONDS)
+place_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_SECONDS, name='places')
+
+
+# This is the small TTL + LRU cache of objects (not bodies), bounded by the number of entries, like the principal cache of oauth2.
+# name is the cache label of the prometheus counters, None is not counted there.
+class TTLCache:
+    def __init__(self, max_entries, ttl_seconds, name=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at, value), in the LRU order.
+        self._entries = OrderedDict()
+        # Same as ResponseCache.generation, a value read before an invalidate is not stored after it.
+        self.generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._counters = cache_counters(name) if name else None
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                if self._counters:
+                    self._counters[1].inc()
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if self._counters:
+                self._counters[0].inc()
+            return entry[1]
+
+    # ttl_seconds can be given to keep an entry less than the default ttl (a token that expires sooner).
+    def set(self, key, value, ttl_seconds=None, generation=None):
+        if not self.enabled:
+            return
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # Without a key all the entries are removed.
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries = OrderedDict()
+            else:
+                self._entries.pop(key, None)
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# build() returns (data, next_cursor), it is only called on a miss. The cached body is sent as it is, with the X-Next-Cursor header.
+def cached_json_response(key, response_model, build):
+    cached = response_cache.get(key) if response_cache.enabled else None
+    if cached is None:
+        generation = response_cache.generation
+        data, next_cursor = build()
+        # The body is written like the not cached one (app/utilities/json_response.py).
+        cached = (dump_json(response_model, data), next_cursor)
+        response_cache.set(key, cached, len(cached[0]), generation)
+
+    body, next_cursor = cached
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# This is for the shared part of the place detail (place_cache), the key must have the version of the place.
+# The size is the size of its JSON.
+def cached_value(key, build):
+    if not place_cache.enabled:
+        return build()
+    value = place_cache.get(key)
+    if value is None:
+        generation = place_cache.generation
+        value = build()
+        # None is not cached, it is the same as a miss.
+        if value is not None:
+            place_cache.set(key, value, len(dump_json(type(value), value)), generation)
+    return value
+
+
+# This is cached_value for many values, keys is item -> key. build(items) is called once with the items that are not cached
+# and returns item -> value, an item that it doesn't return is not in the result (and not cached).
+def cached_values(keys, build):
+    if not place_cache.enabled:
+        return build(list(keys))
+    values = {}
+    missing = []
+    for item, key in keys.items():
+        value = place_cache.get(key)
+        if value is None:
+            missing.append(item)
+        else:
+            values[item] = value
+    if missing:
+        generation = place_cache.generation
+        for item, value in build(missing).items():
+            values[item] = value
+            place_cache.set(keys[item], value, len(dump_json(type(value), value)), generation)
+    return values
+
+
+def invalidate_response_cache():
+    response_cache.invalidate()
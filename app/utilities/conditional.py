@@ -0,0 +1,71 @@
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import timezone
+
+from fastapi import Response, status
+
+"""
+This is the conditional GET (ETag / Last-Modified / 304) of the place endpoints.
+
+The ETag is not a hash of the body, it is the data version (app/routers/places/utilities/data_version.py) and the user,
+the same URL has a different body for every user (voted, is_user_rated) so the user id is in the ETag and the response varies on Authorization.
+The check is done before the aggregation, so a 304 costs one small query (the version row) and the auth.
+"""
+
+
+class Validators:
+    def __init__(self, version, etag, last_modified, private):
+        # version is the data version alone (the etag has the user too), it is used in the cache keys.
+        self.version = version
+        self.etag = etag
+        self.last_modified = last_modified
+        self.private = private
+
+
+def data_validators(version, updated_at, current_user=None):
+    user_id = current_user.id if current_user else 0
+    last_modified = None
+    if updated_at is not None:
+        # sqlite gives the datetime without the timezone, it is written in UTC.
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        last_modified = updated_at.astimezone(timezone.utc).replace(microsecond=0)
+    return Validators(version, f'W/"{version}-{user_id}"', last_modified, current_user is not None)
+
+
+def _etag_value(etag):
+    return etag.strip().removeprefix("W/")
+
+
+# If-None-Match is checked first and If-Modified-Since only when there is no If-None-Match, like the HTTP spec says.
+def is_not_modified(request, validators):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        current = _etag_value(validators.etag)
+        return any(_etag_value(etag) == current for etag in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and validators.last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return validators.last_modified <= since
+    return False
+
+
+def set_validators(response, validators):
+    response.headers["ETag"] = validators.etag
+    if validators.last_modified is not None:
+        response.headers["Last-Modified"] = format_datetime(validators.last_modified, usegmt=True)
+    response.headers["Vary"] = "Authorization"
+    # no-cache is "keep it but ask every time", the ask is the cheap 304.
+    response.headers["Cache-Control"] = "private, no-cache" if validators.private else "no-cache"
+    return response
+
+
+def not_modified_response(validators):
+    return set_validators(Response(status_code=status.HTTP_304_NOT_MODIFIED), validators)
@@ -0,0 +1,51 @@
+from functools import lru_cache
+
+from fastapi import HTTPException, status
+from pydantic import create_model
+
+from app.utilities.json_response import model_field_names
+
+"""
+This is the sparse fieldset of the list endpoints, ?fields=id,place_name,pincode,num_likes gives only those fields of every row.
+
+- The names are the fields of the response model of the endpoint, an unknown name is 400 with the list of the known ones.
+  The fields are in the order of the model whatever the order in the query string. No fields (or all of them) is the full
+  view, that is the response_model of the route like before.
+- The db_ops select only the columns of these fields (plus the ones the page needs, like the cursor), so a list view without
+  about_place doesn't read it from the database, and the place stats/user overlay are only queried when a count/flag is asked.
+- The rows are written like the full view (app/utilities/json_response.py), with JSON_RESPONSE_VALIDATE they are validated
+  by a model of only these fields (sparse_model).
+"""
+
+FIELDS_DESCRIPTION = "Comma separated fields of every row (a sparse fieldset), default all of them. The NDJSON stream ignores it."
+
+
+# It returns the field names in the order of the model, or None for the full view.
+def parse_fields(fields, model):
+    if not fields:
+        return None
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    if not names:
+        return None
+    known = model_field_names(model)
+    unknown = names.difference(known)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. The fields are: {', '.join(known)}",
+        )
+    if len(names) == len(known):
+        return None
+    return tuple(name for name in known if name in names)
+
+
+# The model of only these fields (same types), it is made once per model and fields.
+@lru_cache(maxsize=None)
+def sparse_model(model, fields):
+    return create_model(f"{model.__name__}Fields", **{name: (model.model_fields[name].annotation, model.model_fields[name]) for name in fields})
+
+
+# The columns of the table model for these fields (the response fields are the names of the columns), required are the
+# columns the page needs whatever is asked (the cursor), they are selected once.
+def model_columns(table_model, fields, required=()):
+    return [getattr(table_model, name) for name in dict.fromkeys((*required, *fields))]
@@ -0,0 +1,177 @@
+import base64
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import requests
+from google.auth import exceptions as google_exceptions
+from google.auth import jwt as google_jwt
+
+from app.utilities.metrics import google_cert_fetches, google_token_verify_seconds
+
+"""
+This is the Google sign-in token verification without a call to Google on every login.
+
+google.oauth2.id_token.verify_oauth2_token downloads the signing certs of Google for every token, so every login waited for Google.
+Here the certs are kept in memory:
+- they are fetched with one shared requests.Session (pooled connections) from GOOGLE_CERTS_URL,
+  GOOGLE_CERTS_URL can be changed to a local server that serves the same JSON ({"kid": "PEM cert"}) for testing.
+- they are kept for the max-age of the Cache-Control header of that response (Google sends ~6 hours).
+- a background thread fetches them again before they expire (GOOGLE_CERTS_REFRESH_MARGIN_SECONDS), so the logins never wait for it.
+  If that fetch fails, the old certs are used and it is tried again after GOOGLE_CERTS_RETRY_SECONDS.
+- a token signed with a key id that is not in the certs (Google rotated the keys) makes one fetch, at most every GOOGLE_CERTS_RETRY_SECONDS.
+The signature, audience (GOOGLE_CLIENT_ID), expiry and issuer are checked locally with google.auth.jwt.
+"""
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CERTS_URL = os.getenv('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v1/certs')
+GOOGLE_CERTS_REFRESH_MARGIN_SECONDS = float(os.getenv('GOOGLE_CERTS_REFRESH_MARGIN_SECONDS', '300'))
+GOOGLE_CERTS_RETRY_SECONDS = float(os.getenv('GOOGLE_CERTS_RETRY_SECONDS', '30'))
+GOOGLE_CERTS_TIMEOUT_SECONDS = float(os.getenv('GOOGLE_CERTS_TIMEOUT_SECONDS', '5'))
+# If the response has no max-age the certs are kept for 1 hour.
+DEFAULT_MAX_AGE_SECONDS = 3600
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+def max_age_seconds(cache_control):
+    match = MAX_AGE_PATTERN.search(cache_control or "")
+    return int(match.group(1)) if match else DEFAULT_MAX_AGE_SECONDS
+
+
+# The key id is in the header of the token, it is read without verifying to know if the certs have that key.
+def token_key_id(token):
+    try:
+        header = token.split(".", 1)[0]
+        return json.loads(base64.urlsafe_b64decode(header + "=" * (-len(header) % 4))).get("kid")
+    except (ValueError, AttributeError):
+        return None
+
+
+class GoogleCertCache:
+    def __init__(self, certs_url=GOOGLE_CERTS_URL):
+        self.certs_url = certs_url
+        self.session = requests.Session()
+        self._certs = {}
+        self._expires_at = 0.0
+        self._max_age = 0
+        self._last_fetch_attempt = 0.0
+        # _fetch_lock is held for the http request, so there is one fetch at a time. _lock is only held to swap in the new certs,
+        # a login with certs (even expired ones) never waits for google behind the lock.
+        self._fetch_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.fetch_errors = 0
+
+    # It raises requests.RequestException/ValueError when the certs can't be fetched. It is called with _fetch_lock held.
+    def _fetch(self):
+        self._last_fetch_attempt = time.monotonic()
+        try:
+            response = self.session.get(self.certs_url, timeout=GOOGLE_CERTS_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            certs = response.json()
+        except (requests.RequestException, ValueError):
+            with self._lock:
+                self.fetch_errors += 1
+            google_cert_fetches.labels('error').inc()
+            raise
+        max_age = max_age_seconds(response.headers.get("Cache-Control"))
+        with self._lock:
+            self.fetches += 1
+            self._certs = certs
+            self._max_age = max_age
+            self._expires_at = time.monotonic() + max_age
+        google_cert_fetches.labels('ok').inc()
+        return certs
+
+    # The certs that are still valid, they are only fetched here when there are none (first login before the background fetch) or expired.
+    # When google can't be reached the old certs are used (the keys are valid longer than the max-age), and it is not tried
+    # again for every login but only every GOOGLE_CERTS_RETRY_SECONDS. With old certs only the login that gets the fetch
+    # waits for it, the others use the old certs meanwhile.
+    def certs(self):
+        if self._certs and time.monotonic() < self._expires_at:
+            return self._certs
+        if not self._fetch_lock.acquire(blocking=not self._certs):
+            return self._certs
+        try:
+            # another thread may have fetched them while this one was waiting for the lock.
+            now = time.monotonic()
+            if self._certs and (now < self._expires_at or now - self._last_fetch_attempt < GOOGLE_CERTS_RETRY_SECONDS):
+                return self._certs
+            try:
+                return self._fetch()
+            except (requests.RequestException, ValueError):
+                if not self._certs:
+                    raise
+                logger.exception('could not fetch the google certs from %s, using the old ones', self.certs_url)
+                return self._certs
+        finally:
+            self._fetch_lock.release()
+
+    # This is for a key id that is not in the certs, it fetches again unless it was just tried.
+    def certs_with_key(self, key_id):
+        certs = self.certs()
+        if key_id is None or key_id in certs:
+            return certs
+        with self._fetch_lock:
+            if key_id not in self._certs and time.monotonic() - self._last_fetch_attempt >= GOOGLE_CERTS_RETRY_SECONDS:
+                self._fetch()
+            return self._certs
+
+    # Seconds till the background thread should fetch again, the margin is at most half of the max-age so a short max-age is not a busy loop.
+    def _seconds_to_refresh(self):
+        margin = min(GOOGLE_CERTS_REFRESH_MARGIN_SECONDS, self._max_age / 2)
+        return max(1.0, self._expires_at - margin - time.monotonic())
+
+    def _refresh_loop(self, stop_event):
+        while True:
+            with self._fetch_lock:
+                try:
+                    self._fetch()
+                    wait = self._seconds_to_refresh()
+                except (requests.RequestException, ValueError):
+                    logger.exception('could not fetch the google certs from %s', self.certs_url)
+                    wait = GOOGLE_CERTS_RETRY_SECONDS
+            if stop_event.wait(wait):
+                return
+
+    # This is called at the app startup, the first fetch is also in the thread so the startup does not wait for google.
+    def start(self):
+        stop_event = threading.Event()
+        threading.Thread(target=self._refresh_loop, args=(stop_event,), name='google-certs-refresh', daemon=True).start()
+        return stop_event
+
+    # It returns the claims of the token, it raises ValueError when the token is not valid for this audience.
+    # The time is in p2v_google_token_verify_seconds by result (valid/invalid/error, error is the certs could not be fetched).
+    def verify(self, token, audience, clock_skew_in_seconds=10):
+        start = time.perf_counter()
+        result = 'error'
+        try:
+            certs = self.certs_with_key(token_key_id(token))
+            result = 'invalid'
+            try:
+                claims = google_jwt.decode(token, certs=certs, audience=audience, clock_skew_in_seconds=clock_skew_in_seconds)
+            except (google_exceptions.GoogleAuthError, ValueError) as error:
+                raise ValueError(str(error)) from error
+            if claims.get("iss") not in GOOGLE_ISSUERS:
+                raise ValueError(f"Wrong issuer: {claims.get('iss')}")
+            result = 'valid'
+            return claims
+        finally:
+            google_token_verify_seconds.labels(result).observe(time.perf_counter() - start)
+
+    def stats(self):
+        return {
+            "certs_url": self.certs_url,
+            "keys": len(self._certs),
+            "expires_in_seconds": max(0.0, self._expires_at - time.monotonic()),
+            "fetches": self.fetches,
+            "fetch_errors": self.fetch_errors,
+        }
+
+
+google_cert_cache = GoogleCertCache()
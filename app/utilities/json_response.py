@@ -0,0 +1,67 @@
+import os
+from functools import lru_cache
+
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+"""
+This is the JSON of the list responses (place listing/search/nearby, the admin listings and the NDJSON streams).
+
+When an endpoint returns data, FastAPI validates every row with the response_model and then serializes it, for a page of
+places the validation is more than half of that time. The rows are made by the helper functions from the columns of the
+tables, they have the types of the model already, so they don't need it:
+- model_rows(model, rows) makes the dicts of the model fields from ORM rows (the dicts of the helpers are already like that).
+- json_response(response_model, rows) writes them with orjson straight to the body, the endpoint returns this Response, so
+  FastAPI doesn't validate or serialize them again. orjson writes the same JSON as pydantic (UTC datetimes end with Z), the
+  helpers only have to give the right types (0.0 and not 0 for a float field, None for a missing optional field).
+- JSON_RESPONSE_VALIDATE=true (for the tests/CI) validates them with the response model (json_adapter) before writing, so a
+  helper that gives a wrong row fails like it did with response_model.
+- FastJSONResponse is the default response class of the app, the other endpoints are written with orjson instead of json.dumps
+  (the ones with a response_model are still serialized by pydantic).
+Benchmark: python -m benchmarks.json_responses
+"""
+
+JSON_RESPONSE_VALIDATE = os.getenv('JSON_RESPONSE_VALIDATE', 'false').lower() in ('1', 'true', 'yes')
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+# The type adapter is made once per response model, making one is slower than the serialization itself.
+@lru_cache(maxsize=None)
+def json_adapter(response_model):
+    return TypeAdapter(response_model)
+
+
+@lru_cache(maxsize=None)
+def model_field_names(model):
+    return tuple(model.model_fields)
+
+
+def model_rows(model, rows):
+    fields = model_field_names(model)
+    return [row if isinstance(row, dict) else {field: getattr(row, field) for field in fields} for row in rows]
+
+
+def dump_json(response_model, data):
+    if JSON_RESPONSE_VALIDATE:
+        adapter = json_adapter(response_model)
+        return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+    return orjson.dumps(data, option=ORJSON_OPTIONS)
+
+
+# The lines of NDJSON of a batch of rows, one "\n" terminated JSON object per row.
+def dump_ndjson(model, rows):
+    if JSON_RESPONSE_VALIDATE:
+        return b"".join(model.model_validate(row, from_attributes=True).model_dump_json().encode() + b"\n" for row in rows)
+    return b"".join(orjson.dumps(row, option=ORJSON_OPTIONS) + b"\n" for row in rows)
+
+
+def json_response(response_model, data, headers=None):
+    return Response(content=dump_json(response_model, data), media_type="application/json", headers=headers)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
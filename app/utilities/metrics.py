@@ -0,0 +1,138 @@
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from fastapi import Request
+
+from app.utilities.query_counter import current_queries
+
+"""
+These are the Prometheus metrics of the app, GET /metrics (app/routers/metrics.py) sends them in the text format.
+
+- Every request: count by status, latency histogram, in progress gauge, db time and statement count (from the query counter).
+  The route label is the template of the matched route (/api/place/{id}), not the path, so the ids don't make new series.
+  A path that matches no route is "unmatched". The template is taken by track_route, a dependency of the app.
+- The caches count their hits/misses (p2v_cache_lookups_total), the hit ratio is hit / (hit + miss) in PromQL.
+- bcrypt: the hash time and the queue wait of the hashing pool, and the refused hashes.
+- Google sign-in: the time of the token verification, and the fetches of the certs.
+- The connection pools: the time to get a connection.
+
+Several uvicorn workers: set PROMETHEUS_MULTIPROC_DIR to an empty directory before the workers start (the launcher empties it),
+then every worker writes its numbers to files there and /metrics of any worker adds up all of them. Without it the numbers are
+only the ones of the worker that answered.
+The hot path is a few dict lookups and additions per request, no lock is held while the request runs.
+"""
+
+PROMETHEUS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR') or os.getenv('prometheus_multiproc_dir')
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+HASH_BUCKETS = (.05, .1, .2, .3, .4, .5, .75, 1, 2, 5, 10)
+POOL_WAIT_BUCKETS = (.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+http_requests = Counter('p2v_http_requests_total', 'HTTP requests', ['method', 'route', 'status'])
+http_request_duration = Histogram(
+    'p2v_http_request_duration_seconds', 'Time from the request to the last byte of the response', ['method', 'route'],
+    buckets=LATENCY_BUCKETS)
+http_requests_in_progress = Gauge(
+    'p2v_http_requests_in_progress', 'Requests being handled', ['method', 'route'], multiprocess_mode='livesum')
+http_request_db_seconds = Histogram(
+    'p2v_http_request_db_seconds', 'Time spent in SQL statements per request', ['method', 'route'], buckets=LATENCY_BUCKETS)
+http_request_db_queries = Histogram(
+    'p2v_http_request_db_queries', 'SQL statements per request', ['method', 'route'], buckets=QUERY_COUNT_BUCKETS)
+
+cache_lookups = Counter('p2v_cache_lookups_total', 'Cache lookups', ['cache', 'result'])
+
+password_hash_seconds = Histogram(
+    'p2v_password_hash_seconds', 'Time of one bcrypt hash/verify in the hashing pool', ['operation'], buckets=HASH_BUCKETS)
+password_hash_queue_wait_seconds = Histogram(
+    'p2v_password_hash_queue_wait_seconds', 'Time a bcrypt call waited for a worker of the hashing pool', buckets=LATENCY_BUCKETS)
+password_hash_refused = Counter('p2v_password_hash_refused_total', 'bcrypt calls refused by the hashing pool', ['reason'])
+
+google_token_verify_seconds = Histogram(
+    'p2v_google_token_verify_seconds', 'Time to verify a google sign-in token', ['result'], buckets=LATENCY_BUCKETS)
+google_cert_fetches = Counter('p2v_google_cert_fetches_total', 'Fetches of the google signing certs', ['result'])
+
+db_pool_wait_seconds = Histogram(
+    'p2v_db_pool_wait_seconds', 'Time to get a connection out of the pool', ['pool'], buckets=POOL_WAIT_BUCKETS)
+
+
+# hit and miss counters of one cache, they are looked up once by the cache and not on every lookup.
+def cache_counters(name):
+    return cache_lookups.labels(name, 'hit'), cache_lookups.labels(name, 'miss')
+
+
+def metrics_body():
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+# The gauges of a stopped worker are removed from the files (the counters and histograms stay in the sums).
+def mark_worker_stopped():
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class RequestMetrics:
+    __slots__ = ("route", "in_progress")
+
+    def __init__(self):
+        self.route = None
+        self.in_progress = None
+
+
+_request_metrics = ContextVar('request_metrics', default=None)
+
+
+# This is a dependency of the app (every route), it runs once the router matched the route, so it knows the template
+# (/api/place/{id}) that the middleware can't know before the request runs. The request is in progress from here.
+def track_route(request: Request):
+    state = _request_metrics.get()
+    route = request.scope.get("route")
+    if state is None or route is None:
+        return
+    state.route = route.path
+    state.in_progress = http_requests_in_progress.labels(request.method, state.route)
+    state.in_progress.inc()
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = RequestMetrics()
+        token = _request_metrics.set(state)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_metrics.reset(token)
+            if state.in_progress is not None:
+                state.in_progress.dec()
+            # a request that failed before its dependencies (404, 405, 422 of the path) is labeled from the router.
+            route = state.route or getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests.labels(method, route, str(status_code)).inc()
+            http_request_duration.labels(method, route).observe(elapsed)
+            queries = current_queries()
+            if queries is not None:
+                http_request_db_seconds.labels(method, route).observe(queries.seconds)
+                http_request_db_queries.labels(method, route).observe(queries.count)
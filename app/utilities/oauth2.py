@@ -5,11 +5,15 @@ from datetime import datetime, timedelta, timezone
 from app.database.pydantic_models import TokenData
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from app.database.database import get_db
+from app.database.database import get_request_db
 from sqlalchemy.orm import Session
 from app.database.models import User
-from google.oauth2 import id_token
-from google.auth.transport import requests
+import requests
+from app.utilities.google_certs import google_cert_cache
+from app.utilities.principal_cache import (
+    bump_principal_version, cache_principal, cache_token, cached_principal, cached_token, check_principal_version,
+    invalidate_principal, principal_cache, principal_version_due,
+)
 
 # This is login, means this is the path where the dependency is for the token and passwordresetform, which is in login.
 """
@@ -65,7 +69,12 @@ def create_access_token(data:dict):
 
 
 # credentials_exceptions is the error, when it will cause. This is done for the code reusability.
+# The decoded token is cached by the hash of the token till it expires (app/utilities/principal_cache.py).
 def verify_access_token(token:str, credentials_exception):
+    token_data = cached_token(token)
+    if token_data is not None:
+        return token_data
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
 
@@ -87,19 +96,37 @@ def verify_access_token(token:str, credentials_exception):
     except JWTError:
         raise credentials_exception
     
+    cache_token(token, token_data, payload.get('exp'))
     return token_data
 
 
+# This is the user of the token from the principal cache, the users table is only read on a miss. None if the user is deleted.
+# The principal version is read first when it is due, so a principal changed by another worker is not used.
+def load_principal(user_id, db):
+    if principal_version_due():
+        check_principal_version(db)
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    generation = principal_cache.generation
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is None:
+        return None
+    return cache_principal(user, generation)
+
+
 """
 This token in get current user is given by the oauth2_scheme, as it is built in and from where the dependency of this fucntion is created, it will directly, take the token from Authorization: Bearer <token>
 """
-def get_current_user(token:str = Depends(oauth2_scheme), db: Session= Depends(get_db)):
+# These are async, the user comes from the principal cache most of the time, and only a miss runs the users query on the request database.
+async def get_current_user(token:str = Depends(oauth2_scheme), db = Depends(get_request_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials', headers={"WWW-Authenticate":"Bearer"})
     
     token = verify_access_token(token, credentials_exception)
     # print('The token.id is', token.id)
-    current_user = db.query(User).filter(User.id == token.id).first()
+    current_user = cached_principal(token.id) or await db.run(lambda session: load_principal(token.id, session))
 
     if current_user is None:
         raise credentials_exception
@@ -108,13 +135,13 @@ def get_current_user(token:str = Depends(oauth2_scheme), db: Session= Depends(ge
 
 
 # This is for the place and this will take the token if available and if not then it will not take.
-def get_current_user_optional(token:str = Depends(oauth2_scheme_optional), db:Session = Depends(get_db)):
+async def get_current_user_optional(token:str = Depends(oauth2_scheme_optional), db = Depends(get_request_db)):
     if token:
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials',
             headers={"WWW-Authenticate": "Bearer"})
         user = verify_access_token(token, credentials_exception)
-        current_user = db.query(User).filter(User.id == user.id).first()
+        current_user = cached_principal(user.id) or await db.run(lambda session: load_principal(user.id, session))
         # .first used as it returns none if no data found
         if current_user:
             return current_user
@@ -126,19 +153,18 @@ def get_current_user_optional(token:str = Depends(oauth2_scheme_optional), db:Se
 
 
 # this is the token sent by the client, this will be verified and then data of the google logged in user will be extracted.
-def google_token_verification(token, db: Session):
+# The token is verified locally with the cached certs of google (app/utilities/google_certs.py), so the login does not wait for google.
+# It has no database work, it is called in a thread because a missing key fetches the certs (blocking).
+def google_token_verification(token):
+    # Without the client id every token would be accepted for any app, so the google login is off till it is set.
+    if not GOOGLE_CLIENT_ID:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Google login is not configured')
+
     # print('got token, now verifying...')
     # Extracting the information from the token given by google.
-    request = requests.Request()
-    # print(request)
     try:
         # print('verifying token')
-        token_info = id_token.verify_oauth2_token(
-            token, 
-            request, 
-            "788471062927-namh05hvpv0hcho55ji7it32001nipqo.apps.googleusercontent.com",
-            clock_skew_in_seconds=10
-        )
+        token_info = google_cert_cache.verify(token, GOOGLE_CLIENT_ID, clock_skew_in_seconds=10)
         # print(token_info)
         # print("hello I am here.")
         
@@ -147,11 +173,20 @@ def google_token_verification(token, db: Session):
         {'iss': 'https://accounts.google.com', 'azp': '788471062927-m9k1jhqtp4j1gr2be8fg4bga08mi4knd.apps.googleusercontent.com', 'aud': '788471062927-m9k1jhqtp4j1gr2be8fg4bga08mi4knd.apps.googleusercontent.com', 'sub': '108517204962045586134', 'email': 'streakmanager001@gmail.com', 'email_verified': True, 'nbf': 1769369179, 'name': 'Streak Manager', 'picture': 'https://lh3.googleusercontent.com/a/ACg8ocLM1jRuZwyU5xY5GkrajnKtPm1WqjMJAjL7rd-hDR_pUj3vYw=s96-c', 'given_name': 'Streak', 'family_name': 'Manager', 'iat': 1769369479, 'exp': 1769373079, 'jti': '842407703ec41d076b926174dd1a2e7bcc446d84'}
         """
 
+    # The certs could not be fetched, it is not the fault of the token.
+    except requests.RequestException as error:
+        print(error)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Google login is not available')
     except Exception as error:
         print(error)
         # print('Token got wrong')
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid Token')
 
+    return token_info
+
+
+# This is the user of the verified google token, it is found by the google sub or the email or it is created.
+def google_login(token_info, db: Session):
     sub = token_info["sub"]
     email = token_info["email"]
     first_name = token_info.get("given_name")
@@ -163,7 +198,9 @@ def google_token_verification(token, db: Session):
         # This is because sometime user changes their email,but their google sub id is same.
         if email != user.email:
             user.email = email
+            bump_principal_version(db)
             db.commit()
+            invalidate_principal(user.id)
             jwt_access_token = create_access_token(data={'user_id':user.id, 'email':user.email})
             return True, jwt_access_token
         
@@ -181,7 +218,9 @@ def google_token_verification(token, db: Session):
         # user_with_email.provider = 'local_google'
         # user_with_email.google_sub = sub
 
+        bump_principal_version(db)
         db.commit()
+        invalidate_principal(user_with_email.id)
 
         jwt_access_token = create_access_token(data={'user_id': user_with_email.id, 'email': user_with_email.email})
         return True, jwt_access_token
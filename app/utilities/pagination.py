@@ -0,0 +1,66 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, status
+
+"""
+This is the keyset (cursor) pagination, instead of offset.
+
+The cursor is the sort key of the last row of the page, e.g. (created_at, id) of the last place, encoded as base64 so the
+client treats it as an opaque string. The next page is then "where (created_at, id) > cursor order by created_at, id limit n",
+which uses the index, so the 1000th page is as cheap as the first one.
+The cursor of the next page is sent in the X-Next-Cursor response header, it is not there on the last page.
+"""
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), default=_json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+# parsers are the functions converting each value back, e.g. decode_cursor(cursor, datetime.fromisoformat, int)
+# A cursor of another endpoint (or a made up one) is 400, ArithmeticError is what Decimal raises (decimal.InvalidOperation).
+def decode_cursor(cursor, *parsers):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if len(values) != len(parsers):
+            raise ValueError("cursor has wrong number of values")
+        return tuple(parser(value) for parser, value in zip(parsers, values))
+    except (ValueError, TypeError, ArithmeticError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+# rows are fetched with limit + 1, the extra row only tells that there is a next page.
+def page_with_cursor(rows, limit, cursor_key):
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(cursor_key(rows[-1]))
+    return rows, None
+
+
+def set_next_cursor(response, next_cursor):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+
+# places are paginated on (created_at, id)
+def place_cursor_key(place):
+    return place.created_at, place.id
+
+
+def decode_place_cursor(cursor):
+    return decode_cursor(cursor, datetime.fromisoformat, int)
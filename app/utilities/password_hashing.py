@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from app.utilities.metrics import password_hash_queue_wait_seconds, password_hash_refused, password_hash_seconds
+from app.utilities.utils import check_password, get_hashed_password
+
+"""
+This is where bcrypt runs, outside of the request threads.
+
+One bcrypt call is ~250 ms of CPU. It was run in the request thread (the anyio threadpool of fastapi, 40 threads), so a few
+staff logins at the same time took the threads of every other request. Now:
+- the hashing runs in its own pool of PASSWORD_HASH_WORKERS workers, processes by default (PASSWORD_HASH_EXECUTOR=process)
+  or threads (PASSWORD_HASH_EXECUTOR=thread, bcrypt releases the GIL so threads also hash in parallel).
+- the endpoints await the hash (hash_password_async/verify_password_async) on the event loop, no request thread waits for it.
+  hash_password/verify_password are the blocking ones, for the CLI.
+- at most PASSWORD_HASH_MAX_PENDING hashes can wait or run at one time, one more is refused at once with PasswordHashingBusy
+  (the api answers 503) instead of queueing. The slot of a hash is given back when the hash is done (a callback of its
+  future), not when the request stops waiting, so a hash that timed out and still runs in a worker keeps its slot.
+- a hash that did not finish in PASSWORD_HASH_TIMEOUT_SECONDS is also PasswordHashingBusy.
+The pool is made on the first hash (the CLI and the imports don't start processes), the processes are "spawn" ones because
+forking a process that has threads (uvicorn, the index refresh) is not safe.
+"""
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASH_EXECUTOR = os.getenv('PASSWORD_HASH_EXECUTOR', 'process')
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', str(PASSWORD_HASH_WORKERS * 4)))
+PASSWORD_HASH_TIMEOUT_SECONDS = float(os.getenv('PASSWORD_HASH_TIMEOUT_SECONDS', '10'))
+
+
+class PasswordHashingBusy(Exception):
+    pass
+
+
+# This runs in the worker, the times are time.time() because the monotonic clock of another process can't be compared.
+def _timed_call(function, *args):
+    started_at = time.time()
+    result = function(*args)
+    return result, started_at, time.time()
+
+
+class PasswordHasher:
+    def __init__(self, kind=PASSWORD_HASH_EXECUTOR, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING,
+                 timeout_seconds=PASSWORD_HASH_TIMEOUT_SECONDS):
+        if kind not in ('process', 'thread'):
+            raise ValueError(f"PASSWORD_HASH_EXECUTOR must be 'process' or 'thread', not {kind!r}")
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout_seconds = timeout_seconds
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.queue_wait_seconds_total = 0.0
+        self.queue_wait_seconds_max = 0.0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.kind == 'process':
+                    self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                else:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hash')
+            return self._executor
+
+    # It takes a slot of max_pending and submits the call, the slot is given back by the future when the call is done or cancelled.
+    def _submit(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            password_hash_refused.labels('busy').inc()
+            raise PasswordHashingBusy(f"{self.max_pending} password hashes are already running or waiting")
+        with self._lock:
+            self.pending += 1
+        try:
+            future = self._get_executor().submit(_timed_call, function, *args)
+        except BaseException:
+            self._release_slot()
+            raise
+        future.add_done_callback(self._release_slot)
+        return future
+
+    def _release_slot(self, future=None):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    # It can't be stopped once it runs, but it is not taken from the queue by a worker if it did not start.
+    def _timed_out(self, future):
+        future.cancel()
+        with self._lock:
+            self.timeouts += 1
+        password_hash_refused.labels('timeout').inc()
+        return PasswordHashingBusy(f"the password hash did not finish in {self.timeout_seconds} seconds")
+
+    # operation is "hash" or "verify", the label of the prometheus histogram.
+    def _done(self, operation, submitted_at, timed_result):
+        result, started_at, finished_at = timed_result
+        queue_wait = max(0.0, started_at - submitted_at)
+        hash_time = finished_at - started_at
+        with self._lock:
+            self.completed += 1
+            self.queue_wait_seconds_total += queue_wait
+            self.queue_wait_seconds_max = max(self.queue_wait_seconds_max, queue_wait)
+            self.hash_seconds_total += hash_time
+            self.hash_seconds_max = max(self.hash_seconds_max, hash_time)
+        password_hash_queue_wait_seconds.observe(queue_wait)
+        password_hash_seconds.labels(operation).observe(hash_time)
+        return result
+
+    def _run(self, operation, function, *args):
+        submitted_at = time.time()
+        future = self._submit(function, *args)
+        try:
+            timed_result = future.result(timeout=self.timeout_seconds)
+        except FutureTimeoutError:
+            raise self._timed_out(future)
+        return self._done(operation, submitted_at, timed_result)
+
+    # Same as _run, the future is awaited on the event loop instead of in a thread.
+    async def _run_async(self, operation, function, *args):
+        submitted_at = time.time()
+        future = self._submit(function, *args)
+        try:
+            timed_result = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout_seconds)
+        except asyncio.TimeoutError:
+            raise self._timed_out(future)
+        return self._done(operation, submitted_at, timed_result)
+
+    def hash_password(self, plain_password):
+        return self._run('hash', get_hashed_password, plain_password)
+
+    def verify_password(self, plain_password, hashed_password):
+        return self._run('verify', check_password, plain_password, hashed_password)
+
+    async def hash_password_async(self, plain_password):
+        return await self._run_async('hash', get_hashed_password, plain_password)
+
+    async def verify_password_async(self, plain_password, hashed_password):
+        return await self._run_async('verify', check_password, plain_password, hashed_password)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            completed = self.completed or 1
+            return {
+                "executor": self.kind,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "timeout_seconds": self.timeout_seconds,
+                "started": self._executor is not None,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "queue_wait_seconds_avg": self.queue_wait_seconds_total / completed,
+                "queue_wait_seconds_max": self.queue_wait_seconds_max,
+                "hash_seconds_avg": self.hash_seconds_total / completed,
+                "hash_seconds_max": self.hash_seconds_max,
+            }
+
+
+password_hasher = PasswordHasher()
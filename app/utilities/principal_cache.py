@@ -0,0 +1,101 @@
+import hashlib
+import os
+import time
+
+from app.database.database import dialect_insert
+from app.routers.users.models import PrincipalVersion
+from app.utilities.cache import TTLCache
+
+"""
+These are the caches of get_current_user / get_current_user_optional (app/utilities/oauth2.py), so an authenticated request
+does not decode the JWT and read the users table every time.
+
+- token_cache: sha256 of the token -> (user id, email), it is kept till the token expires or the TTL, whichever is first.
+  The raw token is never a key, only its hash.
+- principal_cache: user id -> Principal, the fields of the user that the endpoints use (no password hash).
+
+A user update/delete and the google login invalidate the principal of that user in this worker (UsersDbOps, google_login),
+and bump the principal_version row in the same transaction. Every uvicorn worker has its own cache, so a worker reads that
+row at most every PRINCIPAL_VERSION_CHECK_SECONDS (before it uses a cached principal) and drops all of its principals when
+the version changed. So a demoted admin or a deleted user is out of the other workers within PRINCIPAL_VERSION_CHECK_SECONDS
+(default 1), 0 reads the row on every authenticated request and the change is seen right away everywhere.
+The row is only written by the user writes (rare), so it is not a lock that other writes wait for.
+"""
+
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv('PRINCIPAL_CACHE_TTL_SECONDS', '60'))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv('PRINCIPAL_CACHE_MAX_ENTRIES', '10000'))
+PRINCIPAL_VERSION_CHECK_SECONDS = float(os.getenv('PRINCIPAL_VERSION_CHECK_SECONDS', '1'))
+
+PRINCIPAL_FIELDS = ("id", "email", "role", "first_name", "last_name", "profile_url", "provider", "google_sub", "created_at")
+
+token_cache = TTLCache(PRINCIPAL_CACHE_MAX_ENTRIES, PRINCIPAL_CACHE_TTL_SECONDS, name='tokens')
+principal_cache = TTLCache(PRINCIPAL_CACHE_MAX_ENTRIES, PRINCIPAL_CACHE_TTL_SECONDS, name='principals')
+
+
+# This is the user of the request without the orm session, it has the same attributes as the User row (for the response models too).
+class Principal:
+    __slots__ = PRINCIPAL_FIELDS
+
+    def __init__(self, user):
+        for field in PRINCIPAL_FIELDS:
+            setattr(self, field, getattr(user, field))
+
+
+def token_key(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def cached_token(token):
+    return token_cache.get(token_key(token))
+
+
+# expires_at is the "exp" of the token (unix time), the token is not cached after it.
+def cache_token(token, token_data, expires_at):
+    seconds_left = expires_at - time.time() if expires_at else None
+    if seconds_left is not None and seconds_left <= 0:
+        return
+    token_cache.set(token_key(token), token_data, seconds_left)
+
+
+# The version of the principals that this worker has read last, and when (time.monotonic).
+_principal_version = {"version": None, "checked_at": None}
+
+
+def principal_version_due():
+    checked_at = _principal_version["checked_at"]
+    return checked_at is None or time.monotonic() - checked_at >= PRINCIPAL_VERSION_CHECK_SECONDS
+
+
+# It is None when the principal version has to be read first, then the request reads it with load_principal (oauth2).
+def cached_principal(user_id):
+    if principal_version_due():
+        return None
+    return principal_cache.get(user_id)
+
+
+# This reads the principal version (one primary key read) and drops the cached principals when it is not the one seen before.
+def check_principal_version(db):
+    version = db.query(PrincipalVersion.version).filter(PrincipalVersion.id == 1).scalar() or 0
+    if version != _principal_version["version"]:
+        principal_cache.invalidate()
+    _principal_version["version"] = version
+    _principal_version["checked_at"] = time.monotonic()
+
+
+# Same as bump_data_version, "insert ... on conflict" so it works when the row is not there yet. It is called before the commit.
+def bump_principal_version(db):
+    table = PrincipalVersion.__table__
+    statement = dialect_insert(db, table).values(id=1, version=1)
+    statement = statement.on_conflict_do_update(index_elements=[table.c.id], set_={"version": table.c.version + 1})
+    db.execute(statement)
+
+
+# generation is principal_cache.generation read before the user was read, so a user read before an invalidate is not cached.
+def cache_principal(user, generation):
+    principal = Principal(user)
+    principal_cache.set(user.id, principal, generation=generation)
+    return principal
+
+
+def invalidate_principal(user_id):
+    principal_cache.invalidate(user_id)
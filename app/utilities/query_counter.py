@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+"""
+This counts the SQL statements of every request, to see which endpoint runs too many (an N+1 in a helper function).
+
+- The cursor events of every engine (primary, replicas, the sync engine under the async one) count the statements and time them.
+  A statement is counted for the request in the context (ContextVar) it runs in: the threadpool of the sync mode and
+  run_sync of the async mode keep the context of the request, the background jobs have no request so they are not counted.
+- The statements are grouped by shape: the SQL with the parameters replaced by ?, an IN list is one (?...).
+  A shape that runs QUERY_N_PLUS_ONE_THRESHOLD times or more in one request is an N+1, it is logged as a warning.
+- QueryCounterMiddleware adds the headers "X-DB-Queries: 5" and "Server-Timing: db;dur=12.3;desc="5 queries"" and logs one
+  JSON line per request (logger app.queries) with the route, the count, the db time and the N+1 shapes.
+  A NDJSON stream runs its queries after the headers, those are only in the log line.
+- Budget: a route can have dependencies=[Depends(query_budget(n))], the other routes have QUERY_BUDGET_DEFAULT (0 is none).
+  A NDJSON stream (app/utilities/streaming.py) runs statements for every batch after the response started, so every batch
+  has a budget of its own, QUERY_BUDGET_STREAM_BATCH, and its own N+1 counting (the same statements once per batch are not
+  an N+1). The route budget is only for the statements before the stream.
+  Over the budget it is a warning, with QUERY_BUDGET_STRICT=true (for the tests/CI) the statement over the budget raises
+  QueryBudgetExceeded instead of running, so the request fails with a 500 and the traceback shows the helper function.
+QUERY_COUNTER_ENABLED=false turns all of it off.
+"""
+
+logger = logging.getLogger('app.queries')
+
+QUERY_COUNTER_ENABLED = os.getenv('QUERY_COUNTER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+QUERY_N_PLUS_ONE_THRESHOLD = int(os.getenv('QUERY_N_PLUS_ONE_THRESHOLD', '10'))
+QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', '0'))
+QUERY_BUDGET_STREAM_BATCH = int(os.getenv('QUERY_BUDGET_STREAM_BATCH', '4'))
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'false').lower() in ('1', 'true', 'yes')
+
+DB_QUERIES_HEADER = 'X-DB-Queries'
+
+PARAMETER_PATTERN = re.compile(r"%\(\w+\)s|%s|\$\d+|\?|(?<!:):\w+")
+IN_LIST_PATTERN = re.compile(r"\(\?(?:\s*,\s*\?)+\)")
+SPACE_PATTERN = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def statement_shape(statement):
+    shape = PARAMETER_PATTERN.sub("?", statement)
+    shape = IN_LIST_PATTERN.sub("(?...)", shape)
+    return SPACE_PATTERN.sub(" ", shape).strip()
+
+
+class RequestQueries:
+    def __init__(self, budget=QUERY_BUDGET_DEFAULT):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        self.budget = budget
+        # the count when the budget started, the budget of a stream batch starts at the batch.
+        self.budget_start = 0
+        self.over_budget = False
+        # the N+1 of the batches of a stream that are done.
+        self.stream_n_plus_one = []
+
+    def n_plus_one(self):
+        return self.stream_n_plus_one + [
+            {"statement": shape, "count": count}
+            for shape, count in self.shapes.most_common()
+            if count >= QUERY_N_PLUS_ONE_THRESHOLD
+        ]
+
+    # This is called before every batch of a NDJSON stream, the budget and the N+1 counting start again for the batch.
+    def start_stream_batch(self):
+        self.stream_n_plus_one = self.n_plus_one()
+        self.shapes = Counter()
+        self.budget = QUERY_BUDGET_STREAM_BATCH
+        self.budget_start = self.count
+
+
+_request_queries = ContextVar('request_queries', default=None)
+
+
+def current_queries():
+    return _request_queries.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = _request_queries.get()
+    if queries is None:
+        return
+    if queries.budget and queries.count - queries.budget_start >= queries.budget:
+        queries.over_budget = True
+        if QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(
+                f"more than {queries.budget} statements in this request (or stream batch), the next one was: {statement_shape(statement)}")
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = _request_queries.get()
+    starts = conn.info.get('query_start')
+    if queries is None or not starts:
+        return
+    queries.seconds += time.perf_counter() - starts.pop()
+    queries.count += 1
+    queries.shapes[statement_shape(statement)] += 1
+
+
+# This is a dependency, dependencies=[Depends(query_budget(5))] on a route is the most statements one request of it can run.
+def query_budget(budget):
+    def set_query_budget():
+        queries = _request_queries.get()
+        if queries is not None:
+            queries.budget = budget
+    return set_query_budget
+
+
+def query_headers(queries):
+    db_ms = queries.seconds * 1000
+    return [
+        (DB_QUERIES_HEADER.lower().encode(), str(queries.count).encode()),
+        (b"server-timing", f'db;dur={db_ms:.1f};desc="{queries.count} queries"'.encode()),
+    ]
+
+
+# This is a plain ASGI middleware (not BaseHTTPMiddleware), the headers are added to the response start and the log line is
+# written after the last body part, so a streamed body is counted to its end.
+class QueryCounterMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not QUERY_COUNTER_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = _request_queries.set(queries)
+        status_code = None
+
+        async def send_with_counts(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + query_headers(queries)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_counts)
+        finally:
+            _request_queries.reset(token)
+            self.log(scope, queries, status_code)
+
+    def log(self, scope, queries, status_code):
+        route = scope.get("route")
+        n_plus_one = queries.n_plus_one()
+        line = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(route, "path", None),
+            "status": status_code,
+            "queries": queries.count,
+            "db_ms": round(queries.seconds * 1000, 2),
+        }
+        if queries.budget:
+            line["budget"] = queries.budget
+            line["over_budget"] = queries.over_budget
+        if n_plus_one:
+            line["n_plus_one"] = n_plus_one
+        if n_plus_one or queries.over_budget:
+            logger.warning(json.dumps(line))
+        else:
+            logger.info(json.dumps(line))
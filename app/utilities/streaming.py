@@ -0,0 +1,49 @@
+from itertools import islice
+
+from fastapi.responses import StreamingResponse
+
+from app.database.database import sessionLocal
+from app.utilities.json_response import dump_ndjson, model_rows
+from app.utilities.query_counter import current_queries
+
+"""
+This is the streaming (NDJSON) mode of the list endpoints, one JSON record per line.
+
+It is used when the client sends "Accept: application/x-ndjson" or ?stream=true.
+The rows are read from a server side cursor (yield_per) in batches and every batch is written as soon as it is serialized,
+so the memory stays the same for 100 or 1M rows and the first bytes are sent before the query is finished.
+"""
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 500
+
+
+def wants_stream(request, stream=False):
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+# The body is sent after the endpoint returns, so the stream has its own session instead of the request one (get_db).
+def stream_with_session(generate):
+    db = sessionLocal()
+    try:
+        yield from generate(db)
+    finally:
+        db.close()
+
+
+# records can be orm rows or dicts, they are written like the normal response (app/utilities/json_response.py).
+# The lines are sent one chunk per STREAM_BATCH_SIZE records, not one chunk per record, every chunk is a send of the server.
+# Every batch has its own query budget (app/utilities/query_counter.py), the statements of a batch run when it is read.
+def ndjson_response(records, response_model):
+    def body():
+        queries = current_queries()
+        records_iter = iter(records)
+        while True:
+            if queries is not None:
+                queries.start_stream_batch()
+            batch = list(islice(records_iter, STREAM_BATCH_SIZE))
+            if not batch:
+                return
+            yield dump_ndjson(response_model, model_rows(response_model, batch))
+
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
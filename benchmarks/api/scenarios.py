@@ -0,0 +1,180 @@
+"""
+These are the requests of the benchmark, one scenario is one hot endpoint.
+
+Every scenario makes its request from a random.Random (seeded per scenario), so two runs send the same requests.
+The runner sends them in process through httpx.ASGITransport to the real app (no network, no uvicorn), with the lifespan
+of the app running (the place indexes are built like on a server).
+"""
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+from sqlalchemy import select
+
+from app.database.database import sessionLocal
+from app.database.models import Place, User
+from app.utilities.oauth2 import create_access_token
+from app.utilities.query_counter import DB_QUERIES_HEADER
+
+from benchmarks.api.seed import ADMIN_EMAIL, RATING_CATEGORIES, STAFF_EMAIL, STAFF_PASSWORD
+
+# The share of the requests of a run that a scenario gets, the slow ones (bcrypt, the full admin exports) get fewer.
+REQUEST_SHARE = {"login": 0.1, "admin_votes": 0.05, "admin_users": 0.2}
+
+
+class BenchmarkData:
+    def __init__(self, user_count=200):
+        db = sessionLocal()
+        try:
+            admin = db.execute(select(User.id, User.email).where(User.email == ADMIN_EMAIL)).one()
+            users = db.execute(select(User.id, User.email).where(User.role == 'user').order_by(User.id).limit(user_count)).all()
+            self.place_ids = list(db.execute(select(Place.id).order_by(Place.id)).scalars())
+            names = db.execute(select(Place.place_name).order_by(Place.id).limit(500)).scalars()
+            self.search_words = sorted({name.split()[0] for name in names})
+            coordinates = db.execute(
+                select(Place.latitude, Place.longitude).where(Place.latitude.is_not(None)).order_by(Place.id).limit(500)).all()
+            self.points = [(row.latitude, row.longitude) for row in coordinates]
+        finally:
+            db.close()
+        self.admin_headers = {"Authorization": f"Bearer {create_access_token({'user_id': admin.id, 'email': admin.email})}"}
+        self.user_headers = [
+            {"Authorization": f"Bearer {create_access_token({'user_id': user.id, 'email': user.email})}"} for user in users]
+
+
+# Every scenario returns (url, query params, headers, json body), the method and the route are in SCENARIOS.
+def list_anonymous(rng, data):
+    return "/api/all/place", None, None, None
+
+
+def list_logged_in(rng, data):
+    return "/api/all/place", None, rng.choice(data.user_headers), None
+
+
+def search(rng, data):
+    return "/api/places/search/", {"search": rng.choice(data.search_words)}, rng.choice(data.user_headers), None
+
+
+def detail(rng, data):
+    return f"/api/place/{rng.choice(data.place_ids)}", None, rng.choice(data.user_headers), None
+
+
+def nearby(rng, data):
+    latitude, longitude = rng.choice(data.points)
+    return "/api/places/nearby", {"lat": latitude, "lon": longitude, "radius": 25}, rng.choice(data.user_headers), None
+
+
+def vote(rng, data):
+    return f"/api/vote/{rng.choice(data.place_ids)}", None, rng.choice(data.user_headers), {"vote": rng.random() < 0.7}
+
+
+def rate(rng, data):
+    body = {category: rng.randint(1, 5) for category in RATING_CATEGORIES}
+    return f"/api/place/rating/{rng.choice(data.place_ids)}", None, rng.choice(data.user_headers), body
+
+
+def login(rng, data):
+    return "/api/login", None, None, {"email": STAFF_EMAIL, "password": STAFF_PASSWORD}
+
+
+def admin_places(rng, data):
+    return "/api/admin/place", None, data.admin_headers, None
+
+
+def admin_place_search(rng, data):
+    return "/api/admin/place/search", {"search": rng.choice(data.search_words)}, data.admin_headers, None
+
+
+def admin_users(rng, data):
+    return "/api/admin/user", None, data.admin_headers, None
+
+
+def admin_votes(rng, data):
+    return "/api/admin/votes", {"stream": "true"}, data.admin_headers, None
+
+
+# name -> (method, route, request maker), in the order they run.
+SCENARIOS = {
+    "list_anonymous": ("GET", "/api/all/place", list_anonymous),
+    "list_logged_in": ("GET", "/api/all/place", list_logged_in),
+    "search": ("GET", "/api/places/search/", search),
+    "detail": ("GET", "/api/place/{id}", detail),
+    "nearby": ("GET", "/api/places/nearby", nearby),
+    "admin_places": ("GET", "/api/admin/place", admin_places),
+    "admin_place_search": ("GET", "/api/admin/place/search", admin_place_search),
+    "admin_users": ("GET", "/api/admin/user", admin_users),
+    "admin_votes": ("GET", "/api/admin/votes?stream=true", admin_votes),
+    "vote": ("POST", "/api/vote/{place_id}", vote),
+    "rate": ("POST", "/api/place/rating/{place_id}", rate),
+    "login": ("POST", "/api/login", login),
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))]
+
+
+async def run_scenario(client, name, data, requests, concurrency, seed):
+    method, route, make_request = SCENARIOS[name]
+    rng = random.Random(f"{seed}-{name}")
+    planned = [make_request(rng, data) for _ in range(requests)]
+    latencies = []
+    queries = []
+    statuses = {}
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < len(planned):
+            url, params, headers, body = planned[next_index]
+            next_index += 1
+            start = time.perf_counter()
+            response = await client.request(method, url, params=params, headers=headers, json=body)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if DB_QUERIES_HEADER in response.headers:
+                queries.append(int(response.headers[DB_QUERIES_HEADER]))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "method": method,
+        "route": route,
+        "requests": len(latencies),
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": statistics.fmean(latencies) * 1000,
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "max": latencies[-1] * 1000,
+        },
+        "queries": {
+            "mean": statistics.fmean(queries) if queries else None,
+            "max": max(queries) if queries else None,
+        },
+    }
+
+
+# It runs every scenario one after the other on the same app, the reads first so the writes don't clear their caches.
+async def run_scenarios(app, names, data, requests, concurrency, seed, warmup=5, log=print):
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as client:
+            for name in names:
+                count = max(1, int(requests * REQUEST_SHARE.get(name, 1)))
+                await run_scenario(client, name, data, min(warmup, count), 1, f"{seed}-warmup")
+                results[name] = result = await run_scenario(client, name, data, count, concurrency, seed)
+                latency = result["latency_ms"]
+                log(f"  {name:20} {result['rps']:9.1f} req/s  p50 {latency['p50']:8.2f}  p95 {latency['p95']:8.2f}  "
+                    f"p99 {latency['p99']:8.2f} ms  queries {result['queries']['mean'] or 0:5.1f}  errors {result['errors']}")
+    return results
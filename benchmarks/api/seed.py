@@ -0,0 +1,63 @@
+"""
+This fills the benchmark database with synthetic rows through the real models (app/database/models.py).
+
+The rows are made by the generate_data command (app/routers/users/adminpanel/utilities/generate_data.py): COPY/executemany,
+Zipfian popularity, the place_stats counted on the way. The same seed and volumes give the same database.
+The benchmark adds an admin and a staff user (with a password, for the login scenario) before them.
+"""
+import os
+import subprocess
+import sys
+
+from sqlalchemy import func, insert, select, text
+
+from app.database.database import Base, engine, sessionLocal
+from app.database.models import Feedback, Place, Ratings, User, Votes
+from app.routers.users.adminpanel.utilities.generate_data import generate
+from app.utilities.utils import get_hashed_password
+
+ADMIN_EMAIL = "admin@bench.example.com"
+STAFF_EMAIL = "staff@bench.example.com"
+STAFF_PASSWORD = "benchmark-password"
+
+
+# The schema: alembic for postgres (the generated search column is only in the migrations), create_all for sqlite.
+def create_schema(reset):
+    if engine.dialect.name == 'postgresql':
+        if reset:
+            with engine.begin() as connection:
+                connection.execute(text("DROP SCHEMA public CASCADE"))
+                connection.execute(text("CREATE SCHEMA public"))
+        subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], check=True,
+                       env={**os.environ, "ALEMBIC_URL": os.environ["DATABASE_URL"]})
+        return
+    if reset:
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+
+def row_counts(db):
+    return {table.__tablename__: db.execute(select(func.count()).select_from(table)).scalar()
+            for table in (User, Place, Votes, Ratings, Feedback)}
+
+
+# It seeds only an empty database (or after reset), an already seeded one is used as it is.
+def seed(users, places, votes, ratings, feedback, seed=1, reset=False, log=print):
+    create_schema(reset)
+    db = sessionLocal()
+    try:
+        if db.execute(select(func.count()).select_from(Place)).scalar():
+            log("the database already has places, it is not seeded again (--reset seeds it from scratch)")
+            return row_counts(db)
+
+        password = get_hashed_password(STAFF_PASSWORD)
+        db.execute(insert(User.__table__), [
+            {"email": ADMIN_EMAIL, "first_name": "Admin", "last_name": "Bench", "role": "admin", "password": password},
+            {"email": STAFF_EMAIL, "first_name": "Staff", "last_name": "Bench", "role": "staff", "password": password},
+        ])
+        db.commit()
+        admin_id = db.execute(select(User.id).where(User.email == ADMIN_EMAIL)).scalar()
+        generate(db, users, places, votes, ratings, feedback, seed=seed, owner_id=admin_id, log=log)
+        return row_counts(db)
+    finally:
+        db.close()
@@ -0,0 +1,136 @@
+"""
+Benchmark of DATABASE_MODE=sync vs DATABASE_MODE=async (app/database/database.py), concurrency vs latency.
+
+For every mode one uvicorn worker is started on DATABASE_URL, then for every concurrency level that many clients send
+requests one after the other for --seconds: the logged-in place listing (not cached, validators + page + stats + user overlay)
+and the logged-in place detail of a random place. It prints the requests per second and the p50/p99 latency per level.
+
+DATABASE_URL must have the tables (alembic upgrade head), the places and the benchmark user are added when missing.
+For sqlite the async mode uses aiosqlite, for postgres asyncpg.
+
+RUN COMMAND IS:
+python -m benchmarks.db_modes
+python -m benchmarks.db_modes --concurrency 1 16 64 256 --seconds 10 --places 5000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from app.database.database import sessionLocal
+from app.database.models import Place, User
+from app.utilities.oauth2 import create_access_token
+
+BENCHMARK_EMAIL = "benchmark@example.com"
+
+
+def prepare_database(place_count):
+    db = sessionLocal()
+    try:
+        user = db.query(User).filter(User.email == BENCHMARK_EMAIL).first()
+        if user is None:
+            user = User(email=BENCHMARK_EMAIL, first_name="Bench", last_name="Mark", role="user")
+            db.add(user)
+            db.commit()
+        missing = place_count - db.query(Place).count()
+        if missing > 0:
+            db.add_all(
+                Place(place_name=f"Benchmark place {number}", place_address=f"Street {number}", about_place="benchmark",
+                      pincode=100000 + number % 900000, user_id=user.id)
+                for number in range(missing)
+            )
+            db.commit()
+        place_ids = [place_id for place_id, in db.query(Place.id).all()]
+        return create_access_token({"user_id": user.id, "email": user.email}), place_ids
+    finally:
+        db.close()
+
+
+def start_server(mode, port):
+    env = {**os.environ, "DATABASE_MODE": mode}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"the {mode} server did not start")
+
+
+async def load(base_url, token, place_ids, concurrency, seconds):
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + seconds
+
+        async def worker(rng):
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                path = "/api/all/place" if rng.random() < 0.5 else f"/api/place/{rng.choice(place_ids)}"
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                except httpx.TransportError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(random.Random(number)) for number in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"], choices=["sync", "async"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64, 128, 256])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--places", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    token, place_ids = prepare_database(args.places)
+    print(f"{len(place_ids)} places, {args.seconds:g}s per level, 1 uvicorn worker")
+    for mode in args.modes:
+        server = start_server(mode, args.port)
+        try:
+            # one short run first, so the indexes, the connection pool and the caches are warm.
+            asyncio.run(load(f"http://127.0.0.1:{args.port}", token, place_ids, 4, 1))
+            print(f"DATABASE_MODE={mode}")
+            for concurrency in args.concurrency:
+                result = asyncio.run(load(f"http://127.0.0.1:{args.port}", token, place_ids, concurrency, args.seconds))
+                print(f"  {concurrency:4} clients  {result['rps']:8.1f} req/s  p50 {result['p50_ms']:8.2f} ms  "
+                      f"p99 {result['p99_ms']:8.2f} ms  errors {result['errors']}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark of the JSON of the list responses (app/utilities/json_response.py), CPU time per request.
+
+Every mode runs in its own process (the mode is read at import), the requests go to the app in process (httpx.ASGITransport)
+so the CPU time of the process is the CPU time of the requests, there is no server and no network:
+- validated: JSON_RESPONSE_VALIDATE=true, every row validated by the response model and serialized by pydantic, like the
+  endpoints did before (FastAPI validating what they returned).
+- fast: the rows of the helpers written by orjson as they are.
+The response cache is off, so the anonymous requests are serialized every time too.
+It also times the serialization alone of --rows place rows (a big page).
+
+DATABASE_URL must have data, e.g. python -m app.routers.users.adminpanel.utilities.generate_data --votes 100000 --ratings 20000
+(there must be an admin user, the admin endpoints run as the first one).
+
+RUN COMMAND IS:
+python -m benchmarks.json_responses
+python -m benchmarks.json_responses --requests 200 --rows 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+MODES = {"validated": "true", "fast": "false"}
+
+
+def endpoints(place_word, admin_headers, user_headers):
+    return [
+        ("listing anonymous", "/api/all/place", {"limit": 200}, None),
+        ("listing logged-in", "/api/all/place", {"limit": 200}, user_headers),
+        ("search logged-in", "/api/places/search/", {"search": place_word, "limit": 200}, user_headers),
+        ("admin places", "/api/admin/place", {"limit": 200}, admin_headers),
+        ("admin users", "/api/admin/user", None, admin_headers),
+        ("admin feedback", "/api/admin/feedback", None, admin_headers),
+        ("admin votes (stream)", "/api/admin/votes", {"stream": "true"}, admin_headers),
+    ]
+
+
+async def measure(requests):
+    import httpx
+    from sqlalchemy import select
+
+    from app.database.database import sessionLocal
+    from app.database.models import Place, User
+    from app.main import app
+    from app.utilities.oauth2 import create_access_token
+
+    db = sessionLocal()
+    try:
+        admin = db.execute(select(User.id, User.email).where(User.role == 'admin').order_by(User.id).limit(1)).one()
+        user = db.execute(select(User.id, User.email).where(User.role == 'user').order_by(User.id).limit(1)).one()
+        place_word = db.execute(select(Place.place_name).order_by(Place.id).limit(1)).scalar().split()[0]
+    finally:
+        db.close()
+    admin_headers = {"Authorization": f"Bearer {create_access_token({'user_id': admin.id, 'email': admin.email})}"}
+    user_headers = {"Authorization": f"Bearer {create_access_token({'user_id': user.id, 'email': user.email})}"}
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=120) as client:
+            for name, path, params, headers in endpoints(place_word, admin_headers, user_headers):
+                # the admin exports are big, they get fewer requests.
+                count = requests if "admin" not in name or name == "admin places" else max(1, requests // 10)
+                response = await client.get(path, params=params, headers=headers)
+                start = time.process_time()
+                for _ in range(count):
+                    await client.get(path, params=params, headers=headers)
+                results[name] = {"cpu_ms": (time.process_time() - start) / count * 1000, "bytes": len(response.content)}
+    return results
+
+
+def measure_rows(rows):
+    from typing import List
+
+    from app.routers.places.pydanticModels import AllPlaceResponse
+    from app.utilities.json_response import dump_json
+
+    now = datetime.now(timezone.utc)
+    data = [
+        {"place_name": f"Place {number}", "place_address": f"{number} Road, Delhi", "about_place": "about the place " * 5,
+         "pincode": 110000 + number, "id": number, "voted": None, "created_at": now, "num_likes": number % 50,
+         "num_dislikes": number % 7, "overall": 3.5, "total_user_rated": number % 20, "is_user_rated": None}
+        for number in range(rows)
+    ]
+    dump_json(List[AllPlaceResponse], data)
+    start = time.process_time()
+    for _ in range(20):
+        dump_json(List[AllPlaceResponse], data)
+    return (time.process_time() - start) / 20 * 1000
+
+
+def run_mode(args):
+    result = asyncio.run(measure(args.requests))
+    result[f"{args.rows} place rows, serialization only"] = {"cpu_ms": measure_rows(args.rows), "bytes": None}
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--mode", choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    results = {}
+    for mode, validate in MODES.items():
+        env = {**os.environ, "JSON_RESPONSE_VALIDATE": validate, "RESPONSE_CACHE_MAX_BYTES": "0", "PLACE_INDEX_REFRESH_SECONDS": "0"}
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.json_responses", "--mode", mode, "--requests", str(args.requests), "--rows", str(args.rows)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"CPU ms per request, {args.requests} requests (admin exports {max(1, args.requests // 10)})")
+    print(f"  {'':36} {'validated':>10} {'fast':>10} {'saved':>7}")
+    for name, validated in results["validated"].items():
+        fast = results["fast"][name]
+        size = f"  {fast['bytes'] / 1024:.0f} KiB" if fast["bytes"] else ""
+        print(f"  {name:36} {validated['cpu_ms']:10.2f} {fast['cpu_ms']:10.2f} {1 - fast['cpu_ms'] / validated['cpu_ms']:7.0%}{size}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark of the in memory n-gram index against the old ILIKE search path.
+
+The ILIKE side is the query that search_all_place used to run for every word:
+place_name ILIKE '%word%' OR about_place ILIKE '%word%' OR place_address ILIKE '%word%' OR pincode ILIKE '%word%'
+on an in memory sqlite table (LIKE is case insensitive in sqlite), so it runs without postgres.
+
+Every query is the name of a random place with a typo in one word, and "found" means the place is in the results.
+
+RUN COMMAND IS:
+python -m benchmarks.ngram_search
+python -m benchmarks.ngram_search --sizes 10000 100000 --queries 500
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import time
+
+from app.routers.places.utilities.ngram_index import NgramIndex
+
+SYLLABLES = ["ra", "ma", "ka", "li", "pur", "ga", "dha", "shi", "van", "ko", "ta", "ne", "ha", "bad", "gar", "nag", "sa", "mi", "du", "ri"]
+KINDS = ["Fort", "Temple", "Lake", "Garden", "Palace", "Museum", "Market", "Gate", "Beach", "Falls", "Park", "Masjid"]
+CITIES = ["Delhi", "Jaipur", "Agra", "Mumbai", "Pune", "Kolkata", "Chennai", "Lucknow", "Bhopal", "Indore", "Patna", "Goa"]
+
+
+def random_word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def make_places(count, rng):
+    places = []
+    for place_id in range(1, count + 1):
+        name = f"{random_word(rng)} {rng.choice(KINDS)}"
+        address = f"{rng.randint(1, 300)} {random_word(rng)} Road, {rng.choice(CITIES)}"
+        places.append((place_id, name, address, "A place worth a visit.", rng.randint(100000, 999999)))
+    return places
+
+
+# one swap of 2 letters or one deleted letter in the longest word.
+def misspell(text, rng):
+    words = text.split()
+    longest = max(range(len(words)), key=lambda i: len(words[i]))
+    word = words[longest]
+    position = rng.randint(1, len(word) - 2)
+    if rng.random() < 0.5:
+        word = word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    else:
+        word = word[:position] + word[position + 1:]
+    words[longest] = word
+    return " ".join(words)
+
+
+def like_search(connection, query):
+    found = set()
+    for word in query.split():
+        pattern = f"%{word}%"
+        rows = connection.execute(
+            "SELECT id FROM places WHERE place_name LIKE ? OR about_place LIKE ? OR place_address LIKE ? OR CAST(pincode AS TEXT) LIKE ? LIMIT 20",
+            (pattern, pattern, pattern, pattern),
+        )
+        found.update(row[0] for row in rows)
+    return found
+
+
+def measure(search, queries):
+    timings = []
+    found = 0
+    for query, place_id in queries:
+        start = time.perf_counter()
+        result = search(query)
+        timings.append((time.perf_counter() - start) * 1000)
+        found += place_id in result
+    timings.sort()
+    return {
+        "mean_ms": statistics.fmean(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+        "found": found / len(queries),
+    }
+
+
+def run(size, query_count, seed):
+    rng = random.Random(seed)
+    places = make_places(size, rng)
+
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE places (id INTEGER PRIMARY KEY, place_name TEXT, place_address TEXT, about_place TEXT, pincode INTEGER)")
+    connection.executemany("INSERT INTO places VALUES (?, ?, ?, ?, ?)", places)
+
+    start = time.perf_counter()
+    index = NgramIndex()
+    for place_id, name, address, _, _ in places:
+        index.add(place_id, name, address)
+    build_seconds = time.perf_counter() - start
+
+    targets = rng.sample(places, query_count)
+    queries = [(misspell(name, rng), place_id) for place_id, name, _, _, _ in targets]
+
+    like = measure(lambda query: like_search(connection, query), queries)
+    ngram = measure(lambda query: {place_id for place_id, _ in index.search(query, limit=20)}, queries)
+    return build_seconds, like, ngram
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        build_seconds, like, ngram = run(size, args.queries, args.seed)
+        print(f"{size} places (index built in {build_seconds:.1f}s)")
+        for name, result in (("ILIKE", like), ("ngram", ngram)):
+            print(f"  {name:8} mean {result['mean_ms']:7.3f} ms  p50 {result['p50_ms']:7.3f} ms  p99 {result['p99_ms']:7.3f} ms  found {result['found']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
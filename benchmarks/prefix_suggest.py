@@ -0,0 +1,58 @@
+"""
+Benchmark of the in memory prefix index of /api/places/suggest.
+
+Every query is what the search box sends while typing: the first 1..n letters of a random place name,
+of a word inside the name or of a pincode, so the short (and most expensive) prefixes are included.
+
+RUN COMMAND IS:
+python -m benchmarks.prefix_suggest
+python -m benchmarks.prefix_suggest --sizes 10000 100000 --queries 5000
+"""
+import argparse
+import random
+import time
+
+from app.routers.places.utilities.prefix_index import PrefixIndex
+from benchmarks.ngram_search import make_places, measure
+
+
+def typed_prefixes(text):
+    return [text[:length] for length in range(1, min(len(text), 8) + 1)]
+
+
+def run(size, query_count, seed):
+    rng = random.Random(seed)
+    places = make_places(size, rng)
+
+    start = time.perf_counter()
+    index = PrefixIndex()
+    index.bulk_add((place_id, name, pincode) for place_id, name, _, _, pincode in places)
+    build_seconds = time.perf_counter() - start
+
+    queries = []
+    while len(queries) < query_count:
+        place_id, name, _, _, pincode = rng.choice(places)
+        text = rng.choice([name, name.split()[-1], str(pincode)])
+        queries.extend((prefix, place_id) for prefix in typed_prefixes(text))
+    queries = queries[:query_count]
+
+    # "found" is not the point here (a 1 letter prefix has thousands of places), the place is only expected in the full prefix.
+    result = measure(lambda query: {place_id for place_id, _, _ in index.suggest(query, limit=10)}, queries)
+    return build_seconds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        build_seconds, result = run(size, args.queries, args.seed)
+        print(f"{size} places (index built in {build_seconds:.2f}s)")
+        print(f"  suggest  mean {result['mean_ms']:7.3f} ms  p50 {result['p50_ms']:7.3f} ms  p99 {result['p99_ms']:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+from conftest import auth_headers, make_places, rating_body
+
+
+def etag_of(client, path, headers=None, params=None):
+    response = client.get(path, headers=headers, params=params)
+    assert response.status_code == 200, response.text
+    return response.headers["ETag"]
+
+
+def is_not_modified(client, path, etag, headers=None, params=None):
+    response = client.get(path, headers={**(headers or {}), "If-None-Match": etag}, params=params)
+    assert response.status_code in (200, 304), response.text
+    return response.status_code == 304
+
+
+def test_listing_is_304_till_a_write(client, db, admin, user):
+    place = make_places(db, admin, 3)[0]
+    etag = etag_of(client, "/api/all/place")
+    assert is_not_modified(client, "/api/all/place", etag)
+
+    client.post(f"/api/vote/{place.id}", json={"vote": True}, headers=auth_headers(user))
+    assert not is_not_modified(client, "/api/all/place", etag)
+    assert client.get("/api/all/place").json()[0]["num_likes"] == 1
+
+
+def test_etag_is_per_user(client, db, admin, user):
+    make_places(db, admin, 1)
+    admin_etag = etag_of(client, "/api/all/place", auth_headers(admin))
+    assert not is_not_modified(client, "/api/all/place", admin_etag, auth_headers(user))
+    assert client.get("/api/all/place", headers=auth_headers(user)).headers["Vary"].startswith("Authorization")
+
+
+# The detail ETag is the version of the place, a vote of another place doesn't change it.
+def test_vote_changes_only_the_etag_of_its_place(client, db, admin, user):
+    voted, other = make_places(db, admin, 2)
+    headers = auth_headers(user)
+    voted_etag = etag_of(client, f"/api/place/{voted.id}", headers)
+    other_etag = etag_of(client, f"/api/place/{other.id}", headers)
+
+    client.post(f"/api/vote/{voted.id}", json={"vote": True}, headers=auth_headers(admin))
+    assert not is_not_modified(client, f"/api/place/{voted.id}", voted_etag, headers)
+    assert is_not_modified(client, f"/api/place/{other.id}", other_etag, headers)
+    assert client.get(f"/api/place/{voted.id}", headers=headers).json()["num_likes"] == 1
+
+
+def test_rating_changes_the_etag_of_its_place(client, db, admin, user):
+    place = make_places(db, admin, 1)[0]
+    headers = auth_headers(user)
+    etag = etag_of(client, f"/api/place/{place.id}", headers)
+    assert client.post(f"/api/place/rating/{place.id}", json=rating_body(4), headers=headers).status_code == 201
+    assert not is_not_modified(client, f"/api/place/{place.id}", etag, headers)
+    assert client.get(f"/api/place/{place.id}", headers=headers).json()["overall"] == 4.0
+
+
+def test_place_update_changes_its_etag(client, db, admin):
+    place = make_places(db, admin, 1)[0]
+    headers = auth_headers(admin)
+    etag = etag_of(client, f"/api/place/{place.id}", headers)
+    body = {"place_name": "Renamed", "place_address": "1 Road", "about_place": "about", "pincode": 110001}
+    assert client.put(f"/api/place/update/{place.id}", json=body, headers=headers).status_code == 200
+    assert not is_not_modified(client, f"/api/place/{place.id}", etag, headers)
+    assert client.get(f"/api/place/{place.id}", headers=headers).json()["place_name"] == "Renamed"
+
+
+def test_missing_place_is_404(client, db, admin):
+    assert client.get("/api/place/999", headers=auth_headers(admin)).status_code == 404
+
+
+def test_batch_etag_changes_only_with_its_places(client, db, admin, user):
+    first, second, outside = make_places(db, admin, 3)
+    headers = auth_headers(user)
+    params = {"ids": f"{first.id},{second.id},999"}
+    etag = etag_of(client, "/api/places", headers, params)
+    assert client.get("/api/places", headers=headers, params=params).json()["missing"] == [999]
+
+    client.post(f"/api/vote/{outside.id}", json={"vote": True}, headers=auth_headers(admin))
+    assert is_not_modified(client, "/api/places", etag, headers, params)
+
+    client.post(f"/api/vote/{second.id}", json={"vote": False}, headers=auth_headers(admin))
+    assert not is_not_modified(client, "/api/places", etag, headers, params)
+    places = client.get("/api/places", headers=headers, params=params).json()["places"]
+    assert [place["num_dislikes"] for place in places] == [0, 1]
+
+
+def test_if_modified_since(client, db, admin):
+    place = make_places(db, admin, 1)[0]
+    headers = auth_headers(admin)
+    last_modified = client.get(f"/api/place/{place.id}", headers=headers).headers["Last-Modified"]
+    response = client.get(f"/api/place/{place.id}", headers={**headers, "If-Modified-Since": last_modified})
+    assert response.status_code == 304
@@ -0,0 +1,127 @@
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import app.utilities.google_certs as google_certs
+from app.utilities.google_certs import DEFAULT_MAX_AGE_SECONDS, GoogleCertCache, max_age_seconds, token_key_id
+
+
+# This is the local stand-in of the google certs url (GOOGLE_CERTS_URL), it serves server.certs and counts the requests.
+# server.fail makes it answer 500, server.delay makes it slow.
+class CertsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        time.sleep(server.delay)
+        if server.fail:
+            self.send_response(500)
+            self.end_headers()
+            return
+        body = json.dumps(server.certs).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Cache-Control", server.cache_control)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def certs_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CertsHandler)
+    server.certs = {"key1": "cert 1"}
+    server.cache_control = "public, max-age=21600, must-revalidate, no-transform"
+    server.requests = 0
+    server.fail = False
+    server.delay = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/oauth2/v1/certs"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def token_with_key(key_id):
+    header = base64.urlsafe_b64encode(json.dumps({"alg": "RS256", "kid": key_id}).encode()).decode().rstrip("=")
+    return f"{header}.e30.c2ln"
+
+
+def expire(cache):
+    cache._expires_at = time.monotonic() - 1
+
+
+def test_max_age_parsing():
+    assert max_age_seconds("public, max-age=21600, must-revalidate, no-transform") == 21600
+    assert max_age_seconds("max-age=60") == 60
+    assert max_age_seconds("no-cache") == DEFAULT_MAX_AGE_SECONDS
+    assert max_age_seconds(None) == DEFAULT_MAX_AGE_SECONDS
+
+
+def test_certs_are_kept_for_the_max_age(certs_server):
+    cache = GoogleCertCache(certs_server.url)
+    assert cache.certs() == {"key1": "cert 1"}
+    assert cache.certs() == {"key1": "cert 1"}
+    assert certs_server.requests == 1
+    assert 21500 < cache.stats()["expires_in_seconds"] <= 21600
+
+
+def test_token_key_id():
+    assert token_key_id(token_with_key("key2")) == "key2"
+    assert token_key_id("not a token") is None
+
+
+# Google rotated the keys: a token with a key id that is not in the certs fetches them again, once per retry interval.
+def test_unknown_key_id_fetches_again(certs_server, monkeypatch):
+    monkeypatch.setattr(google_certs, "GOOGLE_CERTS_RETRY_SECONDS", 0)
+    cache = GoogleCertCache(certs_server.url)
+    cache.certs()
+    certs_server.certs = {"key1": "cert 1", "key2": "cert 2"}
+    assert "key2" in cache.certs_with_key(token_key_id(token_with_key("key2")))
+    assert certs_server.requests == 2
+    assert "key2" in cache.certs_with_key("key2")
+    assert certs_server.requests == 2
+
+    monkeypatch.setattr(google_certs, "GOOGLE_CERTS_RETRY_SECONDS", 3600)
+    assert "key3" not in cache.certs_with_key("key3")
+    assert certs_server.requests == 2
+
+
+def test_failed_fetch_keeps_the_old_certs(certs_server, monkeypatch):
+    monkeypatch.setattr(google_certs, "GOOGLE_CERTS_RETRY_SECONDS", 0)
+    cache = GoogleCertCache(certs_server.url)
+    cache.certs()
+    certs_server.fail = True
+    expire(cache)
+    assert cache.certs() == {"key1": "cert 1"}
+    assert cache.stats()["fetch_errors"] == 1
+
+    # without any old certs the error is raised (the login gets 503).
+    with pytest.raises(requests.RequestException):
+        GoogleCertCache(certs_server.url).certs()
+
+
+# A slow fetch of expired certs is done by one login, the others use the old certs meanwhile and don't wait for it.
+def test_slow_fetch_does_not_block_the_old_certs(certs_server, monkeypatch):
+    monkeypatch.setattr(google_certs, "GOOGLE_CERTS_RETRY_SECONDS", 0)
+    cache = GoogleCertCache(certs_server.url)
+    cache.certs()
+    expire(cache)
+    certs_server.delay = 1
+    fetching = threading.Thread(target=cache.certs)
+    fetching.start()
+    deadline = time.monotonic() + 5
+    while certs_server.requests < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert certs_server.requests == 2
+    start = time.monotonic()
+    assert cache.certs() == {"key1": "cert 1"}
+    assert time.monotonic() - start < 0.5
+    fetching.join()
@@ -0,0 +1,65 @@
+import orjson
+import pytest
+
+import app.utilities.json_response as json_response_module
+from app.utilities.cache import invalidate_response_cache
+
+from conftest import auth_headers, rating_body
+
+PLACE_LISTS = (
+    ("/api/all/place", {}),
+    ("/api/all/place", {"fields": "id,place_name,num_likes,overall"}),
+    ("/api/places/search/", {"search": "Fort"}),
+    ("/api/places/nearby", {"lat": 28.65, "lon": 77.24, "radius": 20}),
+)
+ADMIN_LISTS = (
+    ("/api/admin/place", {}),
+    ("/api/admin/place", {"fields": "id,place_name"}),
+    ("/api/admin/place/search", {"search": "Fort"}),
+    ("/api/admin/user", {}),
+    ("/api/admin/user/search", {"search": "user"}),
+    ("/api/admin/votes", {}),
+    ("/api/admin/rating", {}),
+    ("/api/admin/feedback", {}),
+)
+STREAMS = ("/api/all/place", "/api/admin/votes", "/api/admin/rating", "/api/admin/feedback")
+
+
+# Places with coordinates, votes, ratings and a feedback, so every field of the list rows has a value.
+@pytest.fixture
+def listed_data(client, db, admin, user):
+    headers = auth_headers(admin)
+    for number, (latitude, longitude) in enumerate(((28.6562, 77.241), (28.6129, 77.2295), (None, None))):
+        body = {"place_name": f"Red Fort {number}", "place_address": f"{number} Road, Delhi", "about_place": "about",
+                "pincode": 110006, "user_id": admin.id, "latitude": latitude, "longitude": longitude}
+        assert client.post("/api/add/place", json=body, headers=headers).status_code == 201
+    for place_id, vote in ((1, True), (2, False)):
+        client.post(f"/api/vote/{place_id}", json={"vote": vote}, headers=auth_headers(user))
+    client.post("/api/place/rating/1", json=rating_body(4), headers=auth_headers(user))
+    client.post("/api/feedback", json={"email": "user@test.com", "name": "user", "message": "nice"})
+
+
+def bodies(client, headers):
+    invalidate_response_cache()
+    lists = [client.get(path, params=params, headers=headers) for path, params in PLACE_LISTS]
+    if headers:
+        lists += [client.get(path, params=params, headers=headers) for path, params in ADMIN_LISTS]
+        lists += [client.get(path, params={"stream": "true"}, headers=headers) for path in STREAMS]
+    for response in lists:
+        assert response.status_code == 200, (response.url, response.text)
+    return [response.content for response in lists]
+
+
+def parsed(body):
+    return [orjson.loads(line) for line in body.splitlines()]
+
+
+# The rows written straight with orjson must pass the response model, and give the same JSON as the validated ones.
+@pytest.mark.parametrize("logged_in", [False, True])
+def test_list_rows_pass_the_response_model(client, listed_data, admin, monkeypatch, logged_in):
+    headers = auth_headers(admin) if logged_in else {}
+    fast = bodies(client, headers)
+    monkeypatch.setattr(json_response_module, "JSON_RESPONSE_VALIDATE", True)
+    validated = bodies(client, headers)
+    assert [parsed(body) for body in fast] == [parsed(body) for body in validated]
+    assert all(parsed(body) != [[]] for body in validated)
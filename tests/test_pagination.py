@@ -0,0 +1,88 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from conftest import auth_headers, make_places
+from fastapi import HTTPException
+
+from app.database.database import engine
+from app.utilities.pagination import NEXT_CURSOR_HEADER, decode_cursor
+
+
+# Every page of the endpoint till there is no X-Next-Cursor, it returns the ids of all the pages in order.
+def walk_pages(client, path, params=None, headers=None, limit=2):
+    ids = []
+    cursor = None
+    for _ in range(50):
+        response = client.get(path, params={**(params or {}), "limit": limit, **({"cursor": cursor} if cursor else {})}, headers=headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert len(page) <= limit
+        ids.extend(place["id"] for place in page)
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return ids
+    raise AssertionError("the pages never end")
+
+
+# The places created in the same second (default created_at) were skipped by the cursor on sqlite.
+def test_listing_walks_every_page(client, db, admin):
+    places = make_places(db, admin, 7)
+    assert walk_pages(client, "/api/all/place") == [place.id for place in places]
+
+
+def test_listing_walks_every_page_logged_in(client, db, admin, user):
+    places = make_places(db, admin, 5)
+    assert walk_pages(client, "/api/all/place", headers=auth_headers(user)) == [place.id for place in places]
+
+
+# The same created_at for all of them, the id orders the page.
+def test_listing_same_created_at_is_ordered_by_id(client, db, admin):
+    places = make_places(db, admin, 5, created_at=datetime(2026, 1, 1, tzinfo=timezone.utc))
+    assert walk_pages(client, "/api/all/place", limit=3) == [place.id for place in places]
+
+
+def test_admin_listing_walks_every_page(client, db, admin):
+    places = make_places(db, admin, 5)
+    assert walk_pages(client, "/api/admin/place", headers=auth_headers(admin)) == [place.id for place in places]
+
+
+def test_search_walks_every_page(client, db, admin):
+    places = make_places(db, admin, 5, name="Red Fort")
+    make_places(db, admin, 2, name="Lotus Temple")
+    assert sorted(walk_pages(client, "/api/places/search/", params={"search": "Fort"})) == [place.id for place in places]
+
+
+def test_last_page_has_no_cursor(client, db, admin):
+    make_places(db, admin, 2)
+    response = client.get("/api/all/place", params={"limit": 2})
+    assert len(response.json()) == 2
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_invalid_cursor_is_400(client, db, admin):
+    make_places(db, admin, 2)
+    for cursor in ("not-a-cursor", "W10", "WyJ4IiwgMV0"):
+        response = client.get("/api/all/place", params={"cursor": cursor})
+        assert response.status_code == 400, cursor
+        assert response.json() == {"detail": "Invalid cursor"}
+
+
+# The ranked search cursor is (rank, id), a listing cursor (created_at, id) made Decimal() raise decimal.InvalidOperation.
+def test_cursor_of_another_endpoint_is_400(client, db, admin):
+    make_places(db, admin, 3)
+    listing_cursor = client.get("/api/all/place", params={"limit": 1}).headers[NEXT_CURSOR_HEADER]
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(listing_cursor, Decimal, int)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.skipif(engine.dialect.name != "postgresql", reason="the ranked search is postgres only, sqlite has the LIKE search")
+def test_ranked_search_with_listing_cursor_is_400(client, db, admin):
+    make_places(db, admin, 3, name="Red Fort")
+    listing_cursor = client.get("/api/all/place", params={"limit": 1}).headers[NEXT_CURSOR_HEADER]
+    pincode_cursor = client.get("/api/places/search/", params={"search": "110000", "limit": 1}).headers.get(NEXT_CURSOR_HEADER)
+    for cursor in filter(None, (listing_cursor, pincode_cursor)):
+        response = client.get("/api/places/search/", params={"search": "Fort", "cursor": cursor})
+        assert response.status_code == 400
+        assert response.json() == {"detail": "Invalid cursor"}
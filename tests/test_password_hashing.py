@@ -0,0 +1,52 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.utilities.password_hashing import PasswordHasher, PasswordHashingBusy
+
+
+def hasher(max_pending=1, timeout_seconds=5):
+    return PasswordHasher(kind='thread', workers=1, max_pending=max_pending, timeout_seconds=timeout_seconds)
+
+
+def test_hash_and_verify():
+    password_hasher = hasher()
+    hashed = asyncio.run(password_hasher.hash_password_async("secret"))
+    assert asyncio.run(password_hasher.verify_password_async("secret", hashed))
+    assert not password_hasher.verify_password("wrong", hashed)
+    assert password_hasher.stats()["completed"] == 3
+    assert password_hasher.stats()["pending"] == 0
+    password_hasher.shutdown()
+
+
+# The async call waits for the hash on the event loop, so many of them at once use no thread of the threadpool.
+def test_async_hash_waits_without_a_thread():
+    password_hasher = hasher(max_pending=4)
+
+    async def hash_many():
+        threads = threading.active_count()
+        waiting = [asyncio.create_task(password_hasher._run_async('hash', time.sleep, 0.2)) for _ in range(4)]
+        await asyncio.sleep(0.05)
+        # only the one worker thread of the pool is new.
+        assert threading.active_count() <= threads + 1
+        await asyncio.gather(*waiting)
+
+    asyncio.run(hash_many())
+    password_hasher.shutdown()
+
+
+# A hash that timed out still runs in the worker, so its slot is taken till it is done.
+def test_timed_out_hash_keeps_its_slot_till_it_is_done():
+    password_hasher = hasher(max_pending=1, timeout_seconds=0.1)
+    with pytest.raises(PasswordHashingBusy, match="did not finish"):
+        asyncio.run(password_hasher._run_async('hash', time.sleep, 0.5))
+    with pytest.raises(PasswordHashingBusy, match="already running"):
+        password_hasher._run('hash', time.sleep, 0)
+
+    time.sleep(0.6)
+    assert password_hasher.stats()["pending"] == 0
+    password_hasher._run('hash', time.sleep, 0)
+    assert password_hasher.stats()["timeouts"] == 1 and password_hasher.stats()["rejected"] == 1
+    password_hasher.shutdown()
@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+import app.routers.places.utilities.place_index as place_index
+from app.routers.places.utilities.ngram_index import NgramIndex
+from app.routers.places.utilities.place_index import (
+    build_place_indexes, fuzzy_search_place_ids, index_place, suggest_places, unindex_place,
+)
+
+from conftest import make_places
+
+
+# A write of this worker in the middle of the scan of a rebuild: a new place and a deleted one that the scan still reads.
+def rebuild_with_writes_during_the_scan(monkeypatch, new_place, removed_id):
+    writes = []
+
+    class WriteDuringScan(NgramIndex):
+        def add(self, *args):
+            if not writes:
+                writes.append(True)
+                index_place(new_place)
+                unindex_place(removed_id)
+            super().add(*args)
+
+    monkeypatch.setattr(place_index, "NgramIndex", WriteDuringScan)
+    build_place_indexes()
+    assert writes
+
+
+def test_writes_during_a_rebuild_are_not_lost(db, admin, monkeypatch):
+    kept, removed = make_places(db, admin, 2, name="Red Fort")
+    new_place = SimpleNamespace(id=999, place_name="Lotus Temple", place_address="Kalkaji, Delhi", pincode=110019)
+    rebuild_with_writes_during_the_scan(monkeypatch, new_place, removed.id)
+
+    assert fuzzy_search_place_ids("Lotus Tempel", 10) == [999]
+    assert fuzzy_search_place_ids("Red Frot", 10) == [kept.id]
+    assert [place_id for place_id, _, _ in suggest_places("Lotus", 10)] == [999]
+    assert [place_id for place_id, _, _ in suggest_places("Red", 10)] == [kept.id]
+    assert place_index._rebuild_log is None
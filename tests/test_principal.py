@@ -0,0 +1,47 @@
+import app.utilities.principal_cache as principal_cache_module
+from app.database.models import User
+from app.utilities.principal_cache import bump_principal_version
+
+from conftest import auth_headers
+
+DIAGNOSTICS = "/api/admin/diagnostics/cache"
+
+
+# This is a write of another worker: the user row and the principal version change, the cache of this worker is not touched.
+def write_in_other_worker(db, user, **values):
+    if values:
+        db.query(User).filter(User.id == user.id).update(values, synchronize_session=False)
+    else:
+        db.query(User).filter(User.id == user.id).delete(synchronize_session=False)
+    bump_principal_version(db)
+    db.commit()
+
+
+def test_demoted_admin_is_refused_on_every_worker(client, db, admin, monkeypatch):
+    headers = auth_headers(admin)
+    assert client.get(DIAGNOSTICS, headers=headers).status_code == 200
+
+    # Till the next check of the version the cached principal is used.
+    monkeypatch.setattr(principal_cache_module, "PRINCIPAL_VERSION_CHECK_SECONDS", 3600)
+    write_in_other_worker(db, admin, role="user")
+    assert client.get(DIAGNOSTICS, headers=headers).status_code == 200
+
+    monkeypatch.setattr(principal_cache_module, "PRINCIPAL_VERSION_CHECK_SECONDS", 0)
+    assert client.get(DIAGNOSTICS, headers=headers).status_code == 401
+
+
+def test_deleted_user_is_refused_on_every_worker(client, db, user, monkeypatch):
+    monkeypatch.setattr(principal_cache_module, "PRINCIPAL_VERSION_CHECK_SECONDS", 0)
+    headers = auth_headers(user)
+    assert client.post("/api/vote/1", json={"vote": True}, headers=headers).status_code == 404
+
+    write_in_other_worker(db, user)
+    assert client.post("/api/vote/1", json={"vote": True}, headers=headers).status_code == 401
+
+
+def test_cached_principal_without_a_change(client, db, admin, monkeypatch):
+    monkeypatch.setattr(principal_cache_module, "PRINCIPAL_VERSION_CHECK_SECONDS", 0)
+    headers = auth_headers(admin)
+    client.get(DIAGNOSTICS, headers=headers)
+    hits = client.get(DIAGNOSTICS, headers=headers).json()["principals"]["hits"]
+    assert client.get(DIAGNOSTICS, headers=headers).json()["principals"]["hits"] == hits + 1
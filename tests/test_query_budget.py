@@ -0,0 +1,131 @@
+import pytest
+from sqlalchemy import text
+
+import app.routers.places.helper_function as places_helper_function
+import app.utilities.query_counter as query_counter
+import app.utilities.streaming as streaming
+from app.database.database import engine
+from app.database.models import PlaceStats, Ratings, Votes
+from app.utilities.query_counter import DB_QUERIES_HEADER, QueryBudgetExceeded, RequestQueries
+
+from conftest import auth_headers, make_places, rating_body
+
+
+# With the strict budgets a statement over the budget of the route raises, so the request fails in the test (the budgets of CI).
+@pytest.fixture
+def strict_budget(monkeypatch):
+    monkeypatch.setattr(query_counter, "QUERY_BUDGET_STRICT", True)
+
+
+def queries_of(response):
+    assert response.status_code in (200, 201, 304), response.text
+    return int(response.headers[DB_QUERIES_HEADER])
+
+
+def test_strict_budget_raises_over_the_budget(strict_budget):
+    token = query_counter._request_queries.set(RequestQueries(budget=1))
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            with pytest.raises(QueryBudgetExceeded):
+                connection.execute(text("SELECT 2"))
+    finally:
+        query_counter._request_queries.reset(token)
+
+
+# Every hot endpoint, anonymous and logged in, the first request of the user is a miss of the principal cache.
+# The streams are read in small batches, so they run more statements than the route budget (a budget per batch).
+def test_hot_endpoints_are_in_their_budget(client, db, admin, user, strict_budget, monkeypatch, caplog):
+    monkeypatch.setattr(streaming, "STREAM_BATCH_SIZE", 3)
+    monkeypatch.setattr(places_helper_function, "STREAM_BATCH_SIZE", 3)
+    places = make_places(db, admin, 20)
+    ids = ",".join(str(place.id) for place in places[:10])
+    for headers in ({}, auth_headers(user)):
+        queries_of(client.get("/api/all/place", headers=headers))
+        stream = client.get("/api/all/place", params={"stream": "true"}, headers=headers)
+        assert len(stream.content.splitlines()) == 20
+        queries_of(client.get("/api/places/search/", params={"search": "Place"}, headers=headers))
+        queries_of(client.get("/api/places/nearby", params={"lat": 28.6, "lon": 77.2}, headers=headers))
+        queries_of(client.get("/api/places/suggest", params={"q": "Pla"}, headers=headers))
+
+    headers = auth_headers(user)
+    for place in places[:3]:
+        queries_of(client.post(f"/api/vote/{place.id}", json={"vote": True}, headers=headers))
+        queries_of(client.post(f"/api/place/rating/{place.id}", json=rating_body(3), headers=headers))
+    queries_of(client.get(f"/api/place/{places[0].id}", headers=headers))
+    queries_of(client.get("/api/places", params={"ids": ids}, headers=headers))
+
+    headers = auth_headers(admin)
+    for path in ("/api/admin/place", "/api/admin/user", "/api/admin/votes", "/api/admin/rating", "/api/admin/feedback"):
+        queries_of(client.get(path, headers=headers))
+    for path in ("/api/admin/votes", "/api/admin/rating"):
+        queries_of(client.get(path, params={"stream": "true"}, headers=headers))
+
+    # Nothing was over its budget or an N+1, not even the streams.
+    assert not [record for record in caplog.records if record.name == "app.queries" and record.levelname == "WARNING"]
+
+
+# A page is the same few statements however many places are in it (no query per place).
+def test_page_statements_dont_grow_with_the_page(client, db, admin, user):
+    make_places(db, admin, 30)
+    headers = auth_headers(user)
+    client.get("/api/all/place", headers=headers)
+    small = queries_of(client.get("/api/all/place", params={"limit": 2}, headers=headers))
+    large = queries_of(client.get("/api/all/place", params={"limit": 30}, headers=headers))
+    assert small == large
+    small = queries_of(client.get("/api/places", params={"ids": "1,2"}, headers=headers))
+    large = queries_of(client.get("/api/places", params={"ids": ",".join(map(str, range(1, 31)))}, headers=headers))
+    assert small == large
+
+
+# A 304 is answered from the version, without the query of the page.
+def test_not_modified_runs_less_statements(client, db, admin, user):
+    place = make_places(db, admin, 5)[0]
+    headers = auth_headers(user)
+    # the principal of the user is cached first, so the counts are only of the endpoint.
+    client.get("/api/all/place", headers=headers)
+    for path in ("/api/all/place", f"/api/place/{place.id}"):
+        response = client.get(path, headers=headers)
+        full = queries_of(response)
+        not_modified = client.get(path, headers={**headers, "If-None-Match": response.headers["ETag"]})
+        assert not_modified.status_code == 304
+        assert queries_of(not_modified) < full
+
+
+def stats_of(db, place_id):
+    db.expire_all()
+    return db.get(PlaceStats, place_id)
+
+
+def test_vote_upsert_keeps_one_row_and_the_stats(client, db, admin, user):
+    place = make_places(db, admin, 1)[0]
+    headers = auth_headers(user)
+    for vote, likes, dislikes in ((True, 1, 0), (True, 1, 0), (False, 0, 1), (None, 0, 0), (True, 1, 0)):
+        assert client.post(f"/api/vote/{place.id}", json={"vote": vote}, headers=headers).status_code == 200
+        stats = stats_of(db, place.id)
+        assert (stats.num_likes, stats.num_dislikes) == (likes, dislikes)
+    assert db.query(Votes).filter(Votes.place_id == place.id).count() == 1
+
+    client.post(f"/api/vote/{place.id}", json={"vote": False}, headers=auth_headers(admin))
+    stats = stats_of(db, place.id)
+    assert (stats.num_likes, stats.num_dislikes) == (1, 1)
+
+
+def test_rating_upsert_updates_the_sums(client, db, admin, user):
+    place = make_places(db, admin, 1)[0]
+    headers = auth_headers(user)
+    assert client.post(f"/api/place/rating/{place.id}", json=rating_body(2), headers=headers).json() == {"message": "rating successfully created"}
+    assert client.post(f"/api/place/rating/{place.id}", json=rating_body(5), headers=headers).json() == {"message": "rating successfully updated"}
+    client.post(f"/api/place/rating/{place.id}", json=rating_body(3), headers=auth_headers(admin))
+
+    stats = stats_of(db, place.id)
+    assert (stats.total_user_rated, stats.overall_sum, stats.safety_sum) == (2, 8, 8)
+    assert db.query(Ratings).filter(Ratings.place_id == place.id).count() == 2
+    assert client.get(f"/api/place/{place.id}", headers=headers).json()["overall"] == 4.0
+
+
+def test_vote_and_rating_of_a_missing_place_are_404(client, db, user):
+    headers = auth_headers(user)
+    assert client.post("/api/vote/999", json={"vote": True}, headers=headers).status_code == 404
+    assert client.post("/api/place/rating/999", json=rating_body(3), headers=headers).status_code == 404
+    assert db.query(Votes).count() == 0 and db.query(Ratings).count() == 0
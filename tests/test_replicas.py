@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import text
+
+from app.database.replicas import READ_PRIMARY_COOKIE, ReadDb, replica_router
+
+
+class FakeSession:
+    def __init__(self):
+        self.closed = 0
+
+    def close(self):
+        self.closed += 1
+
+
+class FakeReplica:
+    name = "replica0"
+
+    def __init__(self):
+        self.healthy = True
+        self.failures = 0
+        self.error = None
+        self.sessions = []
+        self.sessionLocal = self.asyncSessionLocal = self.session
+
+    def session(self):
+        self.sessions.append(FakeSession())
+        return self.sessions[-1]
+
+
+def read(session):
+    if isinstance(session, FakeSession):
+        raise sa_exc.OperationalError("SELECT 1", {}, OSError("replica went away"))
+    return session.execute(text("SELECT 1")).scalar()
+
+
+# The read is run again on the primary, the session of the replica is closed and the replica gets no reads.
+def test_failed_replica_read_runs_on_the_primary(database):
+    replica = FakeReplica()
+    db = ReadDb(replica)
+    assert asyncio.run(db.run(read)) == 1
+    assert replica.sessions[0].closed >= 1
+    assert db.replica is None
+    assert not replica.healthy and replica.failures == 1
+
+
+class FakeUser:
+    id = 7
+
+
+class FakeRequest:
+    def __init__(self, cookies):
+        self.cookies = cookies
+
+
+def test_sticky_reads_are_counted():
+    before = replica_router.sticky_reads
+    replica_router.mark_write(FakeUser.id)
+    assert replica_router.reads_primary(FakeRequest({}), FakeUser())
+    assert replica_router.reads_primary(FakeRequest({READ_PRIMARY_COOKIE: str(time.time() + 60)}), None)
+    assert not replica_router.reads_primary(FakeRequest({READ_PRIMARY_COOKIE: "bad"}), None)
+    assert replica_router.sticky_reads == before + 2
@@ -0,0 +1,53 @@
+import pytest
+from fastapi import HTTPException
+
+import app.routers.votes_ratings_feedback.utilities.user_place_upsert as user_place_upsert
+import app.utilities.query_counter as query_counter
+from app.database.models import Votes
+from app.routers.votes_ratings_feedback.utilities.user_place_upsert import MAX_UPSERT_ATTEMPTS, upsert_user_place
+from app.utilities.query_counter import RequestQueries
+
+from conftest import make_places
+
+
+def vote_values(user, place_id, vote=True):
+    return {"user_id": user.id, "place_id": place_id, "vote": vote}
+
+
+# The statements that function runs, counted like the ones of a request.
+def statements_of(function):
+    queries = RequestQueries()
+    token = query_counter._request_queries.set(queries)
+    try:
+        return function(), queries.count
+    finally:
+        query_counter._request_queries.reset(token)
+
+
+def test_missing_place_is_one_statement(db, user):
+    written, count = statements_of(lambda: upsert_user_place(db, Votes.__table__, vote_values(user, 999), ("vote",)))
+    assert written is None
+    assert count == 1
+
+
+def test_upsert_returns_the_old_row(db, admin, user):
+    place = make_places(db, admin, 1)[0]
+    row_id, old_row = upsert_user_place(db, Votes.__table__, vote_values(user, place.id), ("vote",))
+    assert old_row is None
+    values = vote_values(user, place.id, False)
+    db.commit()
+    (second_id, old_row), count = statements_of(lambda: upsert_user_place(db, Votes.__table__, values, ("vote",)))
+    assert second_id == row_id and old_row.vote is True
+    # postgres is one statement, sqlite reads the old row first.
+    assert count == (1 if db.get_bind().dialect.name == "postgresql" else 2)
+
+
+# A write that always loses the compare and swap stops after MAX_UPSERT_ATTEMPTS runs with 409, it doesn't loop forever.
+def test_lost_writes_stop_with_409(db, admin, user, monkeypatch):
+    place = make_places(db, admin, 1)[0]
+    runs = []
+    monkeypatch.setattr(user_place_upsert, "_upsert", lambda *args: runs.append(args) or (True, None))
+    with pytest.raises(HTTPException) as error:
+        upsert_user_place(db, Votes.__table__, vote_values(user, place.id), ("vote",))
+    assert error.value.status_code == 409
+    assert len(runs) == MAX_UPSERT_ATTEMPTS